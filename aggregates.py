@@ -0,0 +1,85 @@
+# aggregates.py - Running bill statistics maintained as bills come and go
+
+
+def to_cents(amount):
+    """Money is summed in integer paise so adds and removes cancel exactly"""
+    return int(round(float(amount) * 100))
+
+
+def format_totals(by_status):
+    """Shape {status: (count, cents)} into the /api/bills/stats payload"""
+    paid = by_status.get('Paid', (0, 0))
+    unpaid = by_status.get('Unpaid', (0, 0))
+    return {
+        'total_bills': sum(count for count, _ in by_status.values()),
+        'total_revenue': sum(cents for _, cents in by_status.values()) / 100,
+        'paid_bills': paid[0],
+        'paid_amount': paid[1] / 100,
+        'unpaid_bills': unpaid[0],
+        'unpaid_amount': unpaid[1] / 100,
+    }
+
+
+# Rollup granularities and the length of the date prefix that keys them
+PERIOD_LENGTHS = {'day': 10, 'month': 7}
+
+
+def format_period(period, bill_count, gross_cents, paid_cents, unpaid_cents):
+    return {
+        'period': period,
+        'bills': bill_count,
+        'gross': gross_cents / 100,
+        'paid': paid_cents / 100,
+        'unpaid': unpaid_cents / 100,
+    }
+
+
+class BillAggregates:
+    """Counters over the live bills, updated incrementally by the CSV ledger.
+
+    Besides the per-status totals this keeps per-day and per-month rollups
+    of [bill count, gross, paid, unpaid] (amounts in paise).
+    """
+
+    def __init__(self):
+        self.by_status = {}
+        self.rollups = {granularity: {} for granularity in PERIOD_LENGTHS}
+
+    def _apply(self, bill, sign):
+        cents = to_cents(bill['total'])
+        status = bill['payment_status']
+        count, total = self.by_status.get(status, (0, 0))
+        self.by_status[status] = (count + sign, total + sign * cents)
+
+        delta = (
+            sign,
+            sign * cents,
+            sign * cents if status == 'Paid' else 0,
+            sign * cents if status == 'Unpaid' else 0,
+        )
+        for granularity, length in PERIOD_LENGTHS.items():
+            periods = self.rollups[granularity]
+            period = bill['date'][:length]
+            row = [a + b for a, b in zip(periods.get(period, (0, 0, 0, 0)), delta)]
+            if row[0]:
+                periods[period] = row
+            else:
+                periods.pop(period, None)
+
+    def add(self, bill):
+        self._apply(bill, 1)
+
+    def remove(self, bill):
+        self._apply(bill, -1)
+
+    def totals(self):
+        return format_totals(self.by_status)
+
+    def revenue(self, granularity, start=None, end=None):
+        """Rollup rows for periods between start and end (inclusive), oldest first"""
+        periods = self.rollups[granularity]
+        return [
+            format_period(period, *periods[period])
+            for period in sorted(periods)
+            if (start is None or period >= start) and (end is None or period <= end)
+        ]
@@ -1,26 +1,42 @@
 # app.py - Flask Backend
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
 import pandas as pd
 import os
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 import io
-import base64
+import csv
+import json
+import zipfile
 from PIL import Image as PILImage
+from inventory_import import InventoryUpload
+from jobs import RenderJobs
+import render_pool
+from bill_pdf import LAYOUT_VERSION
+from pdf_cache import PdfCache
+import receipt
+import signature_store
+import metrics
+import profiling
+from storage import open_storage
 
 app = Flask(__name__)
 CORS(app)
+metrics.install(app)
+profiling.install(app)
 
 # File paths
 INVENTORY_CSV = 'inventory.csv'
 BILLS_CSV = 'bills.csv'
-SIGNATURES_DIR = 'signatures'
+SIGNATURES_DIR = signature_store.SIGNATURES_DIR
+
+# Storage backend: 'csv' (default, small installs) or 'sqlite' (see migrate.py)
+STORAGE_BACKEND = os.environ.get('BILLING_STORAGE', 'csv')
+SQLITE_DB = os.environ.get('BILLING_DB', 'billing.db')
+
+# Re-downloaded bill PDFs are kept on disk, least recently used evicted first
+PDF_CACHE_DIR = os.environ.get('BILLING_PDF_CACHE', 'pdf_cache')
+PDF_CACHE_MB = int(os.environ.get('BILLING_PDF_CACHE_MB', 256))
 
 # Ensure directories exist
 os.makedirs(SIGNATURES_DIR, exist_ok=True)
@@ -44,10 +60,15 @@ def initialize_files():
     
     if not os.path.exists(BILLS_CSV):
         df = pd.DataFrame(columns=['bill_id', 'date', 'customer_name', 'customer_phone', 
-                                   'customer_email', 'items', 'total', 'payment_status', 'notes'])
+                                   'customer_email', 'items', 'total', 'payment_status', 'notes',
+                                   'signature_id'])
         df.to_csv(BILLS_CSV, index=False)
 
-initialize_files()
+if STORAGE_BACKEND == 'csv':
+    initialize_files()
+
+# All inventory and bill access goes through the storage backend, timed per call
+storage = metrics.TimedStorage(open_storage(STORAGE_BACKEND, INVENTORY_CSV, BILLS_CSV, SQLITE_DB), STORAGE_BACKEND)
 
 # Fixed shop details
 SHOP_DETAILS = {
@@ -59,6 +80,10 @@ SHOP_DETAILS = {
     'gst': 'GST123456789'
 }
 
+# PDF render workers are warmed for this shop. They are started from the
+# entry point, not here: spawned workers (macOS, Windows) re-import this module
+render_pool.use_shop(SHOP_DETAILS)
+
 # Root route
 @app.route('/')
 def home():
@@ -69,47 +94,72 @@ def home():
         'endpoints': {
             'shop': '/api/shop',
             'inventory': '/api/inventory',
+            'inventory_search': '/api/inventory/search?q=&limit=',
             'bills': '/api/bills',
             'delete_bill': '/api/bills/<bill_id>',
+            'compact_bills': '/api/bills/compact',
+            'bill_stats': '/api/bills/stats',
+            'export_bills': '/api/bills/export?format=csv|ndjson&from=&to=',
+            'update_bill_status': '/api/bills/<bill_id>',
+            'revenue_report': '/api/reports/revenue?granularity=day|month&from=&to=',
+            'customers': '/api/customers?prefix=&limit=',
+            'customer_bills': '/api/customers/<phone>/bills?limit=&cursor=',
             'generate_bill': '/api/generate-bill',
-            'signature': '/api/signature'
+            'generate_bills': '/api/generate-bills',
+            'job_status': '/api/jobs/<job_id>',
+            'bill_pdf': '/api/bills/<bill_id>/pdf',
+            'signature': '/api/signature',
+            'metrics': '/metrics',
+            'profiling': '/api/admin/profiling'
         },
         'frontend': 'Access the Streamlit app at http://localhost:8501'
     })
 
+def conditional_json(kind, build):
+    """Answer with 304 if the client's ETag matches the current data version.
+
+    ``build`` is only called when the client's copy is out of date.
+    """
+    etag = f"{kind}-{storage.data_version(kind)}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
 # Get all inventory items
 @app.route('/api/inventory', methods=['GET'])
 def get_inventory():
     try:
-        df = pd.read_csv(INVENTORY_CSV)
-        # Convert pandas data types to Python native types for JSON serialization
-        records = df.to_dict('records')
-        for record in records:
-            record['id'] = int(record['id'])
-            record['price'] = float(record['price'])
-        return jsonify(records)
+        return conditional_json('inventory', storage.list_inventory)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Search inventory by name for the billing catalog's type-ahead
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+
+@app.route('/api/inventory/search', methods=['GET'])
+def search_inventory():
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_SEARCH_LIMIT}')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    try:
+        return conditional_json('inventory', lambda: storage.search_inventory(query, limit))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # Add new item to inventory
 @app.route('/api/inventory', methods=['POST'])
 def add_inventory_item():
     try:
         data = request.json
-        df = pd.read_csv(INVENTORY_CSV)
-        
-        new_id = int(df['id'].max() + 1) if len(df) > 0 else 1
-        new_item = {
-            'id': new_id,
-            'name': data['name'],
-            'price': float(data['price'])
-    
-        }
-        
-        df = pd.concat([df, pd.DataFrame([new_item])], ignore_index=True)
-        df.to_csv(INVENTORY_CSV, index=False)
-        
+        new_item = storage.add_inventory_item(data['name'], float(data['price']))
         return jsonify(new_item), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -119,13 +169,8 @@ def add_inventory_item():
 def update_inventory_item(item_id):
     try:
         data = request.json
-        df = pd.read_csv(INVENTORY_CSV)
-        
-        df.loc[df['id'] == item_id, 'name'] = data['name']
-        df.loc[df['id'] == item_id, 'price'] = float(data['price'])
-    
-        
-        df.to_csv(INVENTORY_CSV, index=False)
+        if not storage.update_inventory_item(item_id, data['name'], float(data['price'])):
+            return jsonify({'error': f'Item with ID {item_id} not found'}), 404
         return jsonify({'message': 'Item updated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -134,296 +179,143 @@ def update_inventory_item(item_id):
 @app.route('/api/inventory/<int:item_id>', methods=['DELETE'])
 def delete_inventory_item(item_id):
     try:
-        df = pd.read_csv(INVENTORY_CSV)
-        df = df[df['id'] != item_id]
-        df.to_csv(INVENTORY_CSV, index=False)
+        if not storage.delete_inventory_item(item_id):
+            return jsonify({'error': f'Item with ID {item_id} not found'}), 404
         return jsonify({'message': 'Item deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Import CSV
+# Import CSV - streamed row by row, upserting by item name
 @app.route('/api/inventory/import', methods=['POST'])
 def import_inventory():
     try:
-        file = request.files['file']
-        df = pd.read_csv(file)
-        
-        # Validate columns
-        required_columns = ['name', 'price']
-        if not all(col in df.columns for col in required_columns):
-            return jsonify({'error': 'CSV must contain name and price columns'}), 400
-
-        existing_df = pd.read_csv(INVENTORY_CSV)
-        max_id = int(existing_df['id'].max()) if len(existing_df) > 0 else 0
-        
-        df['id'] = range(max_id + 1, max_id + 1 + len(df))
-        df = pd.concat([existing_df, df], ignore_index=True)
-        df.to_csv(INVENTORY_CSV, index=False)
-        
-        return jsonify({'message': f'{len(df) - len(existing_df)} items imported successfully'})
+        upload = InventoryUpload(request.files['file'].stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    try:
+        counts = storage.upsert_inventory_items(upload)
+        return jsonify(upload.report(counts))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Save signature
+# Save signature - stored once per distinct image; pass the id as signature_id when generating a bill
 @app.route('/api/signature', methods=['POST'])
 def save_signature():
     try:
-        data = request.json
-        signature_data = data['signature']
-        
-        # Remove header from base64 string
-        if ',' in signature_data:
-            signature_data = signature_data.split(',')[1]
-        
-        # Save signature
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'signature_{timestamp}.png'
-        filepath = os.path.join(SIGNATURES_DIR, filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(base64.b64decode(signature_data))
-        
-        return jsonify({'filename': filename})
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data.get('signature'), str):
+            return jsonify({'error': 'signature must be a base64 image'}), 400
+        signature_id = signature_store.save_signature(data['signature'])
+        return jsonify({'signature_id': signature_id, 'filename': f'{signature_id}.png'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Generate PDF Bill
+def unknown_signature(data):
+    """An error message if the payload names a signature that is not stored"""
+    signature_id = data.get('signature_id')
+    if signature_id and not signature_store.signature_path(signature_id):
+        return f'Unknown signature_id {signature_id}'
+    return None
+
+def bill_record(data):
+    """The stored bill for a /api/generate-bill payload"""
+    return {
+        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'customer_name': data['customer']['name'],
+        'customer_phone': data['customer'].get('phone', ''),
+        'customer_email': data['customer'].get('email', ''),
+        'items': data['items'],
+        'total': data['total'],
+        'payment_status': data['payment_status'],
+        'notes': data.get('notes', ''),
+        'signature_id': data.get('signature_id') or ''
+    }
+
+# PDFs for asynchronous checkouts render in the background worker pool
+render_jobs = RenderJobs(render_pool.render_async)
+
+# Stored bills re-rendered for download, keyed by everything printed on them
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MB * 1024 * 1024, version=LAYOUT_VERSION)
+
+def bill_payload(bill):
+    """The /api/generate-bill payload that reprints a stored bill"""
+    payload = {
+        'shop': SHOP_DETAILS,
+        'customer': {
+            'name': bill['customer_name'],
+            'phone': bill['customer_phone'] or '',
+            'email': bill['customer_email'] or ''
+        },
+        'items': bill['items'],
+        'total': float(bill['total']),
+        'payment_status': bill['payment_status'],
+        'notes': bill['notes'] or '',
+        'date': bill['date']
+    }
+    if bill.get('signature_id'):
+        # Unsigned bills keep the payload, and so the cache key, they always had
+        payload['signature_id'] = bill['signature_id']
+    return payload
+
+def job_response(job):
+    """Job status JSON with the URLs a client polls or downloads from"""
+    return {
+        **job,
+        'status_url': f"/api/jobs/{job['job_id']}",
+        'pdf_url': f"/api/bills/{job['bill_id']}/pdf",
+    }
+
+# Bill output formats besides the A4 PDF: thermal receipts, ?paper=58|80 mm wide
+BILL_FORMATS = ('pdf', 'receipt-text', 'escpos')
+DEFAULT_RECEIPT_PAPER = 80
+
+# Generate PDF Bill - with ?async=1 the bill is saved and rendered in the background
 @app.route('/api/generate-bill', methods=['POST'])
 def generate_bill():
     try:
         data = request.json
-        
-        # Create PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(
-            buffer, 
-            pagesize=A4,
-            rightMargin=0.175*inch,  # Reduced from 0.7 to 0.175 (25% of original)
-            leftMargin=0.175*inch,   # Reduced from 0.7 to 0.175 (25% of original)
-            topMargin=0.5*inch,
-            bottomMargin=0.5*inch
-        )
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles - Better fonts and styling
-        shop_name_style = ParagraphStyle(
-            'ShopName',
-            parent=styles['Heading1'],
-            fontSize=20,  # Reduced from 24 to fit in one line
-            textColor=colors.HexColor('#000000'),
-            spaceAfter=4,  # Reduced spacing
-            alignment=TA_CENTER,
-            fontName='Times-Bold'  # Changed to Times-Bold for better appearance
-        )
-        
-        shop_address_style = ParagraphStyle(
-            'ShopAddress',
-            parent=styles['Normal'],
-            fontSize=11,  # Slightly reduced
-            textColor=colors.HexColor('#000000'),
-            spaceAfter=10,
-            alignment=TA_CENTER,
-            fontName='Times-Roman'  # Changed to Times-Roman
-        )
-        
-        normal_style = ParagraphStyle(
-            'Normal',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#000000'),
-            fontName='Times-Roman'  # Changed to Times-Roman
-        )
-        
-        bold_style = ParagraphStyle(
-            'Bold',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#000000'),
-            fontName='Times-Bold'  # Changed to Times-Bold
-        )
-        
-        # === SHOP HEADER ===
-        # Large shop name at top (one line)
-        elements.append(Paragraph(data['shop']['name'].upper(), shop_name_style))
-        elements.append(Spacer(1, 0.05*inch))  # Reduced spacing
-        
-        # Address, Phone and Email in one complete horizontal line
-        contact_line = f"{data['shop']['address']} | Phone: {data['shop']['phone']} | Email: {data['shop']['email']}"
-        elements.append(Paragraph(contact_line, shop_address_style))
-        elements.append(Spacer(1, 0.08*inch))  # Minimized space between address and date
-        
-        # Date left, Owner Name right (below address line)
-        date_owner_data = [
-            [f"Date: {datetime.now().strftime('%d-%m-%Y')}", f"Owner: {data['shop'].get('owner', 'N/A')}"]
-        ]
-        
-        date_owner_table = Table(date_owner_data, colWidths=[3.5*inch, 3.5*inch])  # Adjusted for reduced margins
-        date_owner_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),  # Changed to Times-Roman
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),    # Date left
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),   # Owner right
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
-        
-        elements.append(date_owner_table)
-        elements.append(Spacer(1, 0.1*inch))  # Reduced spacing
-        
-        # === SEPARATION LINE BETWEEN SHOP AND OTHER DETAILS ===
-        from reportlab.platypus import HRFlowable
-        elements.append(HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.black))
-        elements.append(Spacer(1, 0.15*inch))
-        
-        # === CUSTOMER DETAILS (simplified - only name and mobile) ===
-        elements.append(Paragraph("CUSTOMER DETAILS:", bold_style))
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # Customer Name (full line)
-        elements.append(Paragraph(f"Name: {data['customer']['name']}", normal_style))
-        elements.append(Spacer(1, 0.05*inch))
-        
-        # Mobile No (full line)  
-        elements.append(Paragraph(f"Mobile No: {data['customer'].get('phone', 'N/A')}", normal_style))
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # === ITEMS TABLE (using complete page width) ===
-        table_data = [['Sr No', 'Item', 'Price', 'Quantity', 'Amount']]
-        
-        # Add items with INR currency
-        total_amount = 0
-        for idx, item in enumerate(data['items'], 1):
-            total_amount += item['total']
-            table_data.append([
-                str(idx),
-                item['name'],
-                f"{item['price']:.2f}Rs",
-                str(item['quantity']),
-                f"{item['total']:.2f}Rs"
-            ])
-        
-        # Empty rows for more space
-        for _ in range(3):
-            table_data.append(['', '', '', '', ''])
-        
-        # Use complete page width: adjusted for reduced margins - fixed overflow
-        items_table = Table(table_data, colWidths=[0.6*inch, 3.5*inch, 1.1*inch, 0.9*inch, 1.3*inch])  # Reduced widths to fit page
-        items_table.setStyle(TableStyle([
-            # Header
-            ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),     # Changed to Times-Bold for header
-            ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),   # Times-Roman for data rows
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),   # Sr No center
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),     # Item left
-            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),    # Price right
-            ('ALIGN', (3, 0), (3, -1), 'CENTER'),   # Quantity center
-            ('ALIGN', (4, 0), (4, -1), 'RIGHT'),    # Amount right
-            
-            # Grid lines
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            
-            # Increased Padding for better appearance
-            ('TOPPADDING', (0, 0), (-1, -1), 12),     # Increased from 8 to 12
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),  # Increased from 8 to 12
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),    # Increased from 6 to 10
-            ('RIGHTPADDING', (0, 0), (-1, -1), 10),   # Increased from 6 to 10
-        ]))
-        
-        elements.append(items_table)
-        elements.append(Spacer(1, 0.2*inch))
-        
-        # === TOTAL AMOUNT (below table, right aligned) ===
-        total_para = Paragraph(f"<b>Total Amount: {data['total']:.2f}Rs </b>", 
-                              ParagraphStyle('Total', 
-                                           parent=normal_style, 
-                                           fontSize=10, 
-                                           alignment=TA_RIGHT,
-                                           fontName='Helvetica-Bold'))
-        elements.append(total_para)
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # === PAYMENT STATUS (below total, right aligned) ===
-        status_color = colors.HexColor('#059669') if data['payment_status'] == 'Paid' else colors.HexColor('#dc2626')
-        payment_para = Paragraph(f"Payment Status: <b>{data['payment_status'].upper()}</b>", 
-                                ParagraphStyle('PaymentStatus', 
-                                             parent=normal_style, 
-                                             fontSize=11, 
-                                             textColor=status_color,
-                                             alignment=TA_RIGHT))
-        elements.append(payment_para)
-        elements.append(Spacer(1, 0.15*inch))  # Line break before footer
-        
-        # === SEPARATION LINE BEFORE REMARKS ===
-        elements.append(HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.black))
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # === COMPACT FOOTER ===
-        # Remarks left, signature right - minimal space
-        remarks_text = data.get('notes', '')
-        if not remarks_text:
-            remarks_text = ''
-        
-        footer_data = [
-            ['Remarks:', 'Signature:'],
-            [remarks_text, '']
-        ]
-        
-        footer_table = Table(footer_data, colWidths=[3.8*inch, 3.8*inch])  # Adjusted for reduced margins
-        footer_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),    # Changed to Times-Bold
-            ('FONTNAME', (0, 1), (-1, 1), 'Times-Roman'),   # Changed to Times-Roman
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 1), (1, 1), 15),  # Minimal space for signature
-        ]))
-        
-        elements.append(footer_table)
-        
-        # === SIMPLE FOOTER ===
-        elements.append(Spacer(1, 0.05*inch))
-        elements.append(Paragraph(
-            f"Generated on {datetime.now().strftime('%d-%m-%Y')} | Thank you!",
-            ParagraphStyle(
-                'Footer',
-                parent=normal_style,
-                fontSize=9,
-                textColor=colors.HexColor('#666666'),
-                alignment=TA_CENTER
-            )
-        ))
-        
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
-        
-        # Save bill record - use max ID + 1 to avoid conflicts
-        bills_df = pd.read_csv(BILLS_CSV)
-        # Generate ID based on max existing ID, not count of bills
-        if len(bills_df) > 0:
-            next_id = int(bills_df['bill_id'].max()) + 1
-        else:
-            next_id = 1
-        
-        new_bill = {
-            'bill_id': next_id,
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'customer_name': data['customer']['name'],
-            'customer_phone': data['customer'].get('phone', ''),
-            'customer_email': data['customer'].get('email', ''),
-            'items': str(data['items']),
-            'total': data['total'],
-            'payment_status': data['payment_status'],
-            'notes': data.get('notes', '')
-        }
-        bills_df = pd.concat([bills_df, pd.DataFrame([new_bill])], ignore_index=True)
-        bills_df.to_csv(BILLS_CSV, index=False)
+        bill_format = request.args.get('format', 'pdf')
+        if bill_format not in BILL_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(BILL_FORMATS)}"}), 400
+        signature_error = unknown_signature(data)
+        if signature_error:
+            return jsonify({'error': signature_error}), 400
+        
+        if bill_format != 'pdf':
+            # Receipts render in well under a millisecond, so always inline
+            try:
+                paper = int(request.args.get('paper', DEFAULT_RECEIPT_PAPER))
+                if bill_format == 'escpos':
+                    body = receipt.render_escpos(data, paper)
+                else:
+                    body = receipt.render_text(data, paper)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            bill = storage.create_bill(bill_record(data))
+            if bill_format == 'escpos':
+                response = send_file(io.BytesIO(body), mimetype='application/octet-stream',
+                                     as_attachment=True, download_name=f"bill_{bill['bill_id']}.bin")
+            else:
+                response = Response(body, mimetype='text/plain')
+            response.headers['X-Bill-Id'] = str(bill['bill_id'])
+            return response
+        
+        if request.args.get('async') in ('1', 'true'):
+            bill = storage.create_bill(bill_record(data))
+            job_id = render_jobs.submit(bill['bill_id'], data)
+            return jsonify(job_response(render_jobs.status(job_id))), 202
+        
+        pdf = render_pool.render(data)
+        
+        # Save bill record - the storage backend assigns the bill ID
+        storage.create_bill(bill_record(data))
         
         return send_file(
-            buffer,
+            io.BytesIO(pdf),
             mimetype='application/pdf',
             as_attachment=True,
             download_name='ganpati_bill.pdf'  # Fixed name as requested
@@ -431,17 +323,203 @@ def generate_bill():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Get all bills
+# Generate a batch of bills, rendered in parallel worker processes
+MAX_BATCH_BILLS = 500
+
+@app.route('/api/generate-bills', methods=['POST'])
+def generate_bills():
+    data = request.get_json(silent=True) or {}
+    payloads = data.get('bills')
+    output = data.get('output', 'zip')
+    if not isinstance(payloads, list) or not 1 <= len(payloads) <= MAX_BATCH_BILLS:
+        return jsonify({'error': f'bills must be a list of 1 to {MAX_BATCH_BILLS} bill payloads'}), 400
+    if output not in ('zip', 'pdf'):
+        return jsonify({'error': 'output must be zip or pdf'}), 400
+    try:
+        signature_error = next(filter(None, map(unknown_signature, payloads)), None)
+        if signature_error:
+            return jsonify({'error': signature_error}), 400
+        if output == 'zip':
+            pdfs = render_pool.render_many(payloads)
+        else:
+            # No PDF merging here, so one combined document renders on a single worker
+            combined = render_pool.render_combined(payloads)
+
+        # Reprints pass save=false so the batch is not stored a second time
+        saved = [storage.create_bill(bill_record(bill)) for bill in payloads] if data.get('save', True) else []
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if output == 'pdf':
+            return send_file(io.BytesIO(combined), mimetype='application/pdf',
+                             as_attachment=True, download_name=f'bills_{stamp}.pdf')
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for index, pdf in enumerate(pdfs):
+                name = f"bill_{saved[index]['bill_id']}.pdf" if saved else f"bill_{index + 1:03d}.pdf"
+                archive.writestr(name, pdf)
+        buffer.seek(0)
+        return send_file(buffer, mimetype='application/zip',
+                         as_attachment=True, download_name=f'bills_{stamp}.zip')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Poll an asynchronous render
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = render_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job_response(job))
+
+# Download a bill's PDF - the checkout's own render while its job is tracked,
+# otherwise the stored bill rendered on demand and served from the disk cache
+@app.route('/api/bills/<int:bill_id>/pdf', methods=['GET'])
+def get_bill_pdf(bill_id):
+    try:
+        job_id = render_jobs.job_for_bill(bill_id)
+        job = render_jobs.status(job_id) if job_id else None
+        if job and job['status'] in ('queued', 'running'):
+            return jsonify(job_response(job)), 202
+        # The job may be evicted or forgotten since the status check; then
+        # there is no result and the stored bill is rendered below instead
+        pdf = render_jobs.result(job_id) if job else None
+        if pdf is not None:
+            return send_file(io.BytesIO(pdf), mimetype='application/pdf',
+                             as_attachment=True, download_name=f'bill_{bill_id}.pdf')
+
+        bill = storage.get_bill(bill_id)
+        if bill is None:
+            return jsonify({'error': f'Bill {bill_id} not found'}), 404
+        key, pdf = pdf_cache.get_or_render(bill_payload(bill), render_pool.render)
+        return send_file(pdf, mimetype='application/pdf', as_attachment=True,
+                         download_name=f'bill_{bill_id}.pdf', etag=key)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Bill listing page sizes
+DEFAULT_BILLS_PAGE = 50
+MAX_BILLS_PAGE = 500
+
+def parse_bill_filters(args):
+    """Read the optional bill filters from query args; raises ValueError"""
+    filters = {}
+    for key in ('date_from', 'date_to'):
+        if args.get(key):
+            filters[key] = datetime.strptime(args[key], '%Y-%m-%d').strftime('%Y-%m-%d')
+    for key in ('payment_status', 'phone', 'name', 'item'):
+        if args.get(key):
+            filters[key] = args[key]
+    for key in ('min_total', 'max_total'):
+        if args.get(key):
+            filters[key] = float(args[key])
+    return filters
+
+# Get bills, newest first, one page at a time
 @app.route('/api/bills', methods=['GET'])
 def get_bills():
     try:
-        df = pd.read_csv(BILLS_CSV)
-        # Convert pandas data types to Python native types for JSON serialization
-        records = df.to_dict('records')
-        for record in records:
-            if 'total' in record:
-                record['total'] = float(record['total'])
-        return jsonify(records)
+        limit = int(request.args.get('limit', DEFAULT_BILLS_PAGE))
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        filters = parse_bill_filters(request.args)
+        if not 1 <= limit <= MAX_BILLS_PAGE:
+            raise ValueError(f'limit must be between 1 and {MAX_BILLS_PAGE}')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    def build():
+        bills, next_cursor = storage.query_bills(limit, cursor, **filters)
+        return {'bills': bills, 'next_cursor': next_cursor}
+
+    try:
+        return conditional_json('bills', build)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Bill totals for the history dashboard, from counters kept by every write
+@app.route('/api/bills/stats', methods=['GET'])
+def get_bill_stats():
+    try:
+        return conditional_json('bills', storage.bill_stats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Export bill history as a streamed CSV or NDJSON download
+EXPORT_FIELDS = ['bill_id', 'date', 'customer_name', 'customer_phone', 'customer_email',
+                 'items', 'total', 'payment_status', 'notes']
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def export_rows(bills, export_format):
+    """Serialize bills lazily, yielding ~64KB chunks of output"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    if export_format == 'csv':
+        writer.writeheader()
+    for bill in bills:
+        if export_format == 'csv':
+            writer.writerow({**bill, 'items': json.dumps(bill['items'], separators=(',', ':'))})
+        else:
+            buffer.write(json.dumps(bill) + '\n')
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/api/bills/export', methods=['GET'])
+def export_bills():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        args = request.args.to_dict()
+        args.setdefault('date_from', args.get('from'))
+        args.setdefault('date_to', args.get('to'))
+        filters = parse_bill_filters(args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"bills_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        export_rows(storage.iter_bills(**filters), export_format),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+# Customer autocomplete by phone prefix
+DEFAULT_CUSTOMERS_PAGE = 10
+
+@app.route('/api/customers', methods=['GET'])
+def get_customers():
+    prefix = request.args.get('prefix', '').strip()
+    try:
+        limit = int(request.args.get('limit', DEFAULT_CUSTOMERS_PAGE))
+        if not 1 <= limit <= MAX_BILLS_PAGE:
+            raise ValueError(f'limit must be between 1 and {MAX_BILLS_PAGE}')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    try:
+        return conditional_json('bills', lambda: storage.list_customers(prefix, limit))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# One customer's bills, newest first, paged like /api/bills
+@app.route('/api/customers/<phone>/bills', methods=['GET'])
+def get_customer_bills(phone):
+    try:
+        limit = int(request.args.get('limit', DEFAULT_BILLS_PAGE))
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        if not 1 <= limit <= MAX_BILLS_PAGE:
+            raise ValueError(f'limit must be between 1 and {MAX_BILLS_PAGE}')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    def build():
+        bills, next_cursor = storage.customer_bills(phone, limit, cursor)
+        return {'customer': storage.get_customer(phone), 'bills': bills, 'next_cursor': next_cursor}
+
+    try:
+        if storage.get_customer(phone) is None:
+            return jsonify({'error': f'No bills for customer {phone}'}), 404
+        return conditional_json('bills', build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -454,19 +532,101 @@ def get_shop_details():
 @app.route('/api/bills/<bill_id>', methods=['DELETE'])
 def delete_bill(bill_id):
     try:
-        df = pd.read_csv(BILLS_CSV)
-        
-        # Check if bill exists
-        if bill_id not in df['bill_id'].astype(str).values:
+        if not bill_id.isdigit() or not storage.delete_bill(int(bill_id)):
             return jsonify({'error': f'Bill with ID {bill_id} not found'}), 404
-        
-        # Remove the bill
-        df = df[df['bill_id'].astype(str) != str(bill_id)]
-        df.to_csv(BILLS_CSV, index=False)
+        render_jobs.forget_bill(int(bill_id))
         
         return jsonify({'message': f'Bill {bill_id} deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Update a bill's payment status
+PAYMENT_STATUSES = ('Paid', 'Unpaid')
+
+@app.route('/api/bills/<bill_id>', methods=['PATCH'])
+def update_bill_status(bill_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        payment_status = data.get('payment_status')
+        if payment_status not in PAYMENT_STATUSES:
+            return jsonify({'error': f"payment_status must be one of {', '.join(PAYMENT_STATUSES)}"}), 400
+
+        bill = storage.update_payment_status(int(bill_id), payment_status) if bill_id.isdigit() else None
+        if bill is None:
+            return jsonify({'error': f'Bill with ID {bill_id} not found'}), 404
+        # Its checkout PDF shows the old status; re-downloads render the stored bill
+        render_jobs.forget_bill(bill['bill_id'])
+        return jsonify(bill)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Daily or monthly revenue, read from rollups kept current by every bill write
+REPORT_PERIOD_FORMATS = {'day': '%Y-%m-%d', 'month': '%Y-%m'}
+
+@app.route('/api/reports/revenue', methods=['GET'])
+def revenue_report():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in REPORT_PERIOD_FORMATS:
+        return jsonify({'error': 'granularity must be day or month'}), 400
+    try:
+        # Periods are YYYY-MM-DD days or YYYY-MM months; month reports also take full dates
+        bounds = {}
+        for key in ('from', 'to'):
+            value = request.args.get(key)
+            if value:
+                parsed = datetime.strptime(value, '%Y-%m' if len(value) == 7 else '%Y-%m-%d')
+                if granularity == 'day' and len(value) == 7:
+                    raise ValueError(f'{key} must be a YYYY-MM-DD date')
+                bounds[key] = parsed.strftime(REPORT_PERIOD_FORMATS[granularity])
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    def build():
+        return {
+            'granularity': granularity,
+            'from': bounds.get('from'),
+            'to': bounds.get('to'),
+            'periods': storage.revenue_report(granularity, bounds.get('from'), bounds.get('to')),
+        }
+
+    try:
+        return conditional_json('bills', build)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Compact storage (drop deleted rows from the CSV bills ledger)
+@app.route('/api/bills/compact', methods=['POST'])
+def compact_bills():
+    try:
+        removed = storage.compact()
+        return jsonify({'message': f'Compacted storage, removed {removed} stale bill rows'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Request, storage and PDF render metrics for Prometheus to scrape
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Show or change request profiling (sample one request in N, honour X-Profile: 1)
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    try:
+        if request.method == 'GET':
+            return jsonify(profiling.configure())
+        data = request.json or {}
+        return jsonify(profiling.configure(
+            sample_every=data.get('sample_every'),
+            allow_header=data.get('allow_header'),
+            profiler=data.get('profiler')
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
+    # The debug reloader serves from a child process; warm the workers there
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        render_pool.start()
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bill PDF render time for very large carts
+
+    python benchmarks/bench_large_cart.py --lines 10 1000 10000 --baseline
+
+Renders one bill per cart size and reports time, time per line, pages and
+PDF size. Items are laid out in page-sized chunks (bill_pdf.ITEMS_PER_CHUNK),
+so time per line should stay flat as carts grow. --baseline also renders
+each cart as the single items table used before chunking, whose time per
+line grows with the cart (slow at 10k lines).
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bill_pdf
+from bench_pdf_template import sample_bill
+
+
+def measure(data):
+    start = time.perf_counter()
+    pdf = bill_pdf.render_bill(data)
+    seconds = time.perf_counter() - start
+    return seconds, len(re.findall(rb'/Type /Page\b', pdf)), len(pdf)
+
+
+def report(label, lines, seconds, pages, size):
+    print(f"  {label:8} {lines:6} lines  {seconds * 1000:9.1f} ms  "
+          f"{seconds * 1e6 / lines:7.1f} us/line  {pages:4} pages  {size / 1024:8.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, nargs='+', default=[10, 1000, 10000], help='cart sizes')
+    parser.add_argument('--baseline', action='store_true', help='also time the single-table layout')
+    args = parser.parse_args()
+
+    bill_pdf.render_bill(sample_bill(1))  # warm the template cache
+    chunk = bill_pdf.ITEMS_PER_CHUNK
+    print(f"📄 Large cart rendering ({chunk} items per chunk)")
+    for lines in args.lines:
+        data = sample_bill(lines)
+        report('chunked', lines, *measure(data))
+        if args.baseline:
+            bill_pdf.ITEMS_PER_CHUNK = lines
+            try:
+                report('single', lines, *measure(data))
+            finally:
+                bill_pdf.ITEMS_PER_CHUNK = chunk
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-bill PDF cost with and without the cached BillTemplate
+
+    python benchmarks/bench_pdf_template.py --bills 300 --items 5 --rounds 5
+
+"Cold" rebuilds the sample stylesheet, paragraph/table styles and shop
+header for every bill, as generate_bill used to. "Warm" reuses the cached
+template for the shop profile, which is what bill_pdf does now.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.styles import getSampleStyleSheet
+
+import bill_pdf
+
+SHOP = {
+    'name': 'Ganpati Electronics and E Services',
+    'owner': 'Shop Owner',
+    'address': '123 Main Street, Electronics Market',
+    'phone': '+91 98765 43210',
+    'email': 'contact@ganpatielectronics.com',
+}
+
+
+def sample_bill(items):
+    lines = [
+        {'name': f'Item {i}', 'quantity': 1 + i % 3, 'price': 10.0 + i, 'total': (1 + i % 3) * (10.0 + i)}
+        for i in range(items)
+    ]
+    return {
+        'shop': SHOP,
+        'customer': {'name': 'Bench Customer', 'phone': '9898989889'},
+        'items': lines,
+        'total': sum(line['total'] for line in lines),
+        'payment_status': 'Paid',
+        'notes': '',
+    }
+
+
+def cold_story(data):
+    getSampleStyleSheet()
+    return bill_pdf.BillTemplate(data['shop']).story(data)
+
+
+def warm_story(data):
+    return bill_pdf.build_story(data)
+
+
+def per_bill_ms(make_story, data, bills, build_pdf):
+    start = time.perf_counter()
+    for _ in range(bills):
+        story = make_story(data)
+        if build_pdf:
+            bill_pdf._new_document(io.BytesIO()).build(story)
+    return (time.perf_counter() - start) * 1000 / bills
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bills', type=int, default=300, help='bills per measurement')
+    parser.add_argument('--items', type=int, default=5, help='line items per bill')
+    parser.add_argument('--rounds', type=int, default=5, help='alternating rounds; the best is reported')
+    args = parser.parse_args()
+
+    data = sample_bill(args.items)
+    warm_story(data)  # fill the template cache
+
+    print(f"📄 {args.bills} bills x {args.items} items")
+    for label, build_pdf in (('story setup', False), ('full render', True)):
+        # Alternate the variants and keep each one's best round to damp machine noise
+        cold = warm = float('inf')
+        for _ in range(args.rounds):
+            cold = min(cold, per_bill_ms(cold_story, data, args.bills, build_pdf))
+            warm = min(warm, per_bill_ms(warm_story, data, args.bills, build_pdf))
+        print(f"  {label:12} cold {cold:7.3f} ms  warm {warm:7.3f} ms  "
+              f"saved {cold - warm:6.3f} ms/bill ({(1 - warm / cold) * 100:4.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
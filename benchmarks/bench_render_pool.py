@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: bill PDFs/sec rendered in-thread vs. across worker processes
+
+    python benchmarks/bench_render_pool.py --bills 200 --items 10 --clients 8 --workers 1 2 4
+
+Each run fires --bills checkouts from --clients threads, like a threaded
+Flask server. "in-thread" renders inside those threads, where reportlab
+holds the GIL and only one bill makes progress at a time; each worker
+count then routes the same renders through render_pool. Pools are warmed
+before the clock starts, as app.py does at startup.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bill_pdf
+import render_pool
+from bench_pdf_template import SHOP, sample_bill
+
+
+def pdfs_per_sec(render, data, bills, clients):
+    with ThreadPoolExecutor(max_workers=clients) as checkouts:
+        start = time.perf_counter()
+        list(checkouts.map(render, [data] * bills))
+    return bills / (time.perf_counter() - start)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bills', type=int, default=200, help='bills per measurement')
+    parser.add_argument('--items', type=int, default=10, help='line items per bill')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, cpus, cpus * 2}),
+                        help='worker counts to measure')
+    args = parser.parse_args()
+
+    data = sample_bill(args.items)
+    bill_pdf.render_bill(data)  # warm this process's template for the in-thread run
+
+    print(f"📄 {args.bills} bills x {args.items} items, {args.clients} client threads, {cpus} CPU(s)")
+    baseline = pdfs_per_sec(bill_pdf.render_bill, data, args.bills, args.clients)
+    print(f"  in-thread     {baseline:7.1f} PDFs/sec")
+    for workers in args.workers:
+        render_pool.start(workers, shop=SHOP)
+        rate = pdfs_per_sec(render_pool.render, data, args.bills, args.clients)
+        print(f"  {workers:2} worker(s)  {rate:7.1f} PDFs/sec  ({rate / baseline:4.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for load tests
+
+    python benchmarks/gen_dataset.py --skus 100000 --bills 1000000 --out /tmp/billing-bench
+    python benchmarks/gen_dataset.py --skus 1000000 --bills 10000000 --backend sqlite --out /tmp/billing-bench
+
+Writes an inventory of --skus items and a history of --bills bills in the
+same formats the app reads: inventory.csv + bills.csv for the CSV backend,
+or billing.db for SQLite. Rows are streamed to disk, so memory stays flat
+however large the dataset; the same --seed always produces the same data.
+Bills are spread over the last --days days, oldest first, and reuse a pool
+of --customers phone numbers so customer history pages have depth.
+
+Serve it with the app, e.g. for SQLite:
+
+    BILLING_STORAGE=sqlite BILLING_DB=/tmp/billing-bench/billing.db flask --app app run --port 5001
+
+For CSV, run the same command from the output directory with the repository
+on PYTHONPATH, since app.py opens inventory.csv and bills.csv in the cwd.
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import BillLedger, InventoryStore, encode_items
+
+# SKU names are "<brand> <product> <model>", so catalog searches hit realistic prefixes
+BRANDS = ['Ganpati', 'Sonic', 'Voltex', 'Lumina', 'Aero', 'Nimbus', 'Orbit', 'Pixel', 'Quanta', 'Zenith']
+PRODUCTS = ['Laptop', 'Mouse', 'Keyboard', 'Charger', 'Cable', 'Speaker', 'Headphones', 'Monitor',
+            'Router', 'Printer', 'Adapter', 'Battery', 'Fan', 'Lamp', 'Extension Board', 'Power Bank']
+FIRST_NAMES = ['Harish', 'Priya', 'Amit', 'Sunita', 'Ravi', 'Kavita', 'Manoj', 'Deepa', 'Suresh', 'Anita']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Singh', 'Choudhary', 'Jain', 'Meena', 'Gupta']
+
+# Rows written per SQLite transaction
+SQLITE_BATCH = 10000
+
+
+def sku_name(sku_id):
+    return f"{BRANDS[sku_id % len(BRANDS)]} {PRODUCTS[sku_id // len(BRANDS) % len(PRODUCTS)]} {sku_id:07d}"
+
+
+def sku_price(rng):
+    return round(rng.choice([rng.uniform(10, 500), rng.uniform(500, 5000), rng.uniform(5000, 90000)]), 2)
+
+
+def customer(index):
+    """(name, phone) for the index-th customer of the pool"""
+    name = f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[index // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+    return name, f"9{index:09d}"
+
+
+def inventory_rows(skus, seed):
+    rng = random.Random(seed)
+    for sku_id in range(1, skus + 1):
+        yield {'id': sku_id, 'name': sku_name(sku_id), 'price': sku_price(rng)}
+
+
+def bill_rows(bills, skus, customers, days, max_lines, seed):
+    """Bills oldest first; item prices are regenerated from the inventory seed"""
+    rng = random.Random(seed + 1)
+    price_rng = random.Random(seed)
+    prices = [sku_price(price_rng) for _ in range(min(skus, 100000))]
+    start = datetime.now().replace(microsecond=0) - timedelta(days=days)
+    step = days * 86400 / max(bills, 1)
+    for bill_id in range(1, bills + 1):
+        items = []
+        for _ in range(rng.randint(1, max_lines)):
+            # Sales concentrate on the first 100k SKUs, like a shop's fast movers
+            sku_id = rng.randint(1, len(prices))
+            quantity = rng.randint(1, 5)
+            price = prices[sku_id - 1]
+            items.append({'name': sku_name(sku_id), 'quantity': quantity, 'price': price,
+                          'total': round(price * quantity, 2)})
+        name, phone = customer(rng.randrange(customers))
+        yield {
+            'bill_id': bill_id,
+            'date': (start + timedelta(seconds=int(bill_id * step))).strftime('%Y-%m-%d %H:%M:%S'),
+            'customer_name': name,
+            'customer_phone': phone,
+            'customer_email': '',
+            'items': items,
+            'total': round(sum(item['total'] for item in items), 2),
+            'payment_status': 'Paid' if rng.random() < 0.9 else 'Unpaid',
+            'notes': '',
+            'signature_id': '',
+        }
+
+
+def write_csv(out, inventory, bills):
+    with open(os.path.join(out, 'inventory.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=InventoryStore.FIELDS)
+        writer.writeheader()
+        writer.writerows(inventory)
+    with open(os.path.join(out, 'bills.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=BillLedger.FIELDS)
+        writer.writeheader()
+        for bill in bills:
+            writer.writerow({**bill, 'items': encode_items(bill['items'])})
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_sqlite(out, inventory, bills):
+    from sqlite_storage import SqliteStorage
+
+    target = SqliteStorage(os.path.join(out, 'billing.db'))
+    if target.query_bills(1)[0]:
+        raise RuntimeError(f"{out}/billing.db already contains bills; use a fresh --out")
+    for batch in batches(inventory, SQLITE_BATCH):
+        target.import_records(batch, [])
+    for batch in batches(bills, SQLITE_BATCH):
+        target.import_records([], batch)
+    target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=10000, help='inventory items (up to 1M)')
+    parser.add_argument('--bills', type=int, default=100000, help='bills in the history (up to 10M)')
+    parser.add_argument('--customers', type=int, default=5000, help='distinct customer phones')
+    parser.add_argument('--days', type=int, default=365, help='days of history')
+    parser.add_argument('--max-lines', type=int, default=8, help='most line items per bill')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', required=True, help='output directory')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    inventory = inventory_rows(args.skus, args.seed)
+    bills = bill_rows(args.bills, args.skus, args.customers, args.days, args.max_lines, args.seed)
+    print(f"🏭 Generating {args.skus} SKUs and {args.bills} bills ({args.backend}) in {args.out}")
+    start = time.perf_counter()
+    if args.backend == 'csv':
+        write_csv(args.out, inventory, bills)
+    else:
+        write_sqlite(args.out, inventory, bills)
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+HTTP load test: Streamlit-like traffic against a running app.py
+
+    python benchmarks/load_test.py --url http://localhost:5001 --concurrency 8 --duration 60 --output run.json
+    python benchmarks/load_test.py --url http://localhost:5001 --compare run.json
+
+Each of --concurrency virtual users loops over scenarios picked by --mix
+weights (default catalog=5,checkout=2,history=3,inventory=1):
+
+    catalog   catalog search with 2-6 letter prefixes, as the billing tab types
+    inventory the full catalog, as the Manage Inventory tab downloads it
+    checkout  customer autocomplete, then checkout (async by default, as the
+              Streamlit app does: poll the job, then download the PDF)
+    history   bill stats, the first page of bills and the page after it
+
+GETs go through a per-user ETag cache like the app's conditional_get, so
+304 revalidations are part of the measurement. The first --warmup seconds
+are not recorded. Throughput and p50/p95/p99 latency are reported per
+endpoint and written to --output as JSON; --compare prints the change
+against an earlier run. Seed the server with gen_dataset.py first.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from gen_dataset import BRANDS, PRODUCTS
+
+DEFAULT_MIX = 'catalog=5,checkout=2,history=3,inventory=1'
+SHOP = {
+    'name': 'Ganpati Electronics and E Services',
+    'owner': 'Shop Owner',
+    'address': '123 Main Street, Electronics Market',
+    'phone': '+91 98765 43210',
+    'email': 'contact@ganpatielectronics.com',
+}
+CATALOG_PAGE_SIZE = 40
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Latencies and error counts per endpoint label, shared by all users"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.recording = False
+        self.lock = threading.Lock()
+
+    def add(self, label, seconds, ok):
+        if not self.recording:
+            return
+        with self.lock:
+            self.latencies.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+    @staticmethod
+    def _stats(latencies, errors, seconds):
+        ordered = sorted(latencies)
+        ms = lambda value: round(value * 1000, 2)
+        return {
+            'requests': len(ordered),
+            'errors': errors,
+            'rps': round(len(ordered) / seconds, 2) if seconds else 0.0,
+            'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            'p50_ms': ms(percentile(ordered, 50)),
+            'p95_ms': ms(percentile(ordered, 95)),
+            'p99_ms': ms(percentile(ordered, 99)),
+            'max_ms': ms(ordered[-1]) if ordered else 0.0,
+        }
+
+    def summary(self, seconds):
+        endpoints = {
+            label: self._stats(latencies, self.errors.get(label, 0), seconds)
+            for label, latencies in sorted(self.latencies.items())
+        }
+        everything = [value for latencies in self.latencies.values() for value in latencies]
+        return endpoints, self._stats(everything, sum(self.errors.values()), seconds)
+
+
+class VirtualUser:
+    """One simulated cashier with their own HTTP session and ETag cache"""
+
+    def __init__(self, base_url, recorder, rng, checkout, think):
+        self.api = f"{base_url.rstrip('/')}/api"
+        self.recorder = recorder
+        self.rng = rng
+        self.checkout_mode = checkout
+        self.think = think
+        self.session = requests.Session()
+        self.etags = {}
+        self.catalog = []
+        self.phones = []
+
+    def request(self, label, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.api}/{path}", timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(label, time.perf_counter() - start, False)
+            return None
+        self.recorder.add(label, time.perf_counter() - start, response.status_code < 400)
+        return response
+
+    def get_json(self, label, path, params=None):
+        """GET with If-None-Match revalidation; the JSON body or None on failure"""
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self.etags.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = self.request(label, 'GET', path, params=params, headers=headers)
+        if response is None:
+            return None
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if response.headers.get('ETag'):
+            if len(self.etags) >= 20:
+                self.etags.pop(next(iter(self.etags)))
+            self.etags[key] = (response.headers['ETag'], data)
+        return data
+
+    # Scenarios
+    def browse_catalog(self):
+        word = self.rng.choice(BRANDS + PRODUCTS).lower()
+        query = word[:self.rng.randint(2, min(6, len(word)))]
+        items = self.get_json('GET /api/inventory/search', 'inventory/search',
+                              {'q': query, 'limit': CATALOG_PAGE_SIZE})
+        if items:
+            self.catalog = items
+
+    def fetch_inventory(self):
+        self.get_json('GET /api/inventory', 'inventory')
+
+    def checkout(self):
+        if not self.catalog:
+            self.browse_catalog()
+        if not self.catalog:
+            return
+        phone = self.rng.choice(self.phones) if self.phones else f"9{self.rng.randrange(10 ** 9):09d}"
+        customers = self.get_json('GET /api/customers', 'customers', {'prefix': phone[:5], 'limit': 5})
+        if customers:
+            self.phones = [customer['phone'] for customer in customers]
+        items = []
+        for item in self.rng.sample(self.catalog, min(len(self.catalog), self.rng.randint(1, 5))):
+            quantity = self.rng.randint(1, 3)
+            items.append({'name': item['name'], 'quantity': quantity, 'price': item['price'],
+                          'total': item['price'] * quantity})
+        total = sum(item['total'] for item in items)
+        bill = {
+            'shop': SHOP,
+            'customer': {'name': 'Load Test', 'phone': phone},
+            'items': items,
+            'subtotal': total,
+            'total': total,
+            'payment_status': 'Paid',
+            'notes': '',
+        }
+        if self.checkout_mode == 'sync':
+            self.request('POST /api/generate-bill', 'POST', 'generate-bill', json=bill)
+        elif self.checkout_mode == 'receipt':
+            self.request('POST /api/generate-bill?format=receipt-text', 'POST', 'generate-bill',
+                         params={'format': 'receipt-text'}, json=bill)
+        else:
+            response = self.request('POST /api/generate-bill?async=1', 'POST', 'generate-bill',
+                                    params={'async': 1}, json=bill)
+            if response is None or response.status_code != 202:
+                return
+            job = response.json()
+            deadline = time.time() + 30
+            while time.time() < deadline:
+                status = self.request('GET /api/jobs/<id>', 'GET', f"jobs/{job['job_id']}")
+                if status is None or status.json().get('status') in ('done', 'failed'):
+                    break
+                time.sleep(0.05)
+            self.request('GET /api/bills/<id>/pdf', 'GET', f"bills/{job['bill_id']}/pdf")
+
+    def view_history(self):
+        self.get_json('GET /api/bills/stats', 'bills/stats')
+        page = self.get_json('GET /api/bills', 'bills', {'limit': 50})
+        if page and page.get('next_cursor'):
+            self.get_json('GET /api/bills', 'bills', {'limit': 50, 'cursor': page['next_cursor']})
+
+    def run(self, scenarios, weights, deadline):
+        while time.time() < deadline:
+            self.rng.choices(scenarios, weights)[0]()
+            if self.think:
+                time.sleep(self.think)
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('catalog', 'checkout', 'history', 'inventory'):
+            raise ValueError(f"unknown scenario {name!r} in --mix")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_table(endpoints, total):
+    print(f"  {'endpoint':44} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, stats in list(endpoints.items()) + [('TOTAL', total)]:
+        print(f"  {label:44} {stats['requests']:7} {stats['errors']:5} {stats['rps']:8.1f} "
+              f"{stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f} {stats['max_ms']:8.1f}")
+
+
+def print_comparison(endpoints, previous):
+    print(f"📊 Change against {previous['meta'].get('started')} ({previous['meta'].get('git_commit')})")
+    for label, stats in endpoints.items():
+        before = previous['endpoints'].get(label)
+        if not before:
+            continue
+        change = lambda key: (stats[key] / before[key] - 1) * 100 if before[key] else 0.0
+        print(f"  {label:44} req/s {change('rps'):+7.1f}%   p95 {change('p95_ms'):+7.1f}%   p99 {change('p99_ms'):+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5001', help='base URL of the running app')
+    parser.add_argument('--concurrency', type=int, default=8, help='virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unrecorded seconds before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario weights')
+    parser.add_argument('--checkout', choices=['async', 'sync', 'receipt'], default='async')
+    parser.add_argument('--think-ms', type=float, default=0, help='pause between scenarios per user')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    recorder = Recorder()
+    users = [
+        VirtualUser(args.url, recorder, random.Random(args.seed + index), args.checkout, args.think_ms / 1000)
+        for index in range(args.concurrency)
+    ]
+    scenarios = {'catalog': 'browse_catalog', 'checkout': 'checkout', 'history': 'view_history',
+                 'inventory': 'fetch_inventory'}
+
+    print(f"🚦 {args.concurrency} users against {args.url} for {args.duration:g}s "
+          f"(+{args.warmup:g}s warm-up), mix {args.mix}, {args.checkout} checkout")
+    started = datetime.now().isoformat(timespec='seconds')
+    deadline = time.time() + args.warmup + args.duration
+    threads = [
+        threading.Thread(target=user.run, daemon=True, args=(
+            [getattr(user, scenarios[name]) for name in weights], list(weights.values()), deadline))
+        for user in users
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.recording = True
+    measure_start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    recorder.recording = False
+    seconds = time.perf_counter() - measure_start
+
+    endpoints, total = recorder.summary(seconds)
+    print_table(endpoints, total)
+    results = {
+        'meta': {
+            'started': started,
+            'url': args.url,
+            'concurrency': args.concurrency,
+            'duration_s': round(seconds, 2),
+            'warmup_s': args.warmup,
+            'mix': weights,
+            'checkout': args.checkout,
+            'think_ms': args.think_ms,
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        },
+        'endpoints': endpoints,
+        'total': total,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(endpoints, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    return 0 if total['requests'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
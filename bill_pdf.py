@@ -0,0 +1,355 @@
+# bill_pdf.py - ReportLab rendering of bill PDFs
+import copy
+import io
+from datetime import datetime
+from functools import lru_cache
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    Flowable, HRFlowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+)
+
+import signature_store
+
+
+# Write PDF streams as binary rather than ASCII85 text: ReportLab's encoder
+# is pure Python, and for a signature image it cost more than the whole bill
+rl_config.useA85 = 0
+
+# Bump whenever the rendered layout changes, so cached PDFs are re-rendered
+LAYOUT_VERSION = 3
+
+# Item rows that fit one A4 page at 37.2pt each, leaving room for the header
+# and subtotal rows; longer carts are laid out one table per chunk
+ITEMS_PER_CHUNK = 18
+
+ITEM_HEADER = ['Sr No', 'Item', 'Price', 'Quantity', 'Amount']
+# Use complete page width: adjusted for reduced margins - fixed overflow
+ITEM_COL_WIDTHS = [0.6*inch, 3.5*inch, 1.1*inch, 0.9*inch, 1.3*inch]  # Reduced widths to fit page
+
+
+def bill_date(data):
+    """DD-MM-YYYY for the bill: its stored date on reprints, today for new bills"""
+    if not data.get('date'):
+        return datetime.now().strftime('%d-%m-%Y')
+    try:
+        return datetime.strptime(str(data['date'])[:10], '%Y-%m-%d').strftime('%d-%m-%Y')
+    except ValueError:
+        return str(data['date'])
+
+
+def _new_document(buffer):
+    return SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=0.175*inch,  # Reduced from 0.7 to 0.175 (25% of original)
+        leftMargin=0.175*inch,   # Reduced from 0.7 to 0.175 (25% of original)
+        topMargin=0.5*inch,
+        bottomMargin=0.5*inch
+    )
+
+
+class SignatureImage(Flowable):
+    """A stored signature drawn from its cached ImageReader, scaled to fit the footer"""
+
+    def __init__(self, reader, max_width=1.5*inch, max_height=0.5*inch):
+        super().__init__()
+        width, height = reader.getSize()
+        scale = min(max_width / width, max_height / height)
+        self.reader = reader
+        self.width = width * scale
+        self.height = height * scale
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask='auto')
+
+
+# Shared by every template; building it is a large part of the per-bill setup
+_SAMPLE_STYLES = getSampleStyleSheet()
+
+
+class BillTemplate:
+    """The parts of a bill that depend only on the shop profile.
+
+    Paragraph styles, table styles and the parsed shop header are built
+    once per shop and reused; ``story()`` only creates the flowables that
+    hold bill data. Shared flowables are shallow-copied into each story so
+    concurrent renders never share layout state.
+    """
+
+    def __init__(self, shop):
+        styles = _SAMPLE_STYLES
+
+        # Custom styles - Better fonts and styling
+        shop_name_style = ParagraphStyle(
+            'ShopName',
+            parent=styles['Heading1'],
+            fontSize=20,  # Reduced from 24 to fit in one line
+            textColor=colors.HexColor('#000000'),
+            spaceAfter=4,  # Reduced spacing
+            alignment=TA_CENTER,
+            fontName='Times-Bold'  # Changed to Times-Bold for better appearance
+        )
+
+        shop_address_style = ParagraphStyle(
+            'ShopAddress',
+            parent=styles['Normal'],
+            fontSize=11,  # Slightly reduced
+            textColor=colors.HexColor('#000000'),
+            spaceAfter=10,
+            alignment=TA_CENTER,
+            fontName='Times-Roman'  # Changed to Times-Roman
+        )
+
+        self.normal_style = ParagraphStyle(
+            'Normal',
+            parent=styles['Normal'],
+            fontSize=11,
+            textColor=colors.HexColor('#000000'),
+            fontName='Times-Roman'  # Changed to Times-Roman
+        )
+
+        bold_style = ParagraphStyle(
+            'Bold',
+            parent=styles['Normal'],
+            fontSize=11,
+            textColor=colors.HexColor('#000000'),
+            fontName='Times-Bold'  # Changed to Times-Bold
+        )
+
+        self.total_style = ParagraphStyle(
+            'Total',
+            parent=self.normal_style,
+            fontSize=10,
+            alignment=TA_RIGHT,
+            fontName='Helvetica-Bold'
+        )
+
+        # Payment status is green when paid, red otherwise
+        self.status_styles = {
+            paid: ParagraphStyle(
+                'PaymentStatus',
+                parent=self.normal_style,
+                fontSize=11,
+                textColor=colors.HexColor('#059669') if paid else colors.HexColor('#dc2626'),
+                alignment=TA_RIGHT
+            )
+            for paid in (True, False)
+        }
+
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=self.normal_style,
+            fontSize=9,
+            textColor=colors.HexColor('#666666'),
+            alignment=TA_CENTER
+        )
+
+        self.date_owner_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),  # Changed to Times-Roman
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),    # Date left
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),   # Owner right
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ])
+
+        self.items_style = TableStyle([
+            # Header
+            ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),     # Changed to Times-Bold for header
+            ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),   # Times-Roman for data rows
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),   # Sr No center
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),     # Item left
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),    # Price right
+            ('ALIGN', (3, 0), (3, -1), 'CENTER'),   # Quantity center
+            ('ALIGN', (4, 0), (4, -1), 'RIGHT'),    # Amount right
+
+            # Grid lines
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+
+            # Increased Padding for better appearance
+            ('TOPPADDING', (0, 0), (-1, -1), 12),     # Increased from 8 to 12
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),  # Increased from 8 to 12
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),    # Increased from 6 to 10
+            ('RIGHTPADDING', (0, 0), (-1, -1), 10),   # Increased from 6 to 10
+        ])
+
+        # Chunks of a long cart end in a bold running-subtotal row
+        self.chunk_style = TableStyle([
+            ('SPAN', (0, -1), (3, -1)),
+            ('FONTNAME', (0, -1), (-1, -1), 'Times-Bold'),
+            ('ALIGN', (0, -1), (3, -1), 'RIGHT'),
+        ], parent=self.items_style)
+
+        self.footer_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),    # Changed to Times-Bold
+            ('FONTNAME', (0, 1), (-1, 1), 'Times-Roman'),   # Changed to Times-Roman
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 1), (1, 1), 15),  # Minimal space for signature
+        ])
+
+        self.owner = shop.get('owner', 'N/A')
+
+        # === SHOP HEADER ===
+        # Large shop name at top (one line), then address, phone and email in one line
+        contact_line = f"{shop['address']} | Phone: {shop['phone']} | Email: {shop['email']}"
+        self.header = [
+            Paragraph(shop['name'].upper(), shop_name_style),
+            Spacer(1, 0.05*inch),  # Reduced spacing
+            Paragraph(contact_line, shop_address_style),
+            Spacer(1, 0.08*inch),  # Minimized space between address and date
+        ]
+
+        # === SEPARATION LINE BETWEEN SHOP AND OTHER DETAILS ===
+        # followed by the customer details heading
+        self.customer_heading = [
+            HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.black),
+            Spacer(1, 0.15*inch),
+            Paragraph("CUSTOMER DETAILS:", bold_style),
+            Spacer(1, 0.1*inch),
+        ]
+
+    def story(self, data):
+        """Flowables for one bill; ``data`` is a /api/generate-bill payload"""
+        today = bill_date(data)
+        elements = [copy.copy(flowable) for flowable in self.header]
+
+        # Date left, Owner Name right (below address line)
+        date_owner_table = Table(
+            [[f"Date: {today}", f"Owner: {self.owner}"]],
+            colWidths=[3.5*inch, 3.5*inch]  # Adjusted for reduced margins
+        )
+        date_owner_table.setStyle(self.date_owner_style)
+        elements.append(date_owner_table)
+        elements.append(Spacer(1, 0.1*inch))  # Reduced spacing
+
+        # === CUSTOMER DETAILS (simplified - only name and mobile) ===
+        elements.extend(copy.copy(flowable) for flowable in self.customer_heading)
+        elements.append(Paragraph(f"Name: {data['customer']['name']}", self.normal_style))
+        elements.append(Spacer(1, 0.05*inch))
+        elements.append(Paragraph(f"Mobile No: {data['customer'].get('phone', 'N/A')}", self.normal_style))
+        elements.append(Spacer(1, 0.3*inch))
+
+        # === ITEMS TABLE (using complete page width) ===
+        elements.extend(self.items_tables(data['items']))
+        elements.append(Spacer(1, 0.2*inch))
+
+        # === TOTAL AMOUNT (below table, right aligned) ===
+        elements.append(Paragraph(f"<b>Total Amount: {data['total']:.2f}Rs </b>", self.total_style))
+        elements.append(Spacer(1, 0.1*inch))
+
+        # === PAYMENT STATUS (below total, right aligned) ===
+        elements.append(Paragraph(
+            f"Payment Status: <b>{data['payment_status'].upper()}</b>",
+            self.status_styles[data['payment_status'] == 'Paid']
+        ))
+        elements.append(Spacer(1, 0.15*inch))  # Line break before footer
+
+        # === SEPARATION LINE BEFORE REMARKS ===
+        elements.append(HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.black))
+        elements.append(Spacer(1, 0.1*inch))
+
+        # === COMPACT FOOTER ===
+        # Remarks left, signature right - minimal space
+        reader = signature_store.image_reader(data['signature_id']) if data.get('signature_id') else None
+        footer_table = Table(
+            [['Remarks:', 'Signature:'], [data.get('notes') or '', SignatureImage(reader) if reader else '']],
+            colWidths=[3.8*inch, 3.8*inch]  # Adjusted for reduced margins
+        )
+        footer_table.setStyle(self.footer_table_style)
+        elements.append(footer_table)
+
+        # === SIMPLE FOOTER ===
+        elements.append(Spacer(1, 0.05*inch))
+        elements.append(Paragraph(f"Generated on {today} | Thank you!", self.footer_style))
+        return elements
+
+
+    @staticmethod
+    def item_rows(items, first_index):
+        """Table rows for items, numbered from ``first_index``, with INR currency"""
+        return [
+            [
+                str(idx),
+                item['name'],
+                f"{item['price']:.2f}Rs",
+                str(item['quantity']),
+                f"{item['total']:.2f}Rs"
+            ]
+            for idx, item in enumerate(items, first_index)
+        ]
+
+    def items_tables(self, items):
+        """One items table for a page-sized cart, else one per ITEMS_PER_CHUNK items.
+
+        ReportLab re-measures every remaining row each time it splits a table
+        across pages, so one huge table costs quadratic time. Chunked tables
+        each repeat the header row and end with a running subtotal, keeping
+        layout linear in the number of lines.
+        """
+        if len(items) <= ITEMS_PER_CHUNK:
+            # Empty rows for more space
+            table = Table([ITEM_HEADER] + self.item_rows(items, 1) + [['', '', '', '', '']] * 3,
+                          colWidths=ITEM_COL_WIDTHS)
+            table.setStyle(self.items_style)
+            return [table]
+
+        tables = []
+        subtotal = 0.0
+        for start in range(0, len(items), ITEMS_PER_CHUNK):
+            chunk = items[start:start + ITEMS_PER_CHUNK]
+            subtotal += sum(item['total'] for item in chunk)
+            rows = [ITEM_HEADER] + self.item_rows(chunk, start + 1)
+            rows.append([f"Subtotal (items 1-{start + len(chunk)})", '', '', '', f"{subtotal:.2f}Rs"])
+            # repeatRows keeps the header if a chunk still has to split
+            table = Table(rows, colWidths=ITEM_COL_WIDTHS, repeatRows=1)
+            table.setStyle(self.chunk_style)
+            tables.append(table)
+        return tables
+
+
+@lru_cache(maxsize=16)
+def _template(shop_profile):
+    return BillTemplate(dict(shop_profile))
+
+
+def template_for(shop):
+    """The cached BillTemplate for a shop profile (any dict of shop details)"""
+    return _template(tuple(sorted(shop.items())))
+
+
+def build_story(data):
+    """Flowables for one bill; ``data`` is a /api/generate-bill payload"""
+    return template_for(data['shop']).story(data)
+
+
+def render_bill(data):
+    """Render one bill payload to PDF bytes"""
+    buffer = io.BytesIO()
+    _new_document(buffer).build(build_story(data))
+    return buffer.getvalue()
+
+
+def render_combined(payloads):
+    """Render several bills into one PDF, each starting on a new page"""
+    elements = []
+    for data in payloads:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(build_story(data))
+    buffer = io.BytesIO()
+    _new_document(buffer).build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,97 @@
+# commit_queue.py - Single-writer commit queue with group commit
+import os
+import queue
+import threading
+
+
+class _Request:
+    __slots__ = ('target', 'apply', 'result', 'error', 'done')
+
+    def __init__(self, target, apply):
+        self.target = target
+        self.apply = apply
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class CommitQueue:
+    """Funnel mutations through one writer thread and commit them in batches.
+
+    Callers hand ``submit()`` a target store and a function that stages a
+    change in memory. The writer drains whatever is queued, applies each
+    staged change under the target's lock, then calls ``target.flush()``
+    once per target for the whole batch before acknowledging the callers.
+    Under concurrent load many mutations share one write and one fsync.
+
+    A target needs ``lock``, ``flush()`` and ``discard_pending()``; the
+    latter is called when a flush fails so memory is re-read from disk.
+    """
+
+    def __init__(self, max_batch=512):
+        self.max_batch = max_batch
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name='commit-queue', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def submit(self, target, apply):
+        """Run ``apply()`` on the writer thread and wait until it is flushed"""
+        request = _Request(target, apply)
+        if threading.current_thread() is self._thread:
+            # Re-entrant call from inside a batch: commit it inline
+            self._commit([request])
+        else:
+            self._ensure_started()
+            self._queue.put(request)
+            request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        by_target = {}
+        for request in batch:
+            by_target.setdefault(id(request.target), []).append(request)
+        for requests in by_target.values():
+            target = requests[0].target
+            with target.lock:
+                for request in requests:
+                    try:
+                        request.result = request.apply()
+                    except Exception as e:
+                        request.error = e
+                try:
+                    target.flush()
+                except Exception as e:
+                    target.discard_pending()
+                    for request in requests:
+                        if request.error is None:
+                            request.error = e
+        for request in batch:
+            request.done.set()
@@ -0,0 +1,52 @@
+# customer_index.py - Phone number -> bill ids index over the live bills
+import bisect
+
+
+class CustomerIndex:
+    """Bill ids per customer phone, updated incrementally by the CSV ledger.
+
+    Each phone keeps its bill ids in ascending order and the phones
+    themselves are kept sorted, so a customer's history and a prefix
+    lookup for autocomplete both cost the same however long the bill
+    history grows. Bills without a phone are not indexed.
+    """
+
+    def __init__(self):
+        self._bills = {}
+        self._phones = []
+
+    def add(self, bill):
+        phone = bill['customer_phone']
+        if not phone:
+            return
+        ids = self._bills.get(phone)
+        if ids is None:
+            ids = self._bills[phone] = []
+            bisect.insort(self._phones, phone)
+        bisect.insort(ids, bill['bill_id'])
+
+    def remove(self, bill):
+        phone = bill['customer_phone']
+        ids = self._bills.get(phone)
+        if not ids:
+            return
+        index = bisect.bisect_left(ids, bill['bill_id'])
+        if index < len(ids) and ids[index] == bill['bill_id']:
+            del ids[index]
+        if not ids:
+            del self._bills[phone]
+            del self._phones[bisect.bisect_left(self._phones, phone)]
+
+    def bill_ids(self, phone):
+        """Ascending bill ids for ``phone`` (empty if unknown)"""
+        return self._bills.get(phone, [])
+
+    def phones(self, prefix, limit):
+        """Up to ``limit`` known phones starting with ``prefix``, in order"""
+        start = bisect.bisect_left(self._phones, prefix)
+        matches = []
+        for phone in self._phones[start:start + limit]:
+            if not phone.startswith(prefix):
+                break
+            matches.append(phone)
+        return matches
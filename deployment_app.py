@@ -5,6 +5,7 @@ import time
 import os
 import sys
 from app import app  # Import your Flask app
+import render_pool
 
 def run_flask():
     """Run Flask backend"""
@@ -39,6 +40,9 @@ if __name__ == "__main__":
     print("Starting deployment...")
     print(f"Environment: PORT={os.environ.get('PORT', 'not set')}")
     
+    # Warm the PDF render workers before Flask starts its request threads
+    render_pool.start()
+
     # Start Flask in a separate thread
     flask_thread = threading.Thread(target=run_flask)
     flask_thread.daemon = True
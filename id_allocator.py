@@ -0,0 +1,122 @@
+# id_allocator.py - Durable, process-safe bill ID sequence
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path, exclusive=True):
+    """Hold an advisory lock on ``path`` (created if missing) across processes"""
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileSequence:
+    """Monotonic counter stored in a small text file.
+
+    The file holds the highest id handed out so far. Reservations take an
+    exclusive file lock, so any number of processes can share one sequence.
+    ``floor`` returns the highest id already present in the data; the
+    sequence never goes below it, which also seeds it for existing files.
+    """
+
+    def __init__(self, path, floor=None):
+        self.path = path
+        self.floor = floor or (lambda: 0)
+
+    def _read(self, f):
+        f.seek(0)
+        value = f.read().strip()
+        return int(value) if value else 0
+
+    def _write(self, f, value):
+        f.seek(0)
+        f.truncate()
+        f.write(f"{value}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    def reserve(self, count):
+        """Reserve ``count`` consecutive ids and return the first one"""
+        with file_lock(self.path) as f:
+            start = max(self._read(f), self.floor()) + 1
+            self._write(f, start + count - 1)
+            return start
+
+    def release(self, first_unused, block_end):
+        """Give back the tail of the last block if nobody reserved after it"""
+        with file_lock(self.path) as f:
+            if self._read(f) == block_end:
+                self._write(f, first_unused - 1)
+
+
+class BlockAllocator:
+    """Hands out ids from blocks reserved on a shared sequence.
+
+    Each process reserves ``block_size`` ids at a time and then allocates
+    from its private block with a plain iterator step, so the common path
+    takes no lock and never touches disk. Ids are unique across processes
+    but only monotonic within one. Unused ids are returned at exit when
+    possible, otherwise they are skipped.
+    """
+
+    def __init__(self, sequence, block_size=50):
+        self.sequence = sequence
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._ids = iter(())
+        self._block_end = None
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker must not keep allocating from its parent's block
+            os.register_at_fork(after_in_child=self._forget_block)
+        atexit.register(self.release)
+
+    def _forget_block(self):
+        self._lock = threading.Lock()
+        self._ids = iter(())
+        self._block_end = None
+
+    def next_id(self):
+        while True:
+            ids = self._ids
+            try:
+                return next(ids)
+            except StopIteration:
+                with self._lock:
+                    # Another thread may have refilled while we waited
+                    if self._ids is ids:
+                        start = self.sequence.reserve(self.block_size)
+                        self._block_end = start + self.block_size - 1
+                        self._ids = iter(range(start, self._block_end + 1))
+
+    def release(self):
+        """Return the unused part of the current block to the sequence"""
+        with self._lock:
+            if self._block_end is None:
+                return
+            first_unused = self._block_end + 1 - self._ids.__length_hint__()
+            self._ids = iter(())
+            try:
+                self.sequence.release(first_unused, self._block_end)
+            except OSError:
+                pass
+            self._block_end = None
@@ -0,0 +1,85 @@
+# inventory_import.py - Streaming, validated parsing of inventory CSV uploads
+import csv
+import io
+import math
+
+REQUIRED_COLUMNS = ('name', 'price')
+# Rejected rows beyond this are counted but not listed in the report
+MAX_REPORTED_ERRORS = 1000
+
+
+class InventoryUpload:
+    """Reads (name, price) rows from an uploaded CSV one line at a time.
+
+    The header is checked up front (ValueError if name/price are missing).
+    Iterating yields only valid rows and records every rejected one, with
+    its line number, in the report, so the upload is never held in memory.
+    Iteration never raises: an unreadable line ends the import and is
+    reported like any other rejected row.
+    """
+
+    def __init__(self, stream):
+        self.text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+        self.reader = csv.reader(self.text)
+        header = [column.strip().lower() for column in next(self.reader, [])]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise ValueError('CSV must contain name and price columns')
+        self.name_index = header.index('name')
+        self.price_index = header.index('price')
+        self.rows = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def parse(self, values):
+        """Return (name, price) for one row; raises ValueError with the reason"""
+        if len(values) <= max(self.name_index, self.price_index):
+            raise ValueError('missing name or price')
+        name = values[self.name_index].strip()
+        if not name:
+            raise ValueError('name is required')
+        raw_price = values[self.price_index].strip()
+        try:
+            price = float(raw_price)
+        except ValueError:
+            raise ValueError(f'price {raw_price!r} is not a number')
+        if not math.isfinite(price) or price < 0:
+            raise ValueError(f'price {raw_price!r} must be zero or more')
+        return name, price
+
+    def __iter__(self):
+        while True:
+            try:
+                values = next(self.reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                self.reject(self.reader.line_num, f'unreadable CSV, import stopped here: {e}')
+                return
+            if not any(value.strip() for value in values):
+                continue
+            self.rows += 1
+            try:
+                row = self.parse(values)
+            except ValueError as e:
+                self.reject(self.reader.line_num, str(e))
+                continue
+            yield row
+
+    def report(self, counts):
+        """Summary for the API response, given the storage's upsert counts"""
+        return {
+            'message': (
+                f"{self.rows} rows processed: {counts['added']} added, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {self.rejected} rejected"
+            ),
+            **counts,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+        }
@@ -0,0 +1,77 @@
+# jobs.py - Background PDF render jobs for asynchronous checkout
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class RenderJobs:
+    """Tracks bill PDFs rendering in the background.
+
+    ``submit`` hands a payload to ``start(payload)``, which must return a
+    concurrent.futures Future resolving to PDF bytes, and returns a job id
+    straight away. Jobs live in this process only; the most recent
+    ``max_jobs`` are kept, and finished ones are dropped first when full.
+    """
+
+    def __init__(self, start, max_jobs=256):
+        self.start = start
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._by_bill = {}
+        self._lock = threading.Lock()
+
+    def submit(self, bill_id, payload):
+        job_id = uuid.uuid4().hex
+        future = self.start(payload)
+        with self._lock:
+            self._jobs[job_id] = (bill_id, future)
+            self._by_bill[bill_id] = job_id
+            self._evict()
+        return job_id
+
+    def _evict(self):
+        while len(self._jobs) > self.max_jobs:
+            finished = next((job_id for job_id, (_, future) in self._jobs.items() if future.done()), None)
+            if finished is None:
+                return
+            bill_id, _ = self._jobs.pop(finished)
+            if self._by_bill.get(bill_id) == finished:
+                del self._by_bill[bill_id]
+
+    @staticmethod
+    def _status(future):
+        if not future.done():
+            return 'running' if future.running() else 'queued'
+        return 'failed' if future.exception() is not None else 'done'
+
+    def status(self, job_id):
+        """{job_id, bill_id, status, error} or None for an unknown job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        bill_id, future = job
+        status = self._status(future)
+        return {
+            'job_id': job_id,
+            'bill_id': bill_id,
+            'status': status,
+            'error': str(future.exception()) if status == 'failed' else None,
+        }
+
+    def job_for_bill(self, bill_id):
+        with self._lock:
+            return self._by_bill.get(bill_id)
+
+    def forget_bill(self, bill_id):
+        """Stop serving a bill's checkout render, e.g. once the bill has changed"""
+        with self._lock:
+            self._by_bill.pop(bill_id, None)
+
+    def result(self, job_id):
+        """The PDF bytes once the job is done, else None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or self._status(job[1]) != 'done':
+            return None
+        return job[1].result()
@@ -0,0 +1,185 @@
+# metrics.py - In-process request/storage/PDF metrics in Prometheus text format
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow PDF batches
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric with fixed label names; one series per label-value tuple"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(list(zip(self.labelnames, key)), value))
+        return lines
+
+    def _render_series(self, pairs, value):
+        return [f'{self.name}{_format_labels(pairs)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; each series is [bucket counts..., sum, count]"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, pairs, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, series):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(float(bound)))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {series[-1]}")
+        lines.append(f'{self.name}_sum{_format_labels(pairs)} {_format_value(series[-2])}')
+        lines.append(f'{self.name}_count{_format_labels(pairs)} {series[-1]}')
+        return lines
+
+
+REGISTRY = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'billing_http_request_duration_seconds', 'Time to build each HTTP response, by route', ['method', 'route'])
+HTTP_REQUESTS = Counter(
+    'billing_http_requests_total', 'HTTP responses by route and status code', ['method', 'route', 'status'])
+HTTP_IN_FLIGHT = Gauge('billing_http_requests_in_flight', 'HTTP requests currently being handled')
+STORAGE_SECONDS = Histogram(
+    'billing_storage_operation_seconds', 'Storage backend calls made by the API', ['backend', 'operation'])
+CSV_IO_SECONDS = Histogram(
+    'billing_csv_io_seconds', 'CSV file reads, appends/rewrites (with fsync) and compactions', ['file', 'op'])
+PDF_RENDER_SECONDS = Histogram(
+    'billing_pdf_render_seconds', 'PDF renders from submission to result, queueing included', ['mode'])
+PDF_RENDER_ERRORS = Counter('billing_pdf_render_errors_total', 'PDF renders that raised', ['mode'])
+PDF_RENDERS_PENDING = Gauge('billing_pdf_renders_pending', 'PDF renders queued or running in the worker pool')
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+class TimedStorage:
+    """Storage wrapper that times every public method call into STORAGE_SECONDS.
+
+    Generators (iter_*) are passed through untimed, since calling one does
+    no work; everything else behaves exactly like the wrapped storage.
+    """
+
+    def __init__(self, storage, backend):
+        self._storage = storage
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self._storage, name)
+        if name.startswith(('_', 'iter_')) or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            with STORAGE_SECONDS.time(backend=self._backend, operation=name):
+                return attr(*args, **kwargs)
+        return timed
+
+
+def install(app):
+    """Record latency, status and in-flight counts for every request to ``app``"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request(exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        HTTP_IN_FLIGHT.dec()
+        method = request.method
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, route=route)
+        HTTP_REQUESTS.inc(method=method, route=route, status=g.pop('metrics_status', 500))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Data migration tool for the billing system
+
+    python migrate.py csv-to-sqlite --inventory inventory.csv --bills bills.csv --db billing.db
+    python migrate.py items-json --bills bills.csv
+
+SQLite databases created before bill_items existed are converted
+automatically the first time SqliteStorage opens them.
+"""
+
+import argparse
+import os
+import sys
+
+from storage import BillLedger, CsvStorage
+
+
+def csv_to_sqlite(inventory_csv, bills_csv, db_path):
+    """Copy inventory.csv and bills.csv into a fresh SQLite database"""
+    from sqlite_storage import SqliteStorage
+
+    source = CsvStorage(inventory_csv, bills_csv)
+    inventory = source.list_inventory()
+    bills = source.list_bills()
+
+    target = SqliteStorage(db_path)
+    if target.list_inventory() or target.list_bills():
+        raise RuntimeError(f"{db_path} already contains data; refusing to import twice")
+    target.import_records(inventory, bills)
+    target.close()
+    return len(inventory), len(bills)
+
+
+def items_to_json(bills_csv):
+    """Rewrite legacy str(list) items columns in bills.csv as JSON"""
+    ledger = BillLedger(bills_csv)
+    ledger.list_bills()
+    if not ledger.legacy_rows:
+        return 0
+    return ledger.rewrite()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Billing system data migrations")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sqlite_parser = subparsers.add_parser('csv-to-sqlite', help="Import the CSV files into SQLite")
+    sqlite_parser.add_argument('--inventory', default='inventory.csv')
+    sqlite_parser.add_argument('--bills', default='bills.csv')
+    sqlite_parser.add_argument('--db', default='billing.db')
+
+    items_parser = subparsers.add_parser('items-json', help="Convert bill items in bills.csv to JSON")
+    items_parser.add_argument('--bills', default='bills.csv')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'csv-to-sqlite':
+        for path in (args.inventory, args.bills):
+            if not os.path.exists(path):
+                print(f"❌ {path} not found")
+                return 1
+        try:
+            items, bills = csv_to_sqlite(args.inventory, args.bills, args.db)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"✅ Imported {items} inventory items and {bills} bills into {args.db}")
+        print(f"💡 Start the backend with BILLING_STORAGE=sqlite BILLING_DB={args.db}")
+    elif args.command == 'items-json':
+        if not os.path.exists(args.bills):
+            print(f"❌ {args.bills} not found")
+            return 1
+        converted = items_to_json(args.bills)
+        print(f"✅ Converted items of {converted} bills in {args.bills} to JSON")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
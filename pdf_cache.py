@@ -0,0 +1,91 @@
+# pdf_cache.py - Size-bounded, content-addressed on-disk cache of rendered PDFs
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class PdfCache:
+    """Rendered PDFs on disk, each named by a hash of what it was rendered from.
+
+    Identical render inputs share one file, so changing a bill (its payment
+    status, say) simply addresses a new entry and the stale one ages out.
+    Files are evicted least recently used first once the directory holds
+    more than ``max_bytes``; recency survives restarts through file mtimes.
+    ``version`` is mixed into every key so a layout change misses the old
+    entries instead of serving them.
+    """
+
+    def __init__(self, directory, max_bytes, version=''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = str(version)
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        files = [entry for entry in os.scandir(directory) if entry.name.endswith('.pdf')]
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            self._entries[entry.name[:-4]] = entry.stat().st_size
+            self._size += entry.stat().st_size
+        with self._lock:
+            self._evict()
+
+    def key(self, payload):
+        """The cache key for a JSON-serialisable render payload"""
+        canonical = json.dumps([self.version, payload], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def open(self, key):
+        """An open binary file for ``key`` (now most recently used), or None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                pdf = open(self._path(key), 'rb')
+            except FileNotFoundError:
+                # Removed behind our back; forget it
+                self._size -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return pdf
+
+    def put(self, key, pdf):
+        """Store PDF bytes under ``key``; the file appears atomically"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(pdf)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._size += len(pdf) - self._entries.pop(key, 0)
+            self._entries[key] = len(pdf)
+            self._evict()
+
+    def get_or_render(self, payload, render):
+        """(key, binary file) for ``payload``, calling ``render(payload)`` only on a miss"""
+        key = self.key(payload)
+        pdf = self.open(key)
+        if pdf is not None:
+            return key, pdf
+        data = render(payload)
+        self.put(key, data)
+        return key, io.BytesIO(data)
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
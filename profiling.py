@@ -0,0 +1,156 @@
+# profiling.py - Opt-in per-request profiling with profile dumps on disk
+import cProfile
+import itertools
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+PROFILE_DIR = os.environ.get('BILLING_PROFILE_DIR', 'profiles')
+# Request header that asks for a profile of that one request
+PROFILE_HEADER = 'X-Profile'
+# Oldest dumps are deleted beyond this many, so sampling cannot fill the disk
+MAX_PROFILES = int(os.environ.get('BILLING_PROFILE_KEEP', 200))
+
+# Changed at runtime through configure() (the admin toggle in app.py):
+#   sample_every  profile one request in N automatically; 0 turns sampling off
+#   allow_header  honour the X-Profile request header
+#   profiler      'cprofile', or 'sampling' when pyinstrument is installed
+settings = {
+    'sample_every': int(os.environ.get('BILLING_PROFILE_EVERY', 0)),
+    'allow_header': os.environ.get('BILLING_PROFILE_HEADER', '') == '1',
+    'profiler': 'cprofile',
+}
+
+_counter = itertools.count(1)
+# cProfile allows one active profiler per interpreter from Python 3.12, so
+# requests are profiled one at a time; others arriving meanwhile are skipped
+_active = threading.Lock()
+
+
+def configure(sample_every=None, allow_header=None, profiler=None):
+    """Update the profiling settings; raises ValueError for bad values"""
+    if sample_every is not None:
+        if isinstance(sample_every, bool) or not isinstance(sample_every, int) or sample_every < 0:
+            raise ValueError('sample_every must be a non-negative integer')
+        settings['sample_every'] = sample_every
+    if allow_header is not None:
+        settings['allow_header'] = bool(allow_header)
+    if profiler is not None:
+        if profiler not in ('cprofile', 'sampling'):
+            raise ValueError("profiler must be 'cprofile' or 'sampling'")
+        if profiler == 'sampling' and SamplingProfiler is None:
+            raise ValueError('The sampling profiler needs pyinstrument installed')
+        settings['profiler'] = profiler
+    return dict(settings, sampling_available=SamplingProfiler is not None, directory=PROFILE_DIR)
+
+
+def wanted(header_value):
+    """Whether to profile a request carrying this X-Profile header value"""
+    if settings['allow_header'] and header_value in ('1', 'true'):
+        return True
+    every = settings['sample_every']
+    return bool(every) and next(_counter) % every == 0
+
+
+class RequestProfile:
+    """One running profile; stop() writes it to PROFILE_DIR and returns the path"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.perf_counter()
+        if kind == 'sampling':
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self, method, route, status):
+        if self.kind == 'sampling':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        ms = (time.perf_counter() - self.started) * 1000
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        name = f"{stamp}-{method}-{slug}-{status}-{ms:.0f}ms"
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.kind == 'sampling':
+            path = os.path.join(PROFILE_DIR, f'{name}.txt')
+            with open(path, 'w') as f:
+                f.write(self.profiler.output_text(unicode=True))
+        else:
+            path = os.path.join(PROFILE_DIR, f'{name}.prof')
+            self.profiler.dump_stats(path)
+        _prune()
+        return path
+
+
+def _prune():
+    names = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(('.prof', '.txt')))
+    for name in names[:max(0, len(names) - MAX_PROFILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def start(header_value):
+    """A running RequestProfile if this request should be profiled, else None"""
+    if not wanted(header_value) or not _active.acquire(blocking=False):
+        return None
+    try:
+        return RequestProfile(settings['profiler'])
+    except Exception:
+        _active.release()
+        raise
+
+
+def install(app):
+    """Profile requests to ``app`` that opt in or are sampled.
+
+    When nothing is enabled each request costs two dict lookups. Profiles
+    cover the request thread only: PDF renders show up as the wait for the
+    render pool, and streamed responses only up to the view's return. A
+    profile that cannot be written is logged and the response is unchanged.
+    cProfile dumps open with ``python -m pstats`` or snakeviz.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if settings['sample_every'] or settings['allow_header']:
+            g.profile = start(request.headers.get(PROFILE_HEADER))
+
+    def finish(status):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return None
+        try:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            return profile.stop(request.method, route, status)
+        except Exception:
+            # Diagnostics must never fail the request they were measuring
+            app.logger.exception('Could not write request profile to %s', PROFILE_DIR)
+            return None
+        finally:
+            _active.release()
+
+    @app.after_request
+    def _dump_profile(response):
+        path = finish(response.status_code)
+        if path:
+            response.headers['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        # Only still running if the request failed before after_request
+        finish(500)
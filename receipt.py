@@ -0,0 +1,103 @@
+# receipt.py - Narrow thermal-printer receipts (plain text or ESC/POS), no ReportLab layout
+from bill_pdf import bill_date
+
+# Characters per line with the printer's standard font
+PAPER_COLUMNS = {58: 32, 80: 48}
+
+# ESC/POS commands understood by common 58/80 mm thermal printers
+ESC_INIT = b'\x1b@'
+ESC_ALIGN = {'left': b'\x1ba\x00', 'center': b'\x1ba\x01'}
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+ESC_DOUBLE_HEIGHT = b'\x1d!\x01'
+ESC_NORMAL_SIZE = b'\x1d!\x00'
+ESC_FEED_AND_CUT = b'\x1bd\x03\x1dV\x42\x00'
+
+
+def _wrap(text, width):
+    """Split text into lines of at most ``width`` characters, breaking at spaces"""
+    lines = []
+    for word in str(text).split():
+        while len(word) > width:
+            lines.append(word[:width])
+            word = word[width:]
+        if lines and len(lines[-1]) + 1 + len(word) <= width:
+            lines[-1] += ' ' + word
+        else:
+            lines.append(word)
+    return lines or ['']
+
+
+def _pair(left, right, width):
+    """``left`` and right-aligned ``right`` on one line, or two when they do not fit"""
+    left, right = str(left), str(right)
+    if len(left) + 1 + len(right) <= width:
+        return [left + right.rjust(width - len(left))]
+    return _wrap(left, width) + [right.rjust(width)]
+
+
+def receipt_lines(data, paper=80):
+    """(text, style) lines for a /api/generate-bill payload.
+
+    Styles are 'title', 'center', 'bold' or None, so the text and ESC/POS
+    renderers print the same content. Raises ValueError for unknown paper.
+    """
+    if paper not in PAPER_COLUMNS:
+        raise ValueError(f"paper must be one of {sorted(PAPER_COLUMNS)} (mm)")
+    width = PAPER_COLUMNS[paper]
+    rule = ('-' * width, None)
+    shop = data['shop']
+    customer = data['customer']
+
+    lines = [(text, 'title') for text in _wrap(shop['name'].upper(), width)]
+    lines += [(text, 'center') for text in _wrap(shop['address'], width)]
+    lines += [(text, 'center') for text in _wrap(f"Ph: {shop['phone']}", width)]
+    lines.append(rule)
+    lines += [(text, None) for text in _pair(f"Date: {bill_date(data)}", f"Owner: {shop.get('owner', 'N/A')}", width)]
+    lines += [(text, None) for text in _wrap(f"Name: {customer['name']}", width)]
+    lines += [(text, None) for text in _wrap(f"Mobile No: {customer.get('phone', 'N/A')}", width)]
+    lines.append(rule)
+
+    # Item name on its own line(s), then quantity x price and the line amount
+    lines += [(text, 'bold') for text in _pair('Item', 'Amount', width)]
+    for idx, item in enumerate(data['items'], 1):
+        lines += [(text, None) for text in _wrap(f"{idx}. {item['name']}", width)]
+        lines += [(text, None) for text in _pair(f"   {item['quantity']} x {item['price']:.2f}", f"{item['total']:.2f}", width)]
+    lines.append(rule)
+
+    lines += [(text, 'bold') for text in _pair('TOTAL', f"{data['total']:.2f}Rs", width)]
+    lines += [(text, None) for text in _pair('Payment Status', data['payment_status'].upper(), width)]
+    if data.get('notes'):
+        lines += [(text, None) for text in _wrap(f"Remarks: {data['notes']}", width)]
+    lines.append(rule)
+    lines.append(('Thank you!', 'center'))
+    return lines
+
+
+def render_text(data, paper=80):
+    """The receipt as plain text, centred lines padded to the paper width"""
+    width = PAPER_COLUMNS.get(paper, 0)
+    out = []
+    for text, style in receipt_lines(data, paper):
+        out.append(text.center(width).rstrip() if style in ('title', 'center') else text)
+    return '\n'.join(out) + '\n'
+
+
+def render_escpos(data, paper=80):
+    """The receipt as raw ESC/POS bytes, ending with a feed and paper cut"""
+    out = [ESC_INIT]
+    align = None
+    for text, style in receipt_lines(data, paper):
+        line = text.encode('cp437', errors='replace') + b'\n'
+        wanted = 'center' if style in ('title', 'center') else 'left'
+        if wanted != align:
+            out.append(ESC_ALIGN[wanted])
+            align = wanted
+        if style == 'title':
+            out += [ESC_BOLD_ON, ESC_DOUBLE_HEIGHT, line, ESC_NORMAL_SIZE, ESC_BOLD_OFF]
+        elif style == 'bold':
+            out += [ESC_BOLD_ON, line, ESC_BOLD_OFF]
+        else:
+            out.append(line)
+    out.append(ESC_FEED_AND_CUT)
+    return b''.join(out)
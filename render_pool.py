@@ -0,0 +1,148 @@
+# render_pool.py - Render bill PDFs across pre-warmed worker processes
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import bill_pdf
+from metrics import PDF_RENDER_ERRORS, PDF_RENDER_SECONDS, PDF_RENDERS_PENDING
+
+# Worker processes for PDF rendering; defaults to one per CPU core
+RENDER_WORKERS = int(os.environ.get('BILLING_RENDER_WORKERS', 0)) or os.cpu_count() or 1
+
+# Shop profile used to warm workers when the app does not pass its own
+WARMUP_SHOP = {'name': 'Warm-up', 'owner': '', 'address': '', 'phone': '', 'email': ''}
+
+_pool = None
+_workers = RENDER_WORKERS
+_shop = None
+# Held while a pool is being started, so concurrent first uses start only one
+_start_lock = threading.Lock()
+
+
+def warmup_payload(shop):
+    return {
+        'shop': shop,
+        'customer': {'name': 'Warm-up', 'phone': ''},
+        'items': [{'name': 'Warm-up', 'quantity': 1, 'price': 1.0, 'total': 1.0}],
+        'total': 1.0,
+        'payment_status': 'Paid',
+        'notes': '',
+    }
+
+
+def _warm_worker(shop):
+    """Load fonts, styles and the shop's template before the first real bill"""
+    bill_pdf.render_bill(warmup_payload(shop))
+
+
+def _ready():
+    return os.getpid()
+
+
+def use_shop(shop):
+    """Warm workers for ``shop`` whenever a pool starts; does not start one.
+
+    Safe to call at import time. Starting the pool is not: with the spawn
+    start method (macOS, Windows) each worker re-imports the main module.
+    """
+    global _shop
+    _shop = shop
+
+
+def start(workers=None, shop=None):
+    """(Re)start the pool with ``workers`` processes, all warmed up before returning.
+
+    Call it from the entry point (under ``if __name__ == '__main__'``), before
+    the server starts threads, so the first checkouts do not pay for warm-up.
+    Otherwise the pool starts on first use.
+    """
+    global _shop
+    if shop is not None:
+        _shop = shop
+    with _start_lock:
+        return _start(workers or RENDER_WORKERS)
+
+
+def _start(workers):
+    global _pool, _workers
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker,
+                               initargs=(_shop or WARMUP_SHOP,))
+    # One task per worker makes every process start and run its initializer now
+    wait([pool.submit(_ready) for _ in range(workers)])
+    old, _pool, _workers = _pool, pool, workers
+    if old is not None:
+        old.shutdown(wait=False)
+    return pool
+
+
+def get_pool():
+    """The shared process pool, started and warmed for the shop on first use"""
+    pool = _pool
+    if pool is None:
+        with _start_lock:
+            pool = _pool or _start(_workers)
+    return pool
+
+
+def _restart(broken):
+    """Replace a broken pool with the same size and shop, unless another thread already has"""
+    with _start_lock:
+        if _pool is broken:
+            _start(_workers)
+
+
+def _record(mode, started):
+    """Done-callback that times a render from submission, queueing included"""
+    def done(future):
+        PDF_RENDERS_PENDING.dec()
+        PDF_RENDER_SECONDS.observe(time.perf_counter() - started, mode=mode)
+        if future.cancelled() or future.exception() is not None:
+            PDF_RENDER_ERRORS.inc(mode=mode)
+    return done
+
+
+def _submit(mode, fn, *args):
+    started = time.perf_counter()
+    pool = get_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OS); replace the pool once
+        _restart(pool)
+        future = get_pool().submit(fn, *args)
+    PDF_RENDERS_PENDING.inc()
+    future.add_done_callback(_record(mode, started))
+    return future
+
+
+def render(payload):
+    """Render one bill on a worker and wait for the PDF bytes"""
+    return _submit('sync', bill_pdf.render_bill, payload).result()
+
+
+def render_async(payload):
+    """Start rendering one bill on a worker; returns a Future of the PDF bytes"""
+    return _submit('async', bill_pdf.render_bill, payload)
+
+
+def render_many(payloads):
+    """Render each payload to its own PDF in parallel; results keep input order"""
+    payloads = list(payloads)
+    # A few tasks per worker keeps them all busy without per-bill IPC overhead
+    chunksize = max(1, len(payloads) // (_workers * 4))
+    PDF_RENDERS_PENDING.inc(len(payloads))
+    try:
+        with PDF_RENDER_SECONDS.time(mode='batch'):
+            return list(get_pool().map(bill_pdf.render_bill, payloads, chunksize=chunksize))
+    except Exception:
+        PDF_RENDER_ERRORS.inc(mode='batch')
+        raise
+    finally:
+        PDF_RENDERS_PENDING.dec(len(payloads))
+
+
+def render_combined(payloads):
+    """Render payloads into one PDF on a worker, off the web server's GIL"""
+    return _submit('combined', bill_pdf.render_combined, list(payloads)).result()
@@ -0,0 +1,77 @@
+# search_index.py - In-memory n-gram index over inventory item names
+import heapq
+
+# Queries shorter than this match word prefixes instead of substrings
+NGRAM = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _prefixes(text):
+    return {word[:length] for word in text.split() for length in range(1, NGRAM)}
+
+
+class NameIndex:
+    """Case-insensitive substring search over item names.
+
+    Queries of three or more characters intersect the posting sets of their
+    trigrams and confirm the candidates with a substring test, so a lookup
+    only touches items sharing every trigram. Shorter queries (type-ahead)
+    match the start of any word through a small prefix index. Whole names
+    are indexed too, for exact (case-insensitive) lookups. Items are added
+    and removed one at a time as the inventory changes.
+    """
+
+    def __init__(self):
+        self._names = {}
+        self._postings = ({}, {}, {})
+
+    def _keys(self, name):
+        return _ngrams(name), _prefixes(name), (name.strip(),)
+
+    def add(self, item_id, name):
+        name = str(name).lower()
+        self._names[item_id] = name
+        for index, keys in zip(self._postings, self._keys(name)):
+            for key in keys:
+                index.setdefault(key, set()).add(item_id)
+
+    def remove(self, item_id):
+        name = self._names.pop(item_id, None)
+        if name is None:
+            return
+        for index, keys in zip(self._postings, self._keys(name)):
+            for key in keys:
+                index[key].discard(item_id)
+                if not index[key]:
+                    del index[key]
+
+    def candidates(self, query):
+        """Ids whose names match ``query`` (already lower-cased)"""
+        grams, prefixes, _ = self._postings
+        if not query:
+            return set(self._names)
+        if len(query) < NGRAM:
+            return set(prefixes.get(query, ()))
+        postings = sorted((grams.get(gram, set()) for gram in _ngrams(query)), key=len)
+        matches = postings[0].intersection(*postings[1:])
+        return {item_id for item_id in matches if query in self._names[item_id]}
+
+    def find(self, name):
+        """Lowest id of an item named ``name`` (ignoring case), or None"""
+        ids = self._postings[2].get(str(name).strip().lower())
+        return min(ids) if ids else None
+
+    def search(self, query, limit):
+        """Up to ``limit`` matching ids: names starting with the query first, then by name"""
+        query = query.strip().lower()
+        names = self._names
+        return [
+            item_id for _, _, item_id in heapq.nsmallest(
+                limit,
+                ((not names[item_id].startswith(query), names[item_id], item_id)
+                 for item_id in self.candidates(query))
+            )
+        ]
@@ -0,0 +1,101 @@
+# signature_store.py - Content-addressed storage of downscaled signature images
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from functools import lru_cache
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+SIGNATURES_DIR = os.environ.get('BILLING_SIGNATURES_DIR', 'signatures')
+
+# Uploads larger than this (decoded) are refused before Pillow sees them
+MAX_UPLOAD_BYTES = 2 * 1024 * 1024
+# Refuse images that would decode to more pixels than this (decompression bombs)
+MAX_SOURCE_PIXELS = 25_000_000
+# Stored signatures fit in this box: the 1.5 x 0.5 inch footer slot at 300 dpi
+MAX_SIZE = (450, 150)
+# Ink is kept at 8 grey levels and near-white becomes paper white, so the
+# PNG (and the image stream in every PDF) compresses to a few KB
+_POSTERIZE = [255 if value >= 224 else value // 32 * 32 for value in range(256)]
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def decode_upload(signature_data):
+    """Bytes of a base64 image, with or without a data: URL header"""
+    if ',' in signature_data:
+        signature_data = signature_data.split(',', 1)[1]
+    if len(signature_data) > MAX_UPLOAD_BYTES * 4 // 3 + 4:
+        raise ValueError(f'Signature must be at most {MAX_UPLOAD_BYTES // 1024} KB')
+    try:
+        return base64.b64decode(signature_data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Signature is not valid base64')
+
+
+def normalize(raw):
+    """Downscale and recompress an uploaded image to a small greyscale PNG on white"""
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise ValueError('Signature image is too large')
+            ink = image.convert('RGBA')
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('Signature is not a readable image')
+    # Bills print on white, so flatten transparency instead of keeping a mask
+    image = Image.new('RGBA', ink.size, 'white')
+    image.alpha_composite(ink)
+    image = image.convert('L')
+    image.thumbnail(MAX_SIZE, Image.LANCZOS)
+    out = io.BytesIO()
+    image.point(_POSTERIZE).save(out, format='PNG', optimize=True)
+    return out.getvalue()
+
+
+def signature_path(signature_id, directory=None):
+    """The stored file for an id, or None for a malformed or unknown id"""
+    if not isinstance(signature_id, str) or not _ID_PATTERN.match(signature_id):
+        return None
+    path = os.path.join(directory or SIGNATURES_DIR, f'{signature_id}.png')
+    return path if os.path.exists(path) else None
+
+
+def save_signature(signature_data, directory=None):
+    """Store a base64 upload and return its id, the SHA-256 of the stored PNG.
+
+    Identical signatures share one file. Raises ValueError for anything
+    that is not a reasonably sized, readable image.
+    """
+    directory = directory or SIGNATURES_DIR
+    png = normalize(decode_upload(signature_data))
+    signature_id = hashlib.sha256(png).hexdigest()
+    path = os.path.join(directory, f'{signature_id}.png')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(png)
+        os.replace(tmp_path, path)
+    return signature_id
+
+
+@lru_cache(maxsize=64)
+def _reader(path):
+    reader = ImageReader(path)
+    # Decode once now so every later PDF reuses the pixel data
+    reader.getRGBData()
+    return reader
+
+
+def image_reader(signature_id, directory=None):
+    """Cached ImageReader for a stored signature, or None if there is no such id.
+
+    Ids are content hashes, so a cached reader can never go stale.
+    """
+    path = signature_path(signature_id, directory)
+    return _reader(path) if path else None
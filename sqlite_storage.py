@@ -0,0 +1,650 @@
+# sqlite_storage.py - Indexed SQLite implementation of the storage interface
+import sqlite3
+import threading
+from datetime import date, timedelta
+from itertools import islice
+
+from aggregates import format_period, format_totals
+from storage import Storage, decode_items, normalize_item
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    price REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS bills (
+    bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    customer_name TEXT NOT NULL DEFAULT '',
+    customer_phone TEXT NOT NULL DEFAULT '',
+    customer_email TEXT NOT NULL DEFAULT '',
+    total REAL NOT NULL DEFAULT 0,
+    payment_status TEXT NOT NULL DEFAULT '',
+    notes TEXT NOT NULL DEFAULT '',
+    signature_id TEXT NOT NULL DEFAULT ''
+);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory(name COLLATE NOCASE);
+
+CREATE INDEX IF NOT EXISTS idx_bills_date ON bills(date);
+CREATE INDEX IF NOT EXISTS idx_bills_customer_phone ON bills(customer_phone);
+CREATE INDEX IF NOT EXISTS idx_bills_payment_status ON bills(payment_status);
+
+CREATE TABLE IF NOT EXISTS bill_items (
+    bill_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    quantity NUMERIC NOT NULL,
+    price REAL NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (bill_id, line_no)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_bill_items_name ON bill_items(name COLLATE NOCASE);
+
+-- Change counters for HTTP ETags, bumped by triggers so every process sees them
+CREATE TABLE IF NOT EXISTS data_versions (
+    kind TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO data_versions (kind, version) VALUES ('inventory', 0), ('bills', 0);
+"""
+
+VERSION_TRIGGERS = "\n".join(
+    f"""
+CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table}
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE kind = '{kind}';
+END;
+"""
+    for table, kind in (('inventory', 'inventory'), ('bills', 'bills'))
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+)
+
+# Per-status bill count and revenue (in paise), maintained by triggers
+TOTALS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bill_totals (
+    payment_status TEXT PRIMARY KEY,
+    bill_count INTEGER NOT NULL,
+    amount_cents INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS bills_insert_totals AFTER INSERT ON bills
+BEGIN
+    INSERT INTO bill_totals (payment_status, bill_count, amount_cents)
+    VALUES (NEW.payment_status, 1, CAST(ROUND(NEW.total * 100) AS INTEGER))
+    ON CONFLICT (payment_status) DO UPDATE SET
+        bill_count = bill_count + 1,
+        amount_cents = amount_cents + excluded.amount_cents;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bills_delete_totals AFTER DELETE ON bills
+BEGIN
+    UPDATE bill_totals SET
+        bill_count = bill_count - 1,
+        amount_cents = amount_cents - CAST(ROUND(OLD.total * 100) AS INTEGER)
+    WHERE payment_status = OLD.payment_status;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bills_update_totals AFTER UPDATE OF total, payment_status ON bills
+BEGIN
+    UPDATE bill_totals SET
+        bill_count = bill_count - 1,
+        amount_cents = amount_cents - CAST(ROUND(OLD.total * 100) AS INTEGER)
+    WHERE payment_status = OLD.payment_status;
+    INSERT INTO bill_totals (payment_status, bill_count, amount_cents)
+    VALUES (NEW.payment_status, 1, CAST(ROUND(NEW.total * 100) AS INTEGER))
+    ON CONFLICT (payment_status) DO UPDATE SET
+        bill_count = bill_count + 1,
+        amount_cents = amount_cents + excluded.amount_cents;
+END;
+"""
+
+BACKFILL_TOTALS = """
+INSERT INTO bill_totals (payment_status, bill_count, amount_cents)
+SELECT payment_status, COUNT(*), SUM(CAST(ROUND(total * 100) AS INTEGER))
+FROM bills GROUP BY payment_status
+"""
+
+# Per-day and per-month revenue rollups (amounts in paise), maintained by
+# triggers: every insert, delete or update adds or subtracts one bill's share
+ROLLUP_TABLES = {'day': ('revenue_daily', 10), 'month': ('revenue_monthly', 7)}
+
+
+def _rollup_delta(table, length, row, sign):
+    cents = f"CAST(ROUND({row}.total * 100) AS INTEGER)"
+    return f"""
+    INSERT INTO {table} (period, bill_count, gross_cents, paid_cents, unpaid_cents)
+    VALUES (
+        substr({row}.date, 1, {length}), {sign}1, {sign}{cents},
+        CASE WHEN {row}.payment_status = 'Paid' THEN {sign}{cents} ELSE 0 END,
+        CASE WHEN {row}.payment_status = 'Unpaid' THEN {sign}{cents} ELSE 0 END
+    )
+    ON CONFLICT (period) DO UPDATE SET
+        bill_count = bill_count + excluded.bill_count,
+        gross_cents = gross_cents + excluded.gross_cents,
+        paid_cents = paid_cents + excluded.paid_cents,
+        unpaid_cents = unpaid_cents + excluded.unpaid_cents;"""
+
+
+ROLLUP_SCHEMA = "\n".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    period TEXT PRIMARY KEY,
+    bill_count INTEGER NOT NULL,
+    gross_cents INTEGER NOT NULL,
+    paid_cents INTEGER NOT NULL,
+    unpaid_cents INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS bills_insert_{table} AFTER INSERT ON bills
+BEGIN{_rollup_delta(table, length, 'NEW', '')}
+END;
+
+CREATE TRIGGER IF NOT EXISTS bills_delete_{table} AFTER DELETE ON bills
+BEGIN{_rollup_delta(table, length, 'OLD', '-')}
+END;
+
+CREATE TRIGGER IF NOT EXISTS bills_update_{table} AFTER UPDATE OF date, total, payment_status ON bills
+BEGIN{_rollup_delta(table, length, 'OLD', '-')}{_rollup_delta(table, length, 'NEW', '')}
+END;
+"""
+    for table, length in ROLLUP_TABLES.values()
+)
+
+
+def _backfill_rollup(table, length):
+    cents = "CAST(ROUND(total * 100) AS INTEGER)"
+    return f"""
+INSERT INTO {table} (period, bill_count, gross_cents, paid_cents, unpaid_cents)
+SELECT substr(date, 1, {length}), COUNT(*), SUM({cents}),
+       SUM(CASE WHEN payment_status = 'Paid' THEN {cents} ELSE 0 END),
+       SUM(CASE WHEN payment_status = 'Unpaid' THEN {cents} ELSE 0 END)
+FROM bills GROUP BY substr(date, 1, {length})
+"""
+
+
+# One row per customer phone: bill count and the latest bill's name and
+# date, maintained by triggers. Customer bills come from idx_bills_customer_phone.
+CUSTOMERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    phone TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    bill_count INTEGER NOT NULL,
+    last_bill_id INTEGER NOT NULL,
+    last_date TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS bills_insert_customers AFTER INSERT ON bills
+WHEN NEW.customer_phone != ''
+BEGIN
+    INSERT INTO customers (phone, name, bill_count, last_bill_id, last_date)
+    VALUES (NEW.customer_phone, NEW.customer_name, 1, NEW.bill_id, NEW.date)
+    ON CONFLICT (phone) DO UPDATE SET
+        bill_count = bill_count + 1,
+        name = CASE WHEN excluded.last_bill_id > last_bill_id THEN excluded.name ELSE name END,
+        last_date = CASE WHEN excluded.last_bill_id > last_bill_id THEN excluded.last_date ELSE last_date END,
+        last_bill_id = max(last_bill_id, excluded.last_bill_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS bills_delete_customers AFTER DELETE ON bills
+WHEN OLD.customer_phone != ''
+BEGIN
+    DELETE FROM customers WHERE phone = OLD.customer_phone AND bill_count <= 1;
+    UPDATE customers SET bill_count = bill_count - 1 WHERE phone = OLD.customer_phone;
+    UPDATE customers SET (name, last_bill_id, last_date) = (
+        SELECT customer_name, bill_id, date FROM bills
+        WHERE customer_phone = OLD.customer_phone ORDER BY bill_id DESC LIMIT 1
+    )
+    WHERE phone = OLD.customer_phone AND last_bill_id = OLD.bill_id;
+END;
+"""
+
+# SQLite takes the bare columns from the row holding MAX(bill_id)
+BACKFILL_CUSTOMERS = """
+INSERT INTO customers (phone, name, bill_count, last_bill_id, last_date)
+SELECT customer_phone, customer_name, COUNT(*), MAX(bill_id), date
+FROM bills WHERE customer_phone != '' GROUP BY customer_phone
+"""
+
+# Trigram full-text index over inventory names, kept in sync by triggers.
+# Needs SQLite 3.34+; older builds fall back to scanning the table.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS inventory_search USING fts5(
+    name, content='inventory', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS inventory_insert_search AFTER INSERT ON inventory
+BEGIN
+    INSERT INTO inventory_search (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS inventory_delete_search AFTER DELETE ON inventory
+BEGIN
+    INSERT INTO inventory_search (inventory_search, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS inventory_update_search AFTER UPDATE OF name ON inventory
+BEGIN
+    INSERT INTO inventory_search (inventory_search, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+    INSERT INTO inventory_search (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+"""
+
+BILL_FIELDS = ['bill_id', 'date', 'customer_name', 'customer_phone',
+               'customer_email', 'total', 'payment_status', 'notes', 'signature_id']
+
+# SQLite caps the number of bound parameters per statement
+_IN_CHUNK = 500
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SqliteStorage(Storage):
+    """Storage backed by a single SQLite database in WAL mode.
+
+    bill_id is the table's rowid, so point lookups and deletes are B-tree
+    operations; date, customer_phone and payment_status carry secondary
+    indexes. Line items live in bill_items, indexed by name. Each thread
+    gets its own connection.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            legacy = self._has_legacy_items_column(conn)
+            unsigned = self._has_table(conn, 'bills') and not self._has_column(conn, 'bills', 'signature_id')
+            new_totals = not self._has_table(conn, 'bill_totals')
+            new_customers = not self._has_table(conn, 'customers')
+            new_rollups = [
+                (table, length) for table, length in ROLLUP_TABLES.values()
+                if not self._has_table(conn, table)
+            ]
+            conn.executescript(SCHEMA)
+            if unsigned:
+                # Databases created before signatures were stored with bills
+                conn.execute("ALTER TABLE bills ADD COLUMN signature_id TEXT NOT NULL DEFAULT ''")
+            conn.executescript(VERSION_TRIGGERS)
+            conn.executescript(TOTALS_SCHEMA)
+            if new_totals:
+                # Databases created before the counters existed start from a full count
+                conn.execute(BACKFILL_TOTALS)
+            conn.executescript(ROLLUP_SCHEMA)
+            for table, length in new_rollups:
+                conn.execute(_backfill_rollup(table, length))
+            conn.executescript(CUSTOMERS_SCHEMA)
+            if new_customers:
+                conn.execute(BACKFILL_CUSTOMERS)
+            if legacy:
+                self._migrate_legacy_items(conn)
+            self._has_search = self._create_search_index(conn)
+
+    @staticmethod
+    def _has_table(conn, name):
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone() is not None
+
+    @classmethod
+    def _create_search_index(cls, conn):
+        """Create (and fill, the first time) the trigram index; False if unsupported"""
+        if cls._has_table(conn, 'inventory_search'):
+            return True
+        try:
+            conn.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        conn.execute("INSERT INTO inventory_search (inventory_search) VALUES ('rebuild')")
+        return True
+
+    @staticmethod
+    def _has_column(conn, table, name):
+        return any(row[1] == name for row in conn.execute(f'PRAGMA table_info({table})'))
+
+    @classmethod
+    def _has_legacy_items_column(cls, conn):
+        return cls._has_column(conn, 'bills', 'items')
+
+    @staticmethod
+    def _migrate_legacy_items(conn):
+        """Move the old str(list) bills.items column into bill_items"""
+        rows = conn.execute('SELECT bill_id, items FROM bills').fetchall()
+        conn.executemany(
+            'INSERT OR REPLACE INTO bill_items (bill_id, line_no, name, quantity, price, total) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (row[0], line_no, item['name'], item['quantity'], item['price'], item['total'])
+                for row in rows
+                for line_no, item in enumerate(decode_items(row[1]), 1)
+            )
+        )
+        conn.execute('ALTER TABLE bills DROP COLUMN items')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def data_version(self, kind):
+        row = self._connect().execute(
+            'SELECT version FROM data_versions WHERE kind = ?', (kind,)
+        ).fetchone()
+        return str(row[0])
+
+    # Inventory
+    def list_inventory(self):
+        rows = self._connect().execute('SELECT id, name, price FROM inventory ORDER BY id')
+        return [dict(row) for row in rows]
+
+    def get_inventory_item(self, item_id):
+        row = self._connect().execute(
+            'SELECT id, name, price FROM inventory WHERE id = ?', (item_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def search_inventory(self, query, limit):
+        query = query.strip()
+        pattern = _escape_like(query)
+        if len(query) >= 3 and self._has_search:
+            # A quoted trigram phrase is a case-insensitive substring match
+            source = "inventory_search JOIN inventory ON inventory.id = inventory_search.rowid"
+            where = "inventory_search MATCH ?"
+            params = ['"' + query.replace('"', '""') + '"']
+        elif len(query) >= 3:
+            source, where, params = "inventory", "name LIKE ? ESCAPE '\\'", [f"%{pattern}%"]
+        else:
+            # Short type-ahead queries match the start of any word
+            source = "inventory"
+            where = "(name LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\')"
+            params = [f"{pattern}%", f"% {pattern}%"]
+        rows = self._connect().execute(
+            f"SELECT inventory.id, inventory.name, inventory.price FROM {source} WHERE {where} "
+            f"ORDER BY inventory.name NOT LIKE ? ESCAPE '\\', lower(inventory.name), inventory.id LIMIT ?",
+            params + [f"{pattern}%", limit]
+        )
+        return [dict(row) for row in rows]
+
+    def add_inventory_items(self, rows):
+        added = []
+        with self._connect() as conn:
+            for name, price in rows:
+                cursor = conn.execute(
+                    'INSERT INTO inventory (name, price) VALUES (?, ?)', (name, float(price))
+                )
+                added.append({'id': cursor.lastrowid, 'name': name, 'price': float(price)})
+        return added
+
+    def upsert_inventory_items(self, rows):
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        rows = iter(rows)
+        while True:
+            # Read the next chunk outside any transaction, so a slow upload
+            # never holds the write lock; each chunk commits on its own
+            chunk = list(islice(rows, _IN_CHUNK))
+            if not chunk:
+                return counts
+            with self._connect() as conn:
+                # Look up the chunk's names at once through idx_inventory_name
+                known = {}
+                for row in conn.execute(
+                    f"SELECT id, name, price FROM inventory WHERE name COLLATE NOCASE IN "
+                    f"({', '.join('?' * len(chunk))}) ORDER BY id DESC",
+                    [name for name, _ in chunk]
+                ):
+                    # Descending ids leave the lowest id for each name
+                    known[row['name'].lower()] = [row['id'], row['price']]
+                for name, price in chunk:
+                    price = float(price)
+                    item = known.get(name.lower())
+                    if item is None:
+                        cursor = conn.execute('INSERT INTO inventory (name, price) VALUES (?, ?)', (name, price))
+                        known[name.lower()] = [cursor.lastrowid, price]
+                        counts['added'] += 1
+                    elif item[1] != price:
+                        conn.execute('UPDATE inventory SET price = ? WHERE id = ?', (price, item[0]))
+                        item[1] = price
+                        counts['updated'] += 1
+                    else:
+                        counts['unchanged'] += 1
+
+    def update_inventory_item(self, item_id, name, price):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE inventory SET name = ?, price = ? WHERE id = ?',
+                (name, float(price), item_id)
+            )
+        return cursor.rowcount > 0
+
+    def delete_inventory_item(self, item_id):
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM inventory WHERE id = ?', (item_id,))
+        return cursor.rowcount > 0
+
+    # Bills
+    def _attach_items(self, conn, rows):
+        """Turn bill rows into dicts with their line items fetched in bulk"""
+        bills = {row['bill_id']: {**dict(row), 'items': []} for row in rows}
+        ids = list(bills)
+        for start in range(0, len(ids), _IN_CHUNK):
+            chunk = ids[start:start + _IN_CHUNK]
+            items = conn.execute(
+                f"SELECT bill_id, name, quantity, price, total FROM bill_items "
+                f"WHERE bill_id IN ({', '.join('?' * len(chunk))}) ORDER BY bill_id, line_no",
+                chunk
+            )
+            for item in items:
+                bills[item['bill_id']]['items'].append(normalize_item(dict(item)))
+        return list(bills.values())
+
+    @staticmethod
+    def _insert_items(conn, bill_id, items):
+        conn.executemany(
+            'INSERT INTO bill_items (bill_id, line_no, name, quantity, price, total) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (bill_id, line_no, item['name'], item['quantity'], item['price'], item['total'])
+                for line_no, item in enumerate(items, 1)
+            ]
+        )
+
+    def list_bills(self):
+        conn = self._connect()
+        return self._attach_items(conn, conn.execute('SELECT * FROM bills ORDER BY bill_id'))
+
+    def get_bill(self, bill_id):
+        conn = self._connect()
+        bills = self._attach_items(
+            conn, conn.execute('SELECT * FROM bills WHERE bill_id = ?', (bill_id,))
+        )
+        return bills[0] if bills else None
+
+    def find_bills_by_item(self, name):
+        conn = self._connect()
+        return self._attach_items(conn, conn.execute(
+            'SELECT * FROM bills WHERE bill_id IN '
+            '(SELECT bill_id FROM bill_items WHERE name = ? COLLATE NOCASE) ORDER BY bill_id',
+            (name,)
+        ))
+
+    @staticmethod
+    def _filter_clauses(filters):
+        """Translate bill filters into SQL conditions and parameters"""
+        clauses, params = [], []
+        if filters.get('date_from'):
+            clauses.append('date >= ?')
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            clauses.append('date < ?')
+            params.append((date.fromisoformat(filters['date_to']) + timedelta(days=1)).isoformat())
+        if filters.get('payment_status'):
+            clauses.append('payment_status = ?')
+            params.append(filters['payment_status'])
+        if filters.get('phone'):
+            # A range instead of LIKE so the customer_phone index is used
+            prefix = filters['phone']
+            clauses.append('customer_phone >= ? AND customer_phone < ?')
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        if filters.get('name'):
+            clauses.append("customer_name LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(filters['name']) + '%')
+        if filters.get('min_total') is not None:
+            clauses.append('total >= ?')
+            params.append(filters['min_total'])
+        if filters.get('max_total') is not None:
+            clauses.append('total <= ?')
+            params.append(filters['max_total'])
+        if filters.get('item'):
+            clauses.append('bill_id IN (SELECT bill_id FROM bill_items WHERE name = ? COLLATE NOCASE)')
+            params.append(filters['item'])
+        return clauses, params
+
+    def query_bills(self, limit, cursor=None, **filters):
+        clauses, params = self._filter_clauses(filters)
+        if cursor is not None:
+            clauses.append('bill_id < ?')
+            params.append(cursor)
+
+        sql = 'SELECT * FROM bills'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY bill_id DESC'
+        if limit is not None:
+            # One extra row tells us whether there is a next page
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        conn = self._connect()
+        bills = self._attach_items(conn, conn.execute(sql, params))
+        if limit is not None and len(bills) > limit:
+            bills = bills[:limit]
+            return bills, bills[-1]['bill_id']
+        return bills, None
+
+    def iter_bills(self, chunk_size=1000, **filters):
+        clauses, params = self._filter_clauses(filters)
+        sql = 'SELECT * FROM bills WHERE ' + ' AND '.join(['bill_id > ?'] + clauses)
+        sql += ' ORDER BY bill_id LIMIT ?'
+        conn = self._connect()
+        after = 0
+        while True:
+            # Keyset pagination: each chunk is an index range scan
+            chunk = self._attach_items(conn, conn.execute(sql, [after] + params + [chunk_size]))
+            if not chunk:
+                return
+            yield from chunk
+            after = chunk[-1]['bill_id']
+
+    def bill_stats(self):
+        rows = self._connect().execute('SELECT payment_status, bill_count, amount_cents FROM bill_totals')
+        return format_totals({row[0]: (row[1], row[2]) for row in rows})
+
+    def revenue_report(self, granularity, start=None, end=None):
+        table = ROLLUP_TABLES[granularity][0]
+        clauses, params = ['bill_count > 0'], []
+        if start is not None:
+            clauses.append('period >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('period <= ?')
+            params.append(end)
+        rows = self._connect().execute(
+            f"SELECT period, bill_count, gross_cents, paid_cents, unpaid_cents FROM {table} "
+            f"WHERE {' AND '.join(clauses)} ORDER BY period",
+            params
+        )
+        return [format_period(*row) for row in rows]
+
+    @staticmethod
+    def _customer(row):
+        return {'phone': row[0], 'name': row[1], 'bills': row[2], 'last_bill_date': row[3]}
+
+    def list_customers(self, prefix, limit):
+        sql = 'SELECT phone, name, bill_count, last_date FROM customers'
+        params = []
+        if prefix:
+            # A range instead of LIKE so the primary key is used
+            sql += ' WHERE phone >= ? AND phone < ?'
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        rows = self._connect().execute(sql + ' ORDER BY phone LIMIT ?', params + [limit])
+        return [self._customer(row) for row in rows]
+
+    def get_customer(self, phone):
+        row = self._connect().execute(
+            'SELECT phone, name, bill_count, last_date FROM customers WHERE phone = ?', (phone,)
+        ).fetchone()
+        return self._customer(row) if row else None
+
+    def customer_bills(self, phone, limit, cursor=None):
+        # Served from idx_bills_customer_phone, whose entries are in bill_id order
+        sql = 'SELECT * FROM bills WHERE customer_phone = ?'
+        params = [phone]
+        if cursor is not None:
+            sql += ' AND bill_id < ?'
+            params.append(cursor)
+        sql += ' ORDER BY bill_id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        conn = self._connect()
+        bills = self._attach_items(conn, conn.execute(sql, params))
+        if len(bills) > limit:
+            bills = bills[:limit]
+            return bills, bills[-1]['bill_id']
+        return bills, None
+
+    def create_bill(self, bill):
+        record = {field: bill.get(field) or '' for field in BILL_FIELDS[1:]}
+        record['total'] = float(record['total'] or 0)
+        items = decode_items(bill.get('items'))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO bills ({', '.join(record)}) VALUES ({', '.join('?' * len(record))})",
+                list(record.values())
+            )
+            self._insert_items(conn, cursor.lastrowid, items)
+        return {'bill_id': cursor.lastrowid, **record, 'items': items}
+
+    def delete_bill(self, bill_id):
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM bills WHERE bill_id = ?', (bill_id,))
+            conn.execute('DELETE FROM bill_items WHERE bill_id = ?', (bill_id,))
+        return cursor.rowcount > 0
+
+    def update_payment_status(self, bill_id, payment_status):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE bills SET payment_status = ? WHERE bill_id = ?', (payment_status, bill_id)
+            )
+        if cursor.rowcount == 0:
+            return None
+        return self.get_bill(bill_id)
+
+    def import_records(self, inventory, bills):
+        """Bulk-load inventory items and bills, keeping their original ids"""
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO inventory (id, name, price) VALUES (:id, :name, :price)',
+                inventory
+            )
+            conn.executemany(
+                f"INSERT INTO bills ({', '.join(BILL_FIELDS)}) "
+                f"VALUES ({', '.join(':' + field for field in BILL_FIELDS)})",
+                bills
+            )
+            for bill in bills:
+                self._insert_items(conn, bill['bill_id'], decode_items(bill.get('items')))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,954 @@
+# storage.py - Process-resident data stores backing the Flask API
+import ast
+import bisect
+import csv
+import io
+import json
+import os
+import threading
+import uuid
+
+from aggregates import BillAggregates
+from commit_queue import CommitQueue
+from customer_index import CustomerIndex
+from id_allocator import BlockAllocator, FileSequence, file_lock
+from itertools import islice
+
+from metrics import CSV_IO_SECONDS
+from search_index import NameIndex
+
+
+# Distinguishes this process's in-memory version counters from earlier runs
+BOOT_ID = uuid.uuid4().hex[:12]
+
+# Inventory imports are read and committed this many rows at a time, so
+# other writers get a turn between chunks
+UPSERT_CHUNK = 10000
+
+
+def _file_signature(path):
+    """Return a cheap (mtime, size, inode) fingerprint of a file, or None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def normalize_item(item):
+    """Reduce a bill line item to its canonical name/quantity/price/total form"""
+    quantity = float(item.get('quantity') or 0)
+    return {
+        'name': str(item.get('name', '')),
+        'quantity': int(quantity) if quantity.is_integer() else quantity,
+        'price': float(item.get('price') or 0),
+        'total': float(item.get('total') or 0),
+    }
+
+
+def encode_items(items):
+    """Encode line items as compact JSON for the bills.csv items column"""
+    return json.dumps([normalize_item(item) for item in items], separators=(',', ':'))
+
+
+def decode_items(value):
+    """Decode a stored items column: JSON, or the legacy str(list) repr"""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [normalize_item(item) for item in value]
+    try:
+        items = json.loads(value)
+    except ValueError:
+        items = ast.literal_eval(value)
+    return [normalize_item(item) for item in items]
+
+
+def _is_legacy_items(value):
+    return bool(value) and not value.startswith('[{"') and value != '[]'
+
+
+def bill_matches(bill, filters):
+    """Check a bill against the /api/bills filters (all optional)
+
+    date_from/date_to are inclusive YYYY-MM-DD days, phone and name are
+    case-insensitive prefixes, item is an exact (case-insensitive) item name.
+    """
+    day = bill['date'][:10]
+    if filters.get('date_from') and day < filters['date_from']:
+        return False
+    if filters.get('date_to') and day > filters['date_to']:
+        return False
+    if filters.get('payment_status') and bill['payment_status'] != filters['payment_status']:
+        return False
+    if filters.get('phone') and not bill['customer_phone'].startswith(filters['phone']):
+        return False
+    if filters.get('name') and not bill['customer_name'].lower().startswith(filters['name'].lower()):
+        return False
+    if filters.get('min_total') is not None and bill['total'] < filters['min_total']:
+        return False
+    if filters.get('max_total') is not None and bill['total'] > filters['max_total']:
+        return False
+    if filters.get('item'):
+        name = filters['item'].lower()
+        if not any(item['name'].lower() == name for item in bill['items']):
+            return False
+    return True
+
+
+def _atomic_write_rows(path, fieldnames, rows):
+    """Write rows to a temporary file and swap it into place"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class InventoryStore:
+    """In-memory inventory keyed by id, written through to inventory.csv.
+
+    Reads are served from memory. The backing file is only re-parsed when its
+    fingerprint changes behind our back (e.g. someone edits it by hand).
+    New items are appended to the file; edits and deletes rewrite it from
+    memory without re-parsing. ``search_index`` follows every change so
+    name searches never scan the catalog.
+
+    Mutations are split into ``stage_*`` (change memory) and ``flush()``
+    (persist everything staged) so a CommitQueue can group them; the plain
+    methods do both in one step.
+    """
+
+    FIELDS = ['id', 'name', 'price']
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self._items = {}
+        self._next_id = 1
+        self._signature = None
+        self._pending = []
+        self._dirty = False
+        self.search_index = NameIndex()
+        self.version = 0
+
+    def _ensure_fresh(self):
+        if self._pending or self._dirty:
+            return
+        signature = _file_signature(self.path)
+        if signature != self._signature:
+            with CSV_IO_SECONDS.time(file='inventory', op='read'):
+                self._load()
+
+    def _load(self):
+        items = {}
+        if os.path.exists(self.path):
+            with open(self.path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if not row.get('id'):
+                        continue
+                    item_id = int(float(row['id']))
+                    items[item_id] = {
+                        'id': item_id,
+                        'name': row.get('name', ''),
+                        'price': float(row.get('price') or 0),
+                    }
+        self._items = items
+        self.search_index = NameIndex()
+        for item in items.values():
+            self.search_index.add(item['id'], item['name'])
+        self._next_id = max(items) + 1 if items else 1
+        self._signature = _file_signature(self.path)
+        self.version += 1
+
+    def data_version(self):
+        """Counter that changes whenever the visible items change"""
+        with self.lock:
+            self._ensure_fresh()
+            return self.version
+
+    def list_items(self):
+        """Return all items ordered by id"""
+        with self.lock:
+            self._ensure_fresh()
+            return [dict(self._items[item_id]) for item_id in sorted(self._items)]
+
+    def get_item(self, item_id):
+        with self.lock:
+            self._ensure_fresh()
+            item = self._items.get(item_id)
+            return dict(item) if item else None
+
+    def search(self, query, limit):
+        """Items matching ``query`` through the name index, best first"""
+        with self.lock:
+            self._ensure_fresh()
+            return [dict(self._items[item_id]) for item_id in self.search_index.search(query, limit)]
+
+    # Staged mutations
+    def _stage_new_item(self, name, price):
+        item = {'id': self._next_id, 'name': name, 'price': float(price)}
+        self._items[item['id']] = item
+        self.search_index.add(item['id'], name)
+        self._next_id += 1
+        self._pending.append(item)
+        return item
+
+    def stage_add_items(self, rows):
+        self._ensure_fresh()
+        return [dict(self._stage_new_item(name, price)) for name, price in rows]
+
+    def stage_upsert_items(self, rows, reprices=None):
+        """Add unknown names and reprice known ones (matched ignoring case).
+
+        With a ``reprices`` dict, new prices are collected there by item id
+        instead of applied, so a chunked import only appends new rows per
+        chunk and rewrites the file once, in stage_reprice_items().
+        """
+        self._ensure_fresh()
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        for name, price in rows:
+            price = float(price)
+            item_id = self.search_index.find(name)
+            if item_id is None:
+                self._stage_new_item(name, price)
+                counts['added'] += 1
+                continue
+            current = self._items[item_id]['price']
+            if reprices is not None:
+                current = reprices.get(item_id, current)
+            if current == price:
+                counts['unchanged'] += 1
+            elif reprices is not None:
+                reprices[item_id] = price
+                counts['updated'] += 1
+            else:
+                self._items[item_id]['price'] = price
+                self._dirty = True
+                counts['updated'] += 1
+        return counts
+
+    def stage_reprice_items(self, reprices):
+        """Apply {item_id: price}, skipping items deleted in the meantime"""
+        self._ensure_fresh()
+        for item_id, price in reprices.items():
+            item = self._items.get(item_id)
+            if item is not None and item['price'] != price:
+                item['price'] = price
+                self._dirty = True
+
+    def stage_update_item(self, item_id, name, price):
+        self._ensure_fresh()
+        item = self._items.get(item_id)
+        if item is None:
+            return False
+        item['name'] = name
+        item['price'] = float(price)
+        self.search_index.remove(item_id)
+        self.search_index.add(item_id, name)
+        self._dirty = True
+        return True
+
+    def stage_delete_item(self, item_id):
+        self._ensure_fresh()
+        if self._items.pop(item_id, None) is None:
+            return False
+        self.search_index.remove(item_id)
+        self._dirty = True
+        return True
+
+    def flush(self):
+        """Persist staged changes: one append, or one rewrite if rows changed"""
+        if self._dirty:
+            with CSV_IO_SECONDS.time(file='inventory', op='rewrite'):
+                _atomic_write_rows(self.path, self.FIELDS, self._items.values())
+        elif self._pending:
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with CSV_IO_SECONDS.time(file='inventory', op='append'), \
+                    open(self.path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+                if write_header:
+                    writer.writeheader()
+                writer.writerows(self._pending)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            return
+        self._pending = []
+        self._dirty = False
+        self._signature = _file_signature(self.path)
+        self.version += 1
+
+    def discard_pending(self):
+        """Forget staged changes and re-read the file on next access"""
+        self._pending = []
+        self._dirty = False
+        self._signature = None
+
+    def _commit(self, stage, *args):
+        with self.lock:
+            try:
+                result = stage(*args)
+                self.flush()
+            except Exception:
+                self.discard_pending()
+                raise
+            return result
+
+    def add_item(self, name, price):
+        """Add an item and append it to the backing file"""
+        return self.add_items([(name, price)])[0]
+
+    def add_items(self, rows):
+        """Add several (name, price) rows with a single append, returning the new items"""
+        return self._commit(self.stage_add_items, rows)
+
+    def upsert_items(self, rows):
+        """Upsert (name, price) rows in one write; returns added/updated/unchanged counts"""
+        return self._commit(self.stage_upsert_items, rows)
+
+    def update_item(self, item_id, name, price):
+        """Update an item in place; returns False if it does not exist"""
+        return self._commit(self.stage_update_item, item_id, name, price)
+
+    def delete_item(self, item_id):
+        """Remove an item; returns False if it does not exist"""
+        return self._commit(self.stage_delete_item, item_id)
+
+
+class BillLedger:
+    """Append-only bills.csv with a tombstone log for deletes.
+
+    Every new bill is a single appended row, so saving a bill costs the same
+    no matter how long the history is. Deleting a bill appends its id to
+    ``<path>.deleted``; a status change appends the updated row, and the
+    last row for an id wins. ``compact()`` later rewrites bills.csv without
+    deleted or superseded rows and clears the tombstones. Compaction runs on
+    demand and kicks off in a background thread once enough dead rows pile up.
+
+    Several processes may share the files: bill ids come from a block
+    allocator on ``<path>.seq``, rows other processes append are picked up by
+    reading only the new bytes, and ``<path>.lock`` keeps appends out of the
+    way while a compaction swaps the file.
+
+    Like InventoryStore, appends and deletes can be staged and then written
+    together by ``flush()``: one write and one fsync per file per batch.
+    """
+
+    # New columns only ever go at the end, so files with an older header still parse
+    FIELDS = ['bill_id', 'date', 'customer_name', 'customer_phone',
+              'customer_email', 'items', 'total', 'payment_status', 'notes', 'signature_id']
+
+    def __init__(self, path, compact_threshold=100, id_block_size=50):
+        self.path = path
+        self.tombstone_path = f"{path}.deleted"
+        self.lock_path = f"{path}.lock"
+        self.compact_threshold = compact_threshold
+        self.id_allocator = BlockAllocator(
+            FileSequence(f"{path}.seq", floor=lambda: self._max_id), id_block_size
+        )
+        self.lock = threading.RLock()
+        self._compacting = False
+        self._reset()
+
+    def _reset(self):
+        self.version = getattr(self, 'version', 0) + 1
+        self._bills = {}
+        # Live bill ids in ascending order, for paging without sorting
+        self._ids = []
+        self.aggregates = BillAggregates()
+        self.customers = CustomerIndex()
+        self._deleted = set()
+        # Rows in bills.csv, including deleted and superseded ones
+        self._file_rows = 0
+        self._max_id = 0
+        self._fieldnames = self.FIELDS
+        # (inode, bytes consumed) for each file, or None if not read yet
+        self._bills_pos = None
+        self._tombstones_pos = None
+        self._signatures = None
+        self._pending_rows = []
+        self._pending_tombstones = []
+        self.legacy_rows = 0
+
+    @staticmethod
+    def _tail_offset(signature, pos):
+        """Offset to resume reading from, or None if the file must be re-read"""
+        if pos is None:
+            return 0
+        if signature is None or signature[2] != pos[0] or signature[1] < pos[1]:
+            return None
+        return pos[1]
+
+    def _ensure_fresh(self):
+        if self._pending_rows or self._pending_tombstones:
+            return
+        signatures = (_file_signature(self.path), _file_signature(self.tombstone_path))
+        if signatures == self._signatures:
+            return
+        bills_offset = self._tail_offset(signatures[0], self._bills_pos)
+        tombstones_offset = self._tail_offset(signatures[1], self._tombstones_pos)
+        if bills_offset is None or tombstones_offset is None:
+            self._reset()
+            bills_offset = tombstones_offset = 0
+        with CSV_IO_SECONDS.time(file='bills', op='read'):
+            self._read_bills(bills_offset)
+            self._read_tombstones(tombstones_offset)
+        self._signatures = signatures
+
+    @staticmethod
+    def _read_complete_lines(path, offset):
+        """Return (inode, new offset, text) for whole CSV records appended after offset"""
+        with open(path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            data = f.read()
+        # A concurrent writer may be half-way through its last record, and a
+        # quoted field (e.g. multi-line notes) may hold newlines of its own:
+        # only a newline after an even number of quotes ends a record
+        end = data.rfind(b'\n') + 1
+        quotes = data.count(b'"', 0, end)
+        while end and quotes % 2:
+            previous = data.rfind(b'\n', 0, end - 1) + 1
+            quotes -= data.count(b'"', previous, end)
+            end = previous
+        return inode, offset + end, data[:end].decode('utf-8')
+
+    def _read_bills(self, offset):
+        if not os.path.exists(self.path):
+            return
+        inode, new_offset, text = self._read_complete_lines(self.path, offset)
+        rows = csv.reader(io.StringIO(text, newline=''))
+        if offset == 0:
+            self._fieldnames = next(rows, None) or self.FIELDS
+        for values in rows:
+            # Rows appended after a column was added outrun an older header
+            fieldnames = self.FIELDS if len(values) > len(self._fieldnames) else self._fieldnames
+            row = dict(zip(fieldnames, values))
+            if not row.get('bill_id'):
+                continue
+            if _is_legacy_items(row.get('items')):
+                self.legacy_rows += 1
+            bill = self._parse_row(row)
+            self._file_rows += 1
+            self._max_id = max(self._max_id, bill['bill_id'])
+            if bill['bill_id'] not in self._deleted:
+                self._put(bill)
+        self._bills_pos = (inode, new_offset)
+
+    def _read_tombstones(self, offset):
+        if not os.path.exists(self.tombstone_path):
+            return
+        inode, new_offset, text = self._read_complete_lines(self.tombstone_path, offset)
+        for line in text.splitlines():
+            if line.strip():
+                bill_id = int(line)
+                self._deleted.add(bill_id)
+                self._drop(bill_id)
+                # Never hand out an id that still has a tombstone pointing at it
+                self._max_id = max(self._max_id, bill_id)
+        self._tombstones_pos = (inode, new_offset)
+
+    def _put(self, bill):
+        existing = self._bills.get(bill['bill_id'])
+        if existing is None:
+            bisect.insort(self._ids, bill['bill_id'])
+        elif existing == bill:
+            # Re-reading our own appended row is not a change
+            return
+        else:
+            # A later row for the same id (a status update) supersedes it
+            self.aggregates.remove(existing)
+            self.customers.remove(existing)
+        self.aggregates.add(bill)
+        self.customers.add(bill)
+        self.version += 1
+        self._bills[bill['bill_id']] = bill
+
+    def _drop(self, bill_id):
+        bill = self._bills.pop(bill_id, None)
+        if bill is None:
+            return False
+        del self._ids[bisect.bisect_left(self._ids, bill_id)]
+        self.aggregates.remove(bill)
+        self.customers.remove(bill)
+        self.version += 1
+        return True
+
+    def stats(self):
+        """Bill count and revenue totals, kept up to date by every change"""
+        with self.lock:
+            self._ensure_fresh()
+            return self.aggregates.totals()
+
+    def revenue(self, granularity, start=None, end=None):
+        with self.lock:
+            self._ensure_fresh()
+            return self.aggregates.revenue(granularity, start, end)
+
+    def data_version(self):
+        """Counter that changes whenever the set of live bills changes"""
+        with self.lock:
+            self._ensure_fresh()
+            return self.version
+
+    @staticmethod
+    def _parse_row(row):
+        bill = {field: row.get(field) or '' for field in BillLedger.FIELDS}
+        bill['bill_id'] = int(float(row['bill_id']))
+        bill['total'] = float(row.get('total') or 0)
+        bill['items'] = decode_items(bill['items'])
+        return bill
+
+    @staticmethod
+    def _to_row(bill):
+        return {**bill, 'items': encode_items(bill['items'])}
+
+    def list_bills(self):
+        """Return all live bills ordered by id"""
+        with self.lock:
+            self._ensure_fresh()
+            return [dict(self._bills[bill_id]) for bill_id in self._ids]
+
+    def get_bill(self, bill_id):
+        with self.lock:
+            self._ensure_fresh()
+            bill = self._bills.get(bill_id)
+            return dict(bill) if bill else None
+
+    # Staged mutations
+    def stage_append_bill(self, bill):
+        self._ensure_fresh()
+        # Same shape and types as a row read back from the file
+        record = {field: str(bill.get(field) or '') for field in self.FIELDS}
+        record['bill_id'] = self.id_allocator.next_id()
+        record['total'] = float(bill.get('total') or 0)
+        record['items'] = decode_items(bill.get('items'))
+        self._put(record)
+        self._max_id = max(self._max_id, record['bill_id'])
+        self._pending_rows.append(record)
+        return dict(record)
+
+    def stage_delete_bill(self, bill_id):
+        self._ensure_fresh()
+        if not self._drop(bill_id):
+            return False
+        self._deleted.add(bill_id)
+        self._pending_tombstones.append(bill_id)
+        return True
+
+    def stage_update_status(self, bill_id, payment_status):
+        self._ensure_fresh()
+        bill = self._bills.get(bill_id)
+        if bill is None:
+            return None
+        updated = {**bill, 'payment_status': payment_status}
+        self._put(updated)
+        # Appended like a new bill; the last row for an id wins on read
+        self._pending_rows.append(updated)
+        return dict(updated)
+
+    @staticmethod
+    def _append_text(path, text):
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def flush(self):
+        """Append all staged rows and tombstones, one write per file"""
+        if not (self._pending_rows or self._pending_tombstones):
+            return
+        with CSV_IO_SECONDS.time(file='bills', op='append'), file_lock(self.lock_path, exclusive=False):
+            if self._pending_rows:
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=self.FIELDS)
+                if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                    writer.writeheader()
+                writer.writerows(self._to_row(record) for record in self._pending_rows)
+                self._append_text(self.path, buffer.getvalue())
+            if self._pending_tombstones:
+                self._append_text(
+                    self.tombstone_path, ''.join(f"{bill_id}\n" for bill_id in self._pending_tombstones)
+                )
+        # The rows are re-read (idempotently) by the next tail read, which
+        # keeps our offsets correct even if other processes appended too
+        self._pending_rows = []
+        self._pending_tombstones = []
+        if self._dead_rows() >= self.compact_threshold and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def _dead_rows(self):
+        return self._file_rows - len(self._ids)
+
+    def discard_pending(self):
+        """Forget staged changes and re-read the files on next access"""
+        self._reset()
+
+    def _commit(self, stage, *args):
+        with self.lock:
+            try:
+                result = stage(*args)
+                self.flush()
+            except Exception:
+                self.discard_pending()
+                raise
+            return result
+
+    def append_bill(self, bill):
+        """Assign the next bill id and append the bill as one CSV row"""
+        return self._commit(self.stage_append_bill, bill)
+
+    def delete_bill(self, bill_id):
+        """Tombstone a bill; returns False if it does not exist"""
+        return self._commit(self.stage_delete_bill, bill_id)
+
+    def update_status(self, bill_id, payment_status):
+        """Change a bill's payment status; returns the bill, or None if missing"""
+        return self._commit(self.stage_update_status, bill_id, payment_status)
+
+    def find_bills_by_item(self, name):
+        """Return live bills containing a line item with this name (case-insensitive)"""
+        return list(reversed(self.query(None, item=name)[0]))
+
+    def query(self, limit, before=None, **filters):
+        """Return (bills, next_cursor): newest-first bills older than ``before``
+
+        Walks the id index backwards from the cursor and stops as soon as a
+        page is full, so cost depends on the page size rather than history.
+        """
+        with self.lock:
+            self._ensure_fresh()
+            end = len(self._ids) if before is None else bisect.bisect_left(self._ids, before)
+            page = []
+            for index in range(end - 1, -1, -1):
+                bill = self._bills[self._ids[index]]
+                if bill_matches(bill, filters):
+                    if limit is not None and len(page) == limit:
+                        return page, page[-1]['bill_id']
+                    page.append(dict(bill))
+            return page, None
+
+    def _customer_summary(self, phone, ids):
+        latest = self._bills[ids[-1]]
+        return {
+            'phone': phone,
+            'name': latest['customer_name'],
+            'bills': len(ids),
+            'last_bill_date': latest['date'],
+        }
+
+    def customers_by_prefix(self, prefix, limit):
+        """Customers whose phone starts with ``prefix``, for autocomplete"""
+        with self.lock:
+            self._ensure_fresh()
+            return [
+                self._customer_summary(phone, self.customers.bill_ids(phone))
+                for phone in self.customers.phones(prefix, limit)
+            ]
+
+    def customer(self, phone):
+        with self.lock:
+            self._ensure_fresh()
+            ids = self.customers.bill_ids(phone)
+            return self._customer_summary(phone, ids) if ids else None
+
+    def customer_bills(self, phone, limit, before=None):
+        """Return (bills, next_cursor) for one phone, newest first, from the customer index"""
+        with self.lock:
+            self._ensure_fresh()
+            ids = self.customers.bill_ids(phone)
+            end = len(ids) if before is None else bisect.bisect_left(ids, before)
+            start = max(0, end - limit)
+            page = [dict(self._bills[bill_id]) for bill_id in reversed(ids[start:end])]
+            return page, (page[-1]['bill_id'] if start > 0 else None)
+
+    def iter_bills(self, chunk_size=1000, **filters):
+        """Yield matching bills oldest first without holding the lock throughout"""
+        after = 0
+        while True:
+            with self.lock:
+                self._ensure_fresh()
+                start = bisect.bisect_right(self._ids, after)
+                chunk = [self._bills[bill_id] for bill_id in self._ids[start:start + chunk_size]]
+            if not chunk:
+                return
+            for bill in chunk:
+                if bill_matches(bill, filters):
+                    yield dict(bill)
+            after = chunk[-1]['bill_id']
+
+    def _rewrite(self):
+        """Swap in a bills.csv holding only live bills; caller holds the file lock"""
+        self._ensure_fresh()
+        _atomic_write_rows(
+            self.path, self.FIELDS,
+            (self._to_row(self._bills[bill_id]) for bill_id in self._ids)
+        )
+        # Tombstones are only dropped after the compacted file is in place
+        if os.path.exists(self.tombstone_path):
+            os.remove(self.tombstone_path)
+        signature = _file_signature(self.path)
+        self._deleted.clear()
+        self._file_rows = len(self._ids)
+        self._fieldnames = self.FIELDS
+        self._bills_pos = (signature[2], signature[1])
+        self._tombstones_pos = None
+        self._signatures = (signature, None)
+        self.legacy_rows = 0
+
+    def rewrite(self):
+        """Rewrite bills.csv from memory, converting any legacy items columns"""
+        with self.lock, file_lock(self.lock_path):
+            self._ensure_fresh()
+            converted = self.legacy_rows
+            self._rewrite()
+            return converted
+
+    def compact(self):
+        """Rewrite bills.csv without deleted or superseded rows; returns the number dropped"""
+        with self.lock:
+            try:
+                with file_lock(self.lock_path):
+                    self._ensure_fresh()
+                    removed = self._dead_rows()
+                    if removed:
+                        with CSV_IO_SECONDS.time(file='bills', op='compact'):
+                            self._rewrite()
+                    return removed
+            finally:
+                self._compacting = False
+
+
+class Storage:
+    """Repository interface the Flask routes use for inventory and bills.
+
+    ``CsvStorage`` keeps the original CSV files for small installs and
+    ``sqlite_storage.SqliteStorage`` provides indexed lookups for larger
+    ones. Use ``open_storage()`` to pick one from configuration.
+    """
+
+    # Inventory
+    def list_inventory(self):
+        raise NotImplementedError
+
+    def get_inventory_item(self, item_id):
+        raise NotImplementedError
+
+    def search_inventory(self, query, limit):
+        """Up to ``limit`` items whose name contains ``query``, case-insensitively.
+
+        Queries shorter than three characters match the start of any word.
+        Names starting with the query come first, then alphabetical order.
+        """
+        raise NotImplementedError
+
+    def add_inventory_items(self, rows):
+        raise NotImplementedError
+
+    def add_inventory_item(self, name, price):
+        return self.add_inventory_items([(name, price)])[0]
+
+    def upsert_inventory_items(self, rows):
+        """Add or reprice items from an iterable of (name, price), matching names ignoring case.
+
+        ``rows`` may be a generator; it is consumed once, in chunks that each
+        commit separately, so other writers are not held up by a long upload.
+        Returns {'added': n, 'updated': n, 'unchanged': n}.
+        """
+        raise NotImplementedError
+
+    def update_inventory_item(self, item_id, name, price):
+        raise NotImplementedError
+
+    def delete_inventory_item(self, item_id):
+        raise NotImplementedError
+
+    # Bills
+    def list_bills(self):
+        raise NotImplementedError
+
+    def get_bill(self, bill_id):
+        raise NotImplementedError
+
+    def find_bills_by_item(self, name):
+        raise NotImplementedError
+
+    def iter_bills(self, chunk_size=1000, **filters):
+        """Yield matching bills oldest first, reading storage in small chunks"""
+        raise NotImplementedError
+
+    def bill_stats(self):
+        """Totals for the Bill History header, from maintained counters"""
+        raise NotImplementedError
+
+    def revenue_report(self, granularity, start=None, end=None):
+        """Per-day or per-month rollup rows between two periods (inclusive).
+
+        ``granularity`` is 'day' or 'month'; start/end are YYYY-MM-DD or
+        YYYY-MM keys to match.
+        """
+        raise NotImplementedError
+
+    def data_version(self, kind):
+        """Opaque token that changes whenever 'inventory' or 'bills' data changes.
+
+        Cheap enough to check on every request; used for HTTP ETags.
+        """
+        raise NotImplementedError
+
+    def query_bills(self, limit, cursor=None, **filters):
+        """Return (bills, next_cursor) for one newest-first page.
+
+        ``cursor`` is the next_cursor of the previous page (a bill id);
+        next_cursor is None on the last page. See ``bill_matches`` for the
+        supported filters.
+        """
+        raise NotImplementedError
+
+    def create_bill(self, bill):
+        raise NotImplementedError
+
+    def delete_bill(self, bill_id):
+        raise NotImplementedError
+
+    def update_payment_status(self, bill_id, payment_status):
+        """Change a bill's payment status; returns the bill, or None if missing"""
+        raise NotImplementedError
+
+    # Customers
+    def list_customers(self, prefix, limit):
+        """Up to ``limit`` customers whose phone starts with ``prefix``, by phone.
+
+        Each is {phone, name, bills, last_bill_date}; the name is taken from
+        the customer's most recent bill.
+        """
+        raise NotImplementedError
+
+    def get_customer(self, phone):
+        """Summary for one phone, or None if it has no bills"""
+        raise NotImplementedError
+
+    def customer_bills(self, phone, limit, cursor=None):
+        """Return (bills, next_cursor) for one phone, newest first, like query_bills"""
+        raise NotImplementedError
+
+    def compact(self):
+        """Reclaim space left by deletes; returns the number of rows dropped"""
+        return 0
+
+    def close(self):
+        pass
+
+
+class CsvStorage(Storage):
+    """Storage backed by inventory.csv and the append-only bills.csv ledger.
+
+    Every mutation goes through one CommitQueue, so concurrent requests
+    never interleave read-modify-write cycles and share flushes.
+    """
+
+    def __init__(self, inventory_path, bills_path):
+        self.inventory = InventoryStore(inventory_path)
+        self.bills = BillLedger(bills_path)
+        self.commits = CommitQueue()
+
+    def data_version(self, kind):
+        store = self.inventory if kind == 'inventory' else self.bills
+        return f"{BOOT_ID}-{store.data_version()}"
+
+    def list_inventory(self):
+        return self.inventory.list_items()
+
+    def get_inventory_item(self, item_id):
+        return self.inventory.get_item(item_id)
+
+    def search_inventory(self, query, limit):
+        return self.inventory.search(query, limit)
+
+    def add_inventory_items(self, rows):
+        return self.commits.submit(self.inventory, lambda: self.inventory.stage_add_items(rows))
+
+    def upsert_inventory_items(self, rows):
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        rows = iter(rows)
+        reprices = {}
+        # The upload is read here, not on the writer thread. Each chunk only
+        # appends its new items; price changes would rewrite the whole file,
+        # so they are collected and applied in one rewrite at the end
+        for chunk in iter(lambda: list(islice(rows, UPSERT_CHUNK)), []):
+            chunk_counts = self.commits.submit(
+                self.inventory, lambda: self.inventory.stage_upsert_items(chunk, reprices)
+            )
+            for key, value in chunk_counts.items():
+                counts[key] += value
+        if reprices:
+            self.commits.submit(self.inventory, lambda: self.inventory.stage_reprice_items(reprices))
+        return counts
+
+    def update_inventory_item(self, item_id, name, price):
+        return self.commits.submit(
+            self.inventory, lambda: self.inventory.stage_update_item(item_id, name, price)
+        )
+
+    def delete_inventory_item(self, item_id):
+        return self.commits.submit(self.inventory, lambda: self.inventory.stage_delete_item(item_id))
+
+    def list_bills(self):
+        return self.bills.list_bills()
+
+    def get_bill(self, bill_id):
+        return self.bills.get_bill(bill_id)
+
+    def find_bills_by_item(self, name):
+        return self.bills.find_bills_by_item(name)
+
+    def query_bills(self, limit, cursor=None, **filters):
+        return self.bills.query(limit, cursor, **filters)
+
+    def iter_bills(self, chunk_size=1000, **filters):
+        return self.bills.iter_bills(chunk_size, **filters)
+
+    def bill_stats(self):
+        return self.bills.stats()
+
+    def revenue_report(self, granularity, start=None, end=None):
+        return self.bills.revenue(granularity, start, end)
+
+    def list_customers(self, prefix, limit):
+        return self.bills.customers_by_prefix(prefix, limit)
+
+    def get_customer(self, phone):
+        return self.bills.customer(phone)
+
+    def customer_bills(self, phone, limit, cursor=None):
+        return self.bills.customer_bills(phone, limit, cursor)
+
+    def create_bill(self, bill):
+        return self.commits.submit(self.bills, lambda: self.bills.stage_append_bill(bill))
+
+    def delete_bill(self, bill_id):
+        return self.commits.submit(self.bills, lambda: self.bills.stage_delete_bill(bill_id))
+
+    def update_payment_status(self, bill_id, payment_status):
+        return self.commits.submit(
+            self.bills, lambda: self.bills.stage_update_status(bill_id, payment_status)
+        )
+
+    def compact(self):
+        return self.commits.submit(self.bills, self.bills.compact)
+
+
+def open_storage(backend='csv', inventory_csv='inventory.csv', bills_csv='bills.csv',
+                 db_path='billing.db'):
+    """Create the storage backend named by ``backend`` ('csv' or 'sqlite')"""
+    if backend == 'csv':
+        return CsvStorage(inventory_csv, bills_csv)
+    if backend == 'sqlite':
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(db_path)
+    raise ValueError(f"Unknown storage backend: {backend!r} (expected 'csv' or 'sqlite')")
@@ -3,11 +3,15 @@ import streamlit as st
 import pandas as pd
 import requests
 import os
+import base64
+import time
 from datetime import datetime
 
 # Configuration - Use environment variable for backend URL
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:5001")
 API_BASE_URL = f"{BACKEND_URL}/api"
+BILLS_PAGE_SIZE = 50
+CATALOG_PAGE_SIZE = 40
 
 # Page config
 st.set_page_config(
@@ -52,12 +56,36 @@ if 'cart' not in st.session_state:
 if 'inventory' not in st.session_state:
     st.session_state.inventory = []
 
+if 'http_cache' not in st.session_state:
+    st.session_state.http_cache = {}
+
 # Helper functions
+def conditional_get(path, params=None, timeout=10):
+    """GET an API path, revalidating our cached copy with If-None-Match.
+
+    Returns (response, data); data is the JSON body, taken from the cache on
+    304 Not Modified, or None if the request failed.
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    cached = st.session_state.http_cache.get(key)
+    headers = {'If-None-Match': cached[0]} if cached else {}
+    response = requests.get(f"{API_BASE_URL}/{path}", params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        return response, cached[1]
+    if response.status_code != 200:
+        return response, None
+    data = response.json()
+    if response.headers.get('ETag'):
+        # Keep the cache small - bill history pages come and go
+        if len(st.session_state.http_cache) >= 20:
+            st.session_state.http_cache.pop(next(iter(st.session_state.http_cache)))
+        st.session_state.http_cache[key] = (response.headers['ETag'], data)
+    return response, data
+
 def fetch_inventory():
     try:
-        response = requests.get(f"{API_BASE_URL}/inventory", timeout=10)
-        if response.status_code == 200:
-            inventory = response.json()
+        response, inventory = conditional_get("inventory")
+        if inventory is not None:
             st.session_state.inventory = inventory
             return inventory
         else:
@@ -73,6 +101,65 @@ def fetch_inventory():
         st.error(f"❌ **Error fetching inventory**: {str(e)}")
         return []
 
+def search_catalog(query):
+    """Fetch only the catalog items matching the search box"""
+    try:
+        response, items = conditional_get("inventory/search", {'q': query, 'limit': CATALOG_PAGE_SIZE})
+        if items is None:
+            st.error(f"Failed to search inventory: {response.text}")
+            return []
+        return items
+    except requests.exceptions.ConnectionError:
+        st.info("💡 **Solution**: Run `python app.py` in your terminal to start the Flask backend.")
+        return []
+    except Exception as e:
+        st.error(f"❌ **Error searching inventory**: {str(e)}")
+        return []
+
+def wait_for_bill_pdf(job, timeout=30):
+    """Poll a render job until its PDF is ready; None if it failed or timed out"""
+    deadline = time.time() + timeout
+    delay = 0.1
+    while time.time() < deadline:
+        status = requests.get(f"{BACKEND_URL}{job['status_url']}", timeout=5).json()
+        if status['status'] == 'done':
+            return requests.get(f"{BACKEND_URL}{job['pdf_url']}", timeout=10).content
+        if status['status'] == 'failed':
+            st.error(f"❌ PDF rendering failed: {status['error']}")
+            return None
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return None
+
+def fetch_bill_pdf(bill_id):
+    """A stored bill's PDF, fetched here so the browser never needs to reach the API"""
+    try:
+        response = requests.get(f"{API_BASE_URL}/bills/{bill_id}/pdf", timeout=30)
+        if response.status_code == 200:
+            return response.content
+        if response.status_code == 202:
+            st.info("⏳ The PDF is still rendering - try again in a moment.")
+        else:
+            st.error(f"❌ Failed to fetch PDF: {response.text}")
+    except requests.exceptions.ConnectionError:
+        st.error("🔴 **Connection Error**: Cannot connect to the Flask server.")
+    except Exception as e:
+        st.error(f"❌ Error fetching PDF: {str(e)}")
+    return None
+
+def suggest_customers(prefix):
+    """Returning customers whose mobile number starts with what was typed"""
+    try:
+        _, customers = conditional_get("customers", {'prefix': prefix, 'limit': 5}, timeout=5)
+        return customers or []
+    except requests.exceptions.RequestException:
+        return []
+
+def use_customer(customer):
+    # Runs as a button callback, before the inputs are drawn again
+    st.session_state.cust_phone = customer['phone']
+    st.session_state.cust_name = customer['name']
+
 def add_item_to_inventory(name, price):
     try:
         response = requests.post(
@@ -133,6 +220,38 @@ def delete_inventory_item(item_id):
         st.error(f"❌ Error deleting item: {str(e)}")
         return False
 
+def update_bill_status(bill_id, payment_status):
+    try:
+        response = requests.patch(f"{API_BASE_URL}/bills/{bill_id}", json={'payment_status': payment_status}, timeout=10)
+        if response.status_code == 200:
+            st.success(f"✅ Bill {bill_id} marked as {payment_status}")
+            return True
+        error_msg = response.json().get('error', 'Unknown error') if response.headers.get('content-type', '').startswith('application/json') else response.text
+        st.error(f"❌ Failed to update bill: {error_msg}")
+        return False
+    except requests.exceptions.ConnectionError:
+        st.error("🔴 **Connection Error**: Cannot connect to the Flask server.")
+        return False
+    except Exception as e:
+        st.error(f"❌ Error: {str(e)}")
+        return False
+
+def upload_signature(signature_file):
+    """Store an uploaded signature image; returns its signature_id or None"""
+    try:
+        encoded = base64.b64encode(signature_file.getvalue()).decode('ascii')
+        response = requests.post(f"{API_BASE_URL}/signature", json={'signature': encoded}, timeout=10)
+        if response.status_code == 200:
+            return response.json()['signature_id']
+        st.error(f"❌ Signature not saved: {response.json().get('error', response.text)}")
+        return None
+    except requests.exceptions.ConnectionError:
+        st.error("🔴 **Connection Error**: Cannot connect to the Flask server.")
+        return None
+    except Exception as e:
+        st.error(f"❌ Error saving signature: {str(e)}")
+        return None
+
 def delete_bill(bill_id):
     try:
         response = requests.delete(f"{API_BASE_URL}/bills/{bill_id}", timeout=10)
@@ -212,18 +331,11 @@ with tab1:
     with col1:
         st.markdown('<div class="section-header">Product Catalog</div>', unsafe_allow_html=True)
         
-        # Fetch inventory automatically if empty
-        if not st.session_state.inventory:
-            with st.spinner("Loading inventory..."):
-                st.session_state.inventory = fetch_inventory()
-        
-        # Auto-refresh inventory button
+        # Refresh button - searches revalidate with the server on every run
         col_refresh, col_search, col_empty = st.columns([1, 2, 2])
         with col_refresh:
             if st.button("🔄 Refresh", key="refresh_billing"):
-                with st.spinner("Refreshing inventory..."):
-                    fetch_inventory()
-                    st.experimental_rerun()
+                st.experimental_rerun()
         
         with col_search:
             # Search - now half the length
@@ -232,13 +344,8 @@ with tab1:
         with col_empty:
             st.empty()  # Empty space
 
-        # Filter inventory
-        filtered_inventory = st.session_state.inventory
-        if search_term:
-            filtered_inventory = [
-                item for item in st.session_state.inventory
-                if search_term.lower() in item['name'].lower()
-            ]
+        # Search on the server; only matching items are downloaded
+        filtered_inventory = search_catalog(search_term)
         
         # Display products in smaller, more compact boxes
         if filtered_inventory:
@@ -269,6 +376,8 @@ with tab1:
                                 add_to_cart(item)
                                 st.success(f"Added {item['name']} to cart!")
                                 st.experimental_rerun()
+        elif search_term:
+            st.info("No products match your search.")
         else:
             st.info("No products found. Add items to inventory first.")
     
@@ -322,10 +431,23 @@ with tab1:
             """)
             
             st.markdown('<div class="section-header">Customer Details</div>', unsafe_allow_html=True)
-            customer_name = st.text_input("Customer Name*", key="cust_name")
             customer_phone = st.text_input("Mobile Number*", key="cust_phone")
+            # Offer returning customers once a few digits are typed
+            if len(customer_phone.strip()) >= 3:
+                for customer in suggest_customers(customer_phone.strip()):
+                    if customer['phone'] == customer_phone and customer['name'] == st.session_state.get('cust_name'):
+                        continue
+                    st.button(
+                        f"👤 {customer['name']} · {customer['phone']} ({customer['bills']} bills)",
+                        key=f"use_customer_{customer['phone']}",
+                        on_click=use_customer,
+                        args=(customer,)
+                    )
+            customer_name = st.text_input("Customer Name*", key="cust_name")
             payment_status = st.selectbox("Payment Status", ["Paid", "Unpaid"])
             notes = st.text_area("Remarks (Optional)", key="cust_notes", height=60)
+            signature_file = st.file_uploader("Signature (Optional)", type=['png', 'jpg', 'jpeg'], key="cust_signature")
+            bill_format = st.selectbox("Bill Format", ["A4 PDF", "Thermal Receipt (80 mm)", "Thermal Receipt (58 mm)"])
             
             if st.button("🧾 Generate Bill", type="primary", use_container_width=True):
                 if not customer_name or not customer_phone:
@@ -358,30 +480,63 @@ with tab1:
                         'payment_status': payment_status,
                         'notes': notes
                     }
+                    if signature_file is not None:
+                        signature_id = upload_signature(signature_file)
+                        if signature_id:
+                            bill_data['signature_id'] = signature_id
                     
                     try:
-                        response = requests.post(
-                            f"{API_BASE_URL}/generate-bill",
-                            json=bill_data,
-                            timeout=30  # Longer timeout for PDF generation
-                        )
-                        
-                        if response.status_code == 200:
-                            st.success("✅ Bill generated successfully!")
-                            
-                            # Download button
-                            st.download_button(
-                                label="📥 Download PDF",
-                                data=response.content,
-                                file_name=f"Bill_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                                mime="application/pdf"
+                        if bill_format != "A4 PDF":
+                            # Receipts come back at once as plain text
+                            response = requests.post(
+                                f"{API_BASE_URL}/generate-bill",
+                                params={'format': 'receipt-text', 'paper': 58 if '58' in bill_format else 80},
+                                json=bill_data,
+                                timeout=10
                             )
-                            
-                            st.info("💡 Cart will be cleared automatically after successful bill generation.")
-                            # Auto-clear cart after successful bill generation
-                            st.session_state.cart = []
+                            if response.status_code == 200:
+                                st.success(f"✅ Bill #{response.headers.get('X-Bill-Id')} saved!")
+                                st.session_state.cart = []
+                                st.code(response.text, language=None)
+                                st.download_button(
+                                    label="📥 Download Receipt",
+                                    data=response.text,
+                                    file_name=f"Receipt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                                    mime="text/plain"
+                                )
+                            else:
+                                st.error(f"❌ Error generating bill: {response.text}")
                         else:
-                            st.error(f"❌ Error generating bill: {response.text}")
+                            # The server saves the bill right away and renders the PDF in the background
+                            response = requests.post(
+                                f"{API_BASE_URL}/generate-bill",
+                                params={'async': 1},
+                                json=bill_data,
+                                timeout=10
+                            )
+                        
+                            if response.status_code == 202:
+                                job = response.json()
+                                st.success(f"✅ Bill #{job['bill_id']} saved!")
+                                # Auto-clear cart as soon as the bill is saved
+                                st.session_state.cart = []
+                            
+                                with st.spinner("Preparing PDF..."):
+                                    pdf = wait_for_bill_pdf(job)
+                                if pdf is not None:
+                                    # Download button
+                                    st.download_button(
+                                        label="📥 Download PDF",
+                                        data=pdf,
+                                        file_name=f"Bill_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                                        mime="application/pdf"
+                                    )
+                                else:
+                                    # Offered below the cart until it is fetched
+                                    st.session_state.pending_pdf = job['bill_id']
+                                    st.warning("⏳ The PDF is still rendering - fetch it below in a moment.")
+                            else:
+                                st.error(f"❌ Error generating bill: {response.text}")
                     except requests.exceptions.ConnectionError:
                         st.error("🔴 **Connection Error**: Cannot connect to the Flask server.")
                     except requests.exceptions.Timeout:
@@ -391,6 +546,21 @@ with tab1:
         else:
             st.info("Cart is empty. Add items to start billing.")
 
+        # A checkout whose PDF was not ready in time; fetched through this server
+        pending_bill = st.session_state.get('pending_pdf')
+        if pending_bill is not None:
+            if st.button(f"📄 Get PDF for Bill #{pending_bill}", key="pending_pdf_fetch"):
+                pdf = fetch_bill_pdf(pending_bill)
+                if pdf is not None:
+                    st.session_state.pending_pdf = None
+                    st.download_button(
+                        label="📥 Download PDF",
+                        data=pdf,
+                        file_name=f"bill_{pending_bill}.pdf",
+                        mime="application/pdf",
+                        key="pending_pdf_download"
+                    )
+
 # TAB 2: INVENTORY MANAGEMENT
 with tab2:
     st.markdown('<div class="section-header">Inventory Management</div>', unsafe_allow_html=True)
@@ -420,15 +590,20 @@ with tab2:
         st.markdown("#### Import from CSV")
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
         if uploaded_file:
-            st.info("CSV should have columns: name, price")
+            st.info("CSV should have columns: name, price. Existing names get the new price.")
             if st.button("📤 Import"):
                 try:
                     files = {'file': uploaded_file}
-                    response = requests.post(f"{API_BASE_URL}/inventory/import", files=files, timeout=15)
+                    response = requests.post(f"{API_BASE_URL}/inventory/import", files=files, timeout=300)
                     if response.status_code == 200:
-                        st.success(f"✅ {response.json()['message']}")
+                        report = response.json()
+                        st.success(f"✅ {report['message']}")
                         fetch_inventory()
-                        st.experimental_rerun()
+                        if report['errors']:
+                            st.warning(f"⚠️ {report['rejected']} rows were skipped")
+                            st.dataframe(pd.DataFrame(report['errors']), hide_index=True, use_container_width=True)
+                        else:
+                            st.experimental_rerun()
                     else:
                         st.error(f"❌ {response.json().get('error', 'Import failed')}")
                 except requests.exceptions.ConnectionError:
@@ -442,7 +617,11 @@ with tab2:
             with st.spinner("Refreshing inventory..."):
                 fetch_inventory()
                 st.experimental_rerun()
-        
+
+        # Load the catalog on first visit; the ETag makes repeat checks cheap
+        if not st.session_state.inventory:
+            fetch_inventory()
+
         if st.session_state.inventory:
             df = pd.DataFrame(st.session_state.inventory)
             
@@ -478,30 +657,68 @@ with tab2:
 with tab3:
     st.markdown('<div class="section-header">Bill History</div>', unsafe_allow_html=True)
     
+    # Statistics at the top - totals are maintained by the server
     try:
-        response = requests.get(f"{API_BASE_URL}/bills", timeout=10)
-        if response.status_code == 200:
-            bills = response.json()
+        _, stats = conditional_get("bills/stats")
+        if stats and stats['total_bills']:
+            st.subheader("📊 Statistics")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total Bills", stats['total_bills'])
+            with col2:
+                st.metric("Total Revenue", f"₹{stats['total_revenue']:.2f}")
+            with col3:
+                st.metric("Paid Bills", stats['paid_bills'])
+            with col4:
+                st.metric("Unpaid Bills", stats['unpaid_bills'])
+            
+            # Add some spacing
+            st.divider()
+    except requests.exceptions.RequestException:
+        pass  # The bill list below reports connection problems
+    
+    # Server-side filters - bills are fetched one page at a time
+    col_status, col_customer = st.columns([1, 2])
+    with col_status:
+        status_filter = st.selectbox("Payment Status", ["All", "Paid", "Unpaid"], key="history_status")
+    with col_customer:
+        customer_filter = st.text_input("🔍 Customer name or mobile", key="history_customer").strip()
+    
+    params = {'limit': BILLS_PAGE_SIZE}
+    if status_filter != "All":
+        params['payment_status'] = status_filter
+    if customer_filter:
+        params['phone' if customer_filter.isdigit() else 'name'] = customer_filter
+    
+    # Start again from the newest bills whenever the filters change
+    filters_key = (status_filter, customer_filter)
+    if st.session_state.get('bill_filters') != filters_key:
+        st.session_state.bill_filters = filters_key
+        st.session_state.bill_cursors = []
+    if st.session_state.bill_cursors:
+        params['cursor'] = st.session_state.bill_cursors[-1]
+    
+    try:
+        response, page = conditional_get("bills", params)
+        if page is not None:
+            bills = page['bills']
+            
+            # Page navigation
+            col_newer, col_page, col_older = st.columns([1, 2, 1])
+            with col_newer:
+                if st.session_state.bill_cursors and st.button("⬅️ Newer", use_container_width=True):
+                    st.session_state.bill_cursors.pop()
+                    st.experimental_rerun()
+            with col_page:
+                st.caption(f"Page {len(st.session_state.bill_cursors) + 1}")
+            with col_older:
+                if page['next_cursor'] and st.button("Older ➡️", use_container_width=True):
+                    st.session_state.bill_cursors.append(page['next_cursor'])
+                    st.experimental_rerun()
+            
             if bills:
                 df = pd.DataFrame(bills)
                 
-                # Statistics at the top
-                st.subheader("📊 Statistics")
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Total Bills", len(df))
-                with col2:
-                    st.metric("Total Revenue", f"₹{df['total'].sum():.2f}")
-                with col3:
-                    paid_count = len(df[df['payment_status'] == 'Paid'])
-                    st.metric("Paid Bills", paid_count)
-                with col4:
-                    unpaid_count = len(df[df['payment_status'] == 'Unpaid'])
-                    st.metric("Unpaid Bills", unpaid_count)
-                
-                # Add some spacing
-                st.divider()
-                
                 # Data table view
                 st.subheader("📋 Table View")
                 st.dataframe(
@@ -542,15 +759,30 @@ with tab3:
                             bill_date_key = bill['date'].replace(' ', '_').replace(':', '_').replace('-', '_')
                             if st.button(f"👁️ View Items", key=f"view_{bill['bill_id']}_{bill_date_key}"):
                                 try:
-                                    import ast
-                                    items = ast.literal_eval(bill['items']) if bill['items'] else []
+                                    items = bill['items'] if isinstance(bill['items'], list) else []
                                     st.markdown("**Items in this bill:**")
                                     for idx, item in enumerate(items, 1):
                                         st.markdown(f"**{idx}.** {item['name']} - Qty: {item['quantity']} - Price: ₹{item['price']:.2f} - **Total: ₹{item['total']:.2f}**")
                                 except:
                                     st.error("Items data not available")
+                            if st.button("📄 Get PDF", key=f"pdf_{bill['bill_id']}_{bill_date_key}"):
+                                pdf = fetch_bill_pdf(bill['bill_id'])
+                                if pdf is not None:
+                                    st.download_button(
+                                        label="📥 Download PDF",
+                                        data=pdf,
+                                        file_name=f"bill_{bill['bill_id']}.pdf",
+                                        mime="application/pdf",
+                                        key=f"download_{bill['bill_id']}_{bill_date_key}"
+                                    )
                         
                         with col3:
+                            # Toggle payment status
+                            new_status = 'Unpaid' if bill['payment_status'] == 'Paid' else 'Paid'
+                            if st.button(f"💳 Mark {new_status}", key=f"status_{bill['bill_id']}_{bill_date_key}"):
+                                if update_bill_status(bill['bill_id'], new_status):
+                                    st.experimental_rerun()
+                            
                             # Delete button - add date to make key unique
                             if st.button(f"🗑️ Delete", key=f"delete_{bill['bill_id']}_{bill_date_key}", type="secondary"):
                                 if st.session_state.get(f"confirm_delete_{bill['bill_id']}", False):
@@ -560,6 +792,8 @@ with tab3:
                                     st.session_state[f"confirm_delete_{bill['bill_id']}"] = True
                                     st.warning("⚠️ Click Delete again to confirm")
                 
+            elif params.keys() - {'limit'}:
+                st.info("No bills match these filters")
             else:
                 st.info("No bills generated yet")
         else:
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Tests for the Flask API in app.py, run against a throwaway CSV storage
+"""
+
+import base64
+import io
+import os
+import pstats
+import time
+import zipfile
+
+import pytest
+from PIL import Image
+
+import app as billing_app
+import bill_pdf
+import metrics
+import profiling
+import render_pool
+import signature_store
+from jobs import RenderJobs
+from pdf_cache import PdfCache
+from storage import CsvStorage
+
+BILL = {
+    'shop': {
+        'name': 'Ganpati Electronics and E Services',
+        'owner': 'Shop Owner',
+        'address': '123 Main Street, Electronics Market',
+        'phone': '+91 98765 43210',
+        'email': 'contact@ganpatielectronics.com'
+    },
+    'customer': {'name': 'harish', 'phone': '9898989889'},
+    'items': [{'name': 'Laptop', 'quantity': 1, 'price': 899.99, 'total': 899.99}],
+    'subtotal': 899.99,
+    'total': 899.99,
+    'payment_status': 'Paid',
+    'notes': ''
+}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    (tmp_path / 'inventory.csv').write_text('id,name,price\n1,Laptop,899.99\n')
+    storage = CsvStorage(str(tmp_path / 'inventory.csv'), str(tmp_path / 'bills.csv'))
+    monkeypatch.setattr(billing_app, 'storage', metrics.TimedStorage(storage, 'csv'))
+    monkeypatch.setattr(billing_app, 'render_jobs', RenderJobs(render_pool.render_async))
+    monkeypatch.setattr(billing_app, 'pdf_cache', PdfCache(str(tmp_path / 'pdf_cache'), 1024 * 1024))
+    return billing_app.app.test_client()
+
+
+def test_inventory_etag_revalidation(client):
+    """Unchanged inventory answers 304; a change produces a new ETag"""
+    first = client.get('/api/inventory')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.json[0]['name'] == 'Laptop'
+
+    cached = client.get('/api/inventory', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+
+    client.post('/api/inventory', json={'name': 'Mouse', 'price': 29.99})
+    changed = client.get('/api/inventory', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+
+def test_bills_etag_changes_after_checkout(client):
+    """A new bill invalidates cached bill pages"""
+    etag = client.get('/api/bills').headers['ETag']
+    assert client.get('/api/bills', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.post('/api/generate-bill', json=BILL).status_code == 200
+    page = client.get('/api/bills', headers={'If-None-Match': etag})
+    assert page.status_code == 200
+    assert [bill['customer_name'] for bill in page.json['bills']] == ['harish']
+
+
+def test_export_streams_csv_and_ndjson(client):
+    """Exports stream every matching bill, oldest first"""
+    for name in ('first', 'second'):
+        client.post('/api/generate-bill', json={**BILL, 'customer': {'name': name, 'phone': '98'}})
+
+    response = client.get('/api/bills/export?format=csv')
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('bill_id,date,customer_name')
+    assert [line.split(',')[2] for line in lines[1:]] == ['first', 'second']
+
+    response = client.get('/api/bills/export?format=ndjson&from=2000-01-01&to=2000-12-31')
+    assert response.get_data(as_text=True) == ''
+    assert client.get('/api/bills/export?format=xml').status_code == 400
+
+
+def test_status_update_feeds_revenue_report(client):
+    """Marking a bill paid moves its amount in the revenue rollup"""
+    client.post('/api/generate-bill', json={**BILL, 'payment_status': 'Unpaid'})
+    bill_id = client.get('/api/bills').json['bills'][0]['bill_id']
+
+    report = client.get('/api/reports/revenue?granularity=month')
+    assert report.json['periods'][0]['unpaid'] == 899.99
+    etag = report.headers['ETag']
+
+    assert client.patch(f'/api/bills/{bill_id}', json={'payment_status': 'Paid'}).status_code == 200
+    assert client.patch(f'/api/bills/{bill_id}', json={'payment_status': 'Maybe'}).status_code == 400
+    assert client.patch('/api/bills/999', json={'payment_status': 'Paid'}).status_code == 404
+
+    report = client.get('/api/reports/revenue?granularity=month', headers={'If-None-Match': etag})
+    assert report.status_code == 200
+    assert report.json['periods'][0]['paid'] == 899.99
+    assert client.get('/api/reports/revenue?granularity=day&from=2025-10').status_code == 400
+    assert client.get('/api/reports/revenue?granularity=week').status_code == 400
+
+
+def test_inventory_search_returns_only_matches(client):
+    """The catalog search answers from the index and validates its limit"""
+    client.post('/api/inventory', json={'name': 'Wireless Mouse', 'price': 29.99})
+    response = client.get('/api/inventory/search?q=mou')
+    assert [item['name'] for item in response.json] == ['Wireless Mouse']
+    assert client.get('/api/inventory/search?q=lap&limit=0').status_code == 400
+
+
+def test_customer_endpoints(client):
+    """Returning customers are found by phone prefix and listed with their bills"""
+    for name in ('harish', 'harish k'):
+        client.post('/api/generate-bill', json={**BILL, 'customer': {'name': name, 'phone': '9898989889'}})
+
+    customers = client.get('/api/customers?prefix=98').json
+    assert customers == [{'phone': '9898989889', 'name': 'harish k', 'bills': 2,
+                          'last_bill_date': customers[0]['last_bill_date']}]
+
+    page = client.get('/api/customers/9898989889/bills?limit=1').json
+    assert page['customer']['bills'] == 2 and len(page['bills']) == 1
+    rest = client.get(f"/api/customers/9898989889/bills?cursor={page['next_cursor']}").json
+    assert [bill['customer_name'] for bill in rest['bills']] == ['harish'] and rest['next_cursor'] is None
+    assert client.get('/api/customers/0000/bills').status_code == 404
+
+
+def test_inventory_import_upserts_and_reports_bad_rows(client):
+    """The import reprices known names and lists every rejected line"""
+    upload = b'name,price,brand\nlaptop,850,x\nMouse,29.99,y\n,5,z\nCable,cheap,z\n\nPen,-1,z\n'
+    response = client.post('/api/inventory/import', data={'file': (io.BytesIO(upload), 'prices.csv')})
+    report = response.json
+    assert response.status_code == 200
+    assert (report['added'], report['updated'], report['unchanged'], report['rejected']) == (1, 1, 0, 3)
+    assert [error['line'] for error in report['errors']] == [4, 5, 7]
+    assert [(item['name'], item['price']) for item in client.get('/api/inventory').json] == \
+        [('Laptop', 850.0), ('Mouse', 29.99)]
+
+    bad = client.post('/api/inventory/import', data={'file': (io.BytesIO(b'title,cost\n'), 'x.csv')})
+    assert bad.status_code == 400
+
+
+def test_generate_bills_batch(client):
+    """A batch renders one PDF per bill (or one combined PDF) and saves the bills"""
+    batch = [{**BILL, 'customer': {'name': f'c{i}', 'phone': '98'}} for i in range(3)]
+    response = client.post('/api/generate-bills', json={'bills': batch})
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    ids = [bill['bill_id'] for bill in reversed(client.get('/api/bills').json['bills'])]
+    assert archive.namelist() == [f'bill_{bill_id}.pdf' for bill_id in ids]
+    assert all(archive.read(name).startswith(b'%PDF') for name in archive.namelist())
+
+    reprint = client.post('/api/generate-bills', json={'bills': batch, 'output': 'pdf', 'save': False})
+    assert reprint.mimetype == 'application/pdf' and reprint.data.startswith(b'%PDF')
+    assert len(client.get('/api/bills').json['bills']) == 3
+    assert client.post('/api/generate-bills', json={'bills': []}).status_code == 400
+
+
+def test_checkout_renders_on_prewarmed_workers(client):
+    """Every worker is started and warmed up front, and checkouts render on them"""
+    pool = render_pool.start(2, shop=BILL['shop'])
+    assert len(pool._processes) == 2
+    response = client.post('/api/generate-bill', json=BILL)
+    assert response.status_code == 200 and response.data.startswith(b'%PDF')
+    assert len(client.get('/api/bills').json['bills']) == 1
+
+
+def test_broken_pool_is_replaced_with_the_same_shop(client, monkeypatch):
+    """use_shop() never starts workers; a pool whose worker died restarts warmed for that shop"""
+    monkeypatch.setattr(render_pool, '_shop', render_pool._shop)
+    pool = render_pool.get_pool()
+    render_pool.use_shop(BILL['shop'])
+    assert render_pool.get_pool() is pool
+
+    next(iter(pool._processes.values())).kill()
+    deadline = time.time() + 10
+    while not pool._broken and time.time() < deadline:
+        time.sleep(0.05)
+    assert client.post('/api/generate-bill', json=BILL).status_code == 200
+    assert render_pool.get_pool() is not pool and render_pool._shop is BILL['shop']
+
+
+def test_async_checkout_returns_job_and_pdf(client):
+    """Async checkout saves the bill at once and the PDF follows from the job"""
+    response = client.post('/api/generate-bill?async=1', json=BILL)
+    assert response.status_code == 202
+    job = response.json
+    assert [bill['bill_id'] for bill in client.get('/api/bills').json['bills']] == [job['bill_id']]
+
+    deadline = time.time() + 30
+    while client.get(job['status_url']).json['status'] != 'done' and time.time() < deadline:
+        time.sleep(0.05)
+    pdf = client.get(job['pdf_url'])
+    assert pdf.status_code == 200 and pdf.data.startswith(b'%PDF')
+    assert client.get('/api/jobs/unknown').status_code == 404
+    assert client.get('/api/bills/999/pdf').status_code == 404
+
+
+def test_stored_bill_pdf_is_rendered_once_then_cached(client, monkeypatch):
+    """Re-downloads come from the disk cache; a status change renders afresh"""
+    client.post('/api/generate-bill', json=BILL)
+    bill_id = client.get('/api/bills').json['bills'][0]['bill_id']
+    first = client.get(f'/api/bills/{bill_id}/pdf')
+    assert first.status_code == 200 and first.data.startswith(b'%PDF')
+
+    render = render_pool.render
+    def no_render(payload):
+        raise AssertionError('cached PDF was re-rendered')
+    monkeypatch.setattr(render_pool, 'render', no_render)
+    again = client.get(f'/api/bills/{bill_id}/pdf')
+    assert again.data == first.data and again.headers['ETag'] == first.headers['ETag']
+
+    monkeypatch.setattr(render_pool, 'render', render)
+    client.patch(f'/api/bills/{bill_id}', json={'payment_status': 'Unpaid'})
+    assert client.get(f'/api/bills/{bill_id}/pdf').headers['ETag'] != first.headers['ETag']
+
+
+def test_bill_pdf_falls_back_when_job_disappears(client, monkeypatch):
+    """A job evicted between the status check and fetching its PDF is rendered from the bill"""
+    job = client.post('/api/generate-bill?async=1', json=BILL).json
+    deadline = time.time() + 30
+    while client.get(job['status_url']).json['status'] != 'done' and time.time() < deadline:
+        time.sleep(0.05)
+    monkeypatch.setattr(billing_app.render_jobs, 'result', lambda job_id: None)
+    pdf = client.get(job['pdf_url'])
+    assert pdf.status_code == 200 and pdf.data.startswith(b'%PDF') and pdf.headers['ETag']
+
+
+def test_pdf_cache_evicts_least_recently_used(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=20)
+    for key in ('a', 'b'):
+        cache.put(key, b'x' * 8)
+    cache.open('a').close()
+    cache.put('c', b'x' * 8)
+    assert cache.open('b') is None and cache.open('a') is not None
+    assert sorted(os.listdir(tmp_path)) == ['a.pdf', 'c.pdf']
+    # Recency is restored from the files on restart
+    assert PdfCache(str(tmp_path), max_bytes=8).open('c') is not None
+
+
+
+def test_receipt_formats(client):
+    """Thermal receipts carry the same bill data and save the bill like a PDF checkout"""
+    text = client.post('/api/generate-bill?format=receipt-text&paper=58', json=BILL)
+    assert text.status_code == 200 and text.mimetype == 'text/plain'
+    lines = text.get_data(as_text=True).splitlines()
+    assert max(len(line) for line in lines) <= 32
+    assert 'GANPATI' in lines[0] and any('899.99Rs' in line for line in lines)
+
+    escpos = client.post('/api/generate-bill?format=escpos', json=BILL)
+    assert escpos.data.startswith(b'\x1b@') and escpos.data.endswith(b'\x1dV\x42\x00')
+    bill_ids = [bill['bill_id'] for bill in client.get('/api/bills').json['bills']]
+    assert sorted(bill_ids) == sorted(int(r.headers['X-Bill-Id']) for r in (text, escpos))
+
+    assert client.post('/api/generate-bill?format=docx', json=BILL).status_code == 400
+    assert client.post('/api/generate-bill?format=escpos&paper=70', json=BILL).status_code == 400
+    assert len(client.get('/api/bills').json['bills']) == 2
+
+
+def test_large_cart_renders_in_chunks_with_running_subtotals(client):
+    """Long carts become page-sized tables, each with the header and a subtotal"""
+    items = [{'name': f'Part {i}', 'quantity': 1, 'price': 2.0, 'total': 2.0} for i in range(40)]
+    tables = bill_pdf.template_for(BILL['shop']).items_tables(items)
+    assert len(tables) == 3
+    assert all(table._cellvalues[0] == bill_pdf.ITEM_HEADER for table in tables)
+    assert [table._cellvalues[-1][-1] for table in tables] == ['36.00Rs', '72.00Rs', '80.00Rs']
+    assert tables[2]._cellvalues[1][0] == '37'
+
+    response = client.post('/api/generate-bill', json={**BILL, 'items': items, 'total': 80.0})
+    assert response.status_code == 200 and response.data.startswith(b'%PDF')
+
+
+def test_signatures_are_deduplicated_downscaled_and_embedded(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(signature_store, 'SIGNATURES_DIR', str(tmp_path / 'signatures'))
+    png = io.BytesIO()
+    Image.new('RGB', (2400, 800), 'white').save(png, format='PNG')
+    upload = 'data:image/png;base64,' + base64.b64encode(png.getvalue()).decode('ascii')
+
+    first = client.post('/api/signature', json={'signature': upload})
+    again = client.post('/api/signature', json={'signature': upload})
+    signature_id = first.json['signature_id']
+    assert first.status_code == 200 and again.json['signature_id'] == signature_id
+    assert os.listdir(tmp_path / 'signatures') == [f'{signature_id}.png']
+    with Image.open(signature_store.signature_path(signature_id)) as stored:
+        assert stored.size == (450, 150) and stored.mode == 'L'
+
+    assert client.post('/api/signature', json={'signature': 'not base64!'}).status_code == 400
+    assert client.post('/api/signature', json={'signature': base64.b64encode(b'text').decode()}).status_code == 400
+    assert client.post('/api/generate-bill', json={**BILL, 'signature_id': 'f' * 64}).status_code == 400
+
+    # The signature is stored with the bill, so reprints stay signed after the
+    # checkout's own render is forgotten (here by a status change)
+    job = client.post('/api/generate-bill?async=1', json={**BILL, 'signature_id': signature_id}).json
+    assert client.patch(f"/api/bills/{job['bill_id']}", json={'payment_status': 'Unpaid'}).status_code == 200
+    # Render in-process: pool workers may predate the patched signatures directory
+    monkeypatch.setattr(render_pool, 'render', bill_pdf.render_bill)
+    reprint = client.get(job['pdf_url'])
+    assert reprint.status_code == 200 and b'/Subtype /Image' in reprint.data
+
+    assert signature_store.image_reader(signature_id) is signature_store.image_reader(signature_id)
+    assert b'/Subtype /Image' in bill_pdf.render_bill({**BILL, 'signature_id': signature_id})
+    assert b'/Subtype /Image' not in bill_pdf.render_bill(BILL)
+
+
+
+def test_metrics_endpoint_reports_routes_storage_and_renders(client):
+    client.get('/api/bills/7')
+    assert client.post('/api/generate-bill', json=BILL).status_code == 200
+    assert client.get('/api/nope').status_code == 404
+
+    response = client.get('/metrics')
+    text = response.data.decode()
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    assert '# TYPE billing_http_request_duration_seconds histogram' in text
+    assert 'billing_http_request_duration_seconds_bucket{method="POST",route="/api/generate-bill",le="+Inf"}' in text
+    assert 'billing_http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert 'billing_storage_operation_seconds_count{backend="csv",operation="create_bill"}' in text
+    assert 'billing_csv_io_seconds_count{file="bills",op="append"}' in text
+    assert 'billing_pdf_render_seconds_count{mode="sync"}' in text
+    # Only the /metrics request itself is still being handled
+    assert 'billing_http_requests_in_flight 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram('test_seconds', 'Test histogram', ['op'], buckets=(0.1, 1.0))
+    metrics.REGISTRY.remove(histogram)
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, op='x')
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{op="x",le="0.1"} 1',
+        'test_seconds_bucket{op="x",le="1.0"} 3',
+        'test_seconds_bucket{op="x",le="+Inf"} 4',
+        'test_seconds_sum{op="x"} 4.05',
+        'test_seconds_count{op="x"} 4',
+    ]
+    with pytest.raises(ValueError):
+        histogram.observe(1.0)
+
+
+def test_profiling_header_sampling_and_admin_toggle(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setattr(profiling, '_counter', iter(range(1, 100)))
+    for key in ('sample_every', 'allow_header', 'profiler'):
+        monkeypatch.setitem(profiling.settings, key, profiling.settings[key])
+
+    # Off by default: the header alone does nothing
+    response = client.get('/api/shop', headers={'X-Profile': '1'})
+    assert 'X-Profile-File' not in response.headers and not (tmp_path / 'profiles').exists()
+
+    assert client.post('/api/admin/profiling', json={'sample_every': -1}).status_code == 400
+    assert client.post('/api/admin/profiling', json={'allow_header': True}).json['allow_header'] is True
+    response = client.post('/api/generate-bill', json=BILL, headers={'X-Profile': '1'})
+    name = response.headers['X-Profile-File']
+    assert name.endswith('ms.prof') and '-POST-api_generate_bill-200-' in name
+    stats = pstats.Stats(str(tmp_path / 'profiles' / name))
+    assert any(function == 'generate_bill' for _, _, function in stats.stats)
+
+    # An unwritable profile directory is logged, not turned into a failed checkout
+    (tmp_path / 'not_a_dir').write_text('')
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path / 'not_a_dir'))
+    response = client.post('/api/generate-bill', json=BILL, headers={'X-Profile': '1'})
+    assert response.status_code == 200 and 'X-Profile-File' not in response.headers
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+
+    client.post('/api/admin/profiling', json={'allow_header': False, 'sample_every': 3})
+    profiled = ['X-Profile-File' in client.get('/api/shop').headers for _ in range(6)]
+    assert profiled == [False, False, True, False, False, True]
+    assert len(os.listdir(tmp_path / 'profiles')) == 3
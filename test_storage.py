@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-resident data stores in storage.py
+"""
+
+import csv
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import migrate
+from commit_queue import CommitQueue
+from id_allocator import BlockAllocator, FileSequence
+from sqlite_storage import SqliteStorage
+from storage import InventoryStore, BillLedger, CsvStorage, _atomic_write_rows
+
+
+def write_inventory(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'price'])
+        writer.writerows(rows)
+
+
+def read_inventory(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_inventory_reads_from_memory_and_writes_through(tmp_path):
+    """Mutations are visible immediately and land in the CSV"""
+    path = tmp_path / 'inventory.csv'
+    write_inventory(path, [[1, 'Laptop', 899.99], [2, 'Mouse', 29.99]])
+    store = InventoryStore(str(path))
+
+    assert [item['name'] for item in store.list_items()] == ['Laptop', 'Mouse']
+
+    new_item = store.add_item('Desk Lamp', 45.99)
+    assert new_item == {'id': 3, 'name': 'Desk Lamp', 'price': 45.99}
+    assert store.update_item(1, 'Gaming Laptop', 999.0)
+    assert store.delete_item(2)
+    assert not store.delete_item(42)
+    assert not store.update_item(42, 'Ghost', 1.0)
+
+    rows = read_inventory(path)
+    assert [(row['id'], row['name'], float(row['price'])) for row in rows] == [
+        ('1', 'Gaming Laptop', 999.0),
+        ('3', 'Desk Lamp', 45.99),
+    ]
+
+
+def test_inventory_reloads_when_file_changes_on_disk(tmp_path):
+    """Edits made outside the process are picked up on the next read"""
+    path = tmp_path / 'inventory.csv'
+    write_inventory(path, [[1, 'Laptop', 899.99]])
+    store = InventoryStore(str(path))
+    assert len(store.list_items()) == 1
+
+    write_inventory(path, [[1, 'Laptop', 899.99], [7, 'Notebook Set', 12.99]])
+    items = store.list_items()
+    assert [item['id'] for item in items] == [1, 7]
+    assert store.add_item('Office Chair', 249.99)['id'] == 8
+
+
+def make_bill(name, total, status='Paid'):
+    return {
+        'date': '2025-10-02 21:52:33',
+        'customer_name': name,
+        'customer_phone': '9898989889',
+        'items': [{'name': 'Laptop', 'quantity': 1, 'price': total, 'total': total}],
+        'total': total,
+        'payment_status': status,
+    }
+
+
+def test_ledger_appends_and_tombstones_deletes(tmp_path):
+    """Bills are appended, deletes are tombstoned until compaction"""
+    path = tmp_path / 'bills.csv'
+    ledger = BillLedger(str(path))
+    for i in range(3):
+        assert ledger.append_bill(make_bill(f'customer{i}', 10.0 * (i + 1)))['bill_id'] == i + 1
+
+    assert ledger.delete_bill(2)
+    assert not ledger.delete_bill(2)
+    assert [bill['bill_id'] for bill in ledger.list_bills()] == [1, 3]
+    # The row is still physically present until compaction
+    assert len(path.read_text().splitlines()) == 4
+
+    # A fresh process sees the same state
+    reopened = BillLedger(str(path))
+    assert [bill['bill_id'] for bill in reopened.list_bills()] == [1, 3]
+
+    assert ledger.compact() == 1
+    assert len(path.read_text().splitlines()) == 3
+    assert not (tmp_path / 'bills.csv.deleted').exists()
+    assert ledger.append_bill(make_bill('late', 5.0))['bill_id'] == 4
+
+
+def test_ledger_does_not_reuse_tombstoned_ids(tmp_path):
+    """Deleting the newest bill must not hand its id out again"""
+    path = tmp_path / 'bills.csv'
+    ledger = BillLedger(str(path))
+    ledger.append_bill(make_bill('a', 1.0))
+    ledger.append_bill(make_bill('b', 2.0))
+    ledger.delete_bill(2)
+
+    reopened = BillLedger(str(path))
+    assert reopened.append_bill(make_bill('c', 3.0))['bill_id'] > 2
+
+
+def test_ledger_tail_read_waits_for_split_multiline_row(tmp_path):
+    """A half-appended row whose notes span lines is not read until it is complete"""
+    path = str(tmp_path / 'bills.csv')
+    writer = BillLedger(path)
+    first = writer.append_bill(make_bill('Asha', 1.0))
+    second = writer.append_bill({**make_bill('Ravi', 2.0), 'notes': 'line1\nline2 "quoted"'})
+    with open(path, 'rb') as f:
+        data = f.read()
+    cut = data.index(b'line1\n') + len(b'line1\n')
+    with open(path, 'wb') as f:
+        f.write(data[:cut])
+
+    reader = BillLedger(path)
+    assert [bill['bill_id'] for bill in reader.list_bills()] == [first['bill_id']]
+    with open(path, 'ab') as f:
+        f.write(data[cut:])
+    assert reader.get_bill(second['bill_id'])['notes'] == 'line1\nline2 "quoted"'
+    assert len(reader.list_bills()) == 2
+
+
+def test_ledgers_sharing_files_never_duplicate_ids(tmp_path):
+    """Two writers on the same bills.csv (e.g. two workers) stay consistent"""
+    path = str(tmp_path / 'bills.csv')
+    first = BillLedger(path, id_block_size=10)
+    second = BillLedger(path, id_block_size=10)
+
+    ids = []
+    for i in range(25):
+        ids.append(first.append_bill(make_bill(f'a{i}', 1.0))['bill_id'])
+        ids.append(second.append_bill(make_bill(f'b{i}', 1.0))['bill_id'])
+    assert len(set(ids)) == 50
+
+    # Each sees the other's appends and deletes without a full reload
+    assert len(first.list_bills()) == 50
+    assert second.delete_bill(ids[0])
+    assert first.get_bill(ids[0]) is None
+    assert first.compact() == 1
+    assert len(second.list_bills()) == 49
+    assert second.append_bill(make_bill('late', 1.0))['bill_id'] not in ids
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'csv':
+        write_inventory(tmp_path / 'inventory.csv', [])
+        storage = CsvStorage(str(tmp_path / 'inventory.csv'), str(tmp_path / 'bills.csv'))
+    else:
+        storage = SqliteStorage(str(tmp_path / 'billing.db'))
+    yield storage
+    storage.close()
+
+
+def test_storage_backends_behave_the_same(backend):
+    """Both backends satisfy the same repository contract"""
+    laptop = backend.add_inventory_item('Laptop', 899.99)
+    backend.add_inventory_items([('Mouse', 29.99), ('Chair', 249.99)])
+    assert backend.update_inventory_item(laptop['id'], 'Laptop Pro', 999.0)
+    assert backend.get_inventory_item(laptop['id'])['name'] == 'Laptop Pro'
+    assert backend.delete_inventory_item(laptop['id'])
+    assert not backend.delete_inventory_item(laptop['id'])
+    assert [item['name'] for item in backend.list_inventory()] == ['Mouse', 'Chair']
+
+    first = backend.create_bill(make_bill('harish', 200.0))
+    second = backend.create_bill(make_bill('haoi', 2.0, 'Unpaid'))
+    assert second['bill_id'] == first['bill_id'] + 1
+    assert backend.get_bill(second['bill_id'])['payment_status'] == 'Unpaid'
+    assert backend.delete_bill(first['bill_id'])
+    assert not backend.delete_bill(first['bill_id'])
+    assert backend.get_bill(first['bill_id']) is None
+    assert [bill['customer_name'] for bill in backend.list_bills()] == ['haoi']
+
+
+def test_csv_to_sqlite_migration_keeps_ids(tmp_path):
+    """The importer copies live rows with their original ids"""
+    write_inventory(tmp_path / 'inventory.csv', [[3, 'Laptop', 899.99], [9, 'Mouse', 29.99]])
+    ledger = BillLedger(str(tmp_path / 'bills.csv'))
+    for name in ('a', 'b', 'c'):
+        ledger.append_bill(make_bill(name, 1.0))
+    ledger.delete_bill(2)
+
+    db_path = str(tmp_path / 'billing.db')
+    assert migrate.csv_to_sqlite(
+        str(tmp_path / 'inventory.csv'), str(tmp_path / 'bills.csv'), db_path
+    ) == (2, 2)
+
+    storage = SqliteStorage(db_path)
+    assert [item['id'] for item in storage.list_inventory()] == [3, 9]
+    assert [bill['bill_id'] for bill in storage.list_bills()] == [1, 3]
+    assert storage.create_bill(make_bill('d', 1.0))['bill_id'] == 4
+    with pytest.raises(RuntimeError):
+        migrate.csv_to_sqlite(str(tmp_path / 'inventory.csv'), str(tmp_path / 'bills.csv'), db_path)
+
+
+
+def test_query_bills_pages_newest_first_with_filters(backend):
+    """Cursor paging walks the history backwards and honours filters"""
+    for day in range(1, 8):
+        bill = make_bill(f'customer{day}', float(day), 'Paid' if day % 2 else 'Unpaid')
+        bill['date'] = f'2025-10-0{day} 10:00:00'
+        bill['customer_phone'] = f'98{day}'
+        backend.create_bill(bill)
+
+    page, cursor = backend.query_bills(3)
+    assert [bill['customer_name'] for bill in page] == ['customer7', 'customer6', 'customer5']
+    page, cursor = backend.query_bills(3, cursor)
+    assert [bill['customer_name'] for bill in page] == ['customer4', 'customer3', 'customer2']
+    page, cursor = backend.query_bills(3, cursor)
+    assert [bill['customer_name'] for bill in page] == ['customer1'] and cursor is None
+
+    page, cursor = backend.query_bills(2, payment_status='Paid', date_from='2025-10-02',
+                                       date_to='2025-10-06')
+    assert [bill['customer_name'] for bill in page] == ['customer5', 'customer3'] and cursor is None
+    page, _ = backend.query_bills(10, phone='985')
+    assert [bill['customer_name'] for bill in page] == ['customer5']
+    page, _ = backend.query_bills(10, name='CUSTOMER', min_total=3, max_total=4)
+    assert [bill['customer_name'] for bill in page] == ['customer4', 'customer3']
+
+
+
+def test_data_version_tracks_changes(backend):
+    """Version tokens move on writes and stay put on reads"""
+    inventory, bills = backend.data_version('inventory'), backend.data_version('bills')
+    backend.list_inventory()
+    assert backend.data_version('inventory') == inventory
+
+    backend.add_inventory_item('Laptop', 899.99)
+    assert backend.data_version('inventory') != inventory
+    assert backend.data_version('bills') == bills
+
+    bill = backend.create_bill(make_bill('a', 1.0))
+    after_create = backend.data_version('bills')
+    assert after_create != bills
+    assert backend.data_version('bills') == after_create
+    backend.delete_bill(bill['bill_id'])
+    assert backend.data_version('bills') not in (bills, after_create)
+
+
+
+def test_iter_bills_walks_history_in_chunks(backend):
+    """Exports see every matching bill oldest first, across chunk boundaries"""
+    for i in range(7):
+        backend.create_bill(make_bill(f'c{i}', float(i), 'Paid' if i % 2 else 'Unpaid'))
+    names = [bill['customer_name'] for bill in backend.iter_bills(chunk_size=2)]
+    assert names == [f'c{i}' for i in range(7)]
+    assert [bill['customer_name'] for bill in backend.iter_bills(payment_status='Paid')] == ['c1', 'c3', 'c5']
+
+
+
+def test_bill_stats_follow_creates_and_deletes(backend):
+    """Counters match the live bills without rescanning them"""
+    assert backend.bill_stats()['total_bills'] == 0
+    backend.create_bill(make_bill('a', 0.1))
+    backend.create_bill(make_bill('b', 0.2))
+    unpaid = backend.create_bill(make_bill('c', 5.5, 'Unpaid'))
+    backend.create_bill(make_bill('d', 7.0, 'Unpaid'))
+    backend.delete_bill(unpaid['bill_id'])
+
+    assert backend.bill_stats() == {
+        'total_bills': 3,
+        'total_revenue': 7.3,
+        'paid_bills': 2,
+        'paid_amount': 0.3,
+        'unpaid_bills': 1,
+        'unpaid_amount': 7.0,
+    }
+
+
+def test_revenue_rollups_follow_writes_and_status_changes(backend):
+    """Daily and monthly rollups track creates, deletes and status updates"""
+    backend.create_bill({**make_bill('a', 10.0), 'date': '2025-10-01 09:00:00'})
+    late = backend.create_bill({**make_bill('b', 2.5, 'Unpaid'), 'date': '2025-10-01 18:00:00'})
+    gone = backend.create_bill({**make_bill('c', 4.0), 'date': '2025-11-03 10:00:00'})
+    backend.delete_bill(gone['bill_id'])
+    backend.create_bill({**make_bill('d', 1.0), 'date': '2025-11-04 10:00:00'})
+
+    assert backend.update_payment_status(late['bill_id'], 'Paid')['payment_status'] == 'Paid'
+    assert backend.update_payment_status(999, 'Paid') is None
+    assert backend.get_bill(late['bill_id'])['payment_status'] == 'Paid'
+    assert backend.bill_stats()['unpaid_bills'] == 0
+
+    assert backend.revenue_report('day') == [
+        {'period': '2025-10-01', 'bills': 2, 'gross': 12.5, 'paid': 12.5, 'unpaid': 0.0},
+        {'period': '2025-11-04', 'bills': 1, 'gross': 1.0, 'paid': 1.0, 'unpaid': 0.0},
+    ]
+    assert backend.revenue_report('month', '2025-11', '2025-12') == [
+        {'period': '2025-11', 'bills': 1, 'gross': 1.0, 'paid': 1.0, 'unpaid': 0.0},
+    ]
+
+
+def test_ledger_status_update_survives_reload_and_compaction(tmp_path):
+    """A status change is an appended row that supersedes the original"""
+    path = tmp_path / 'bills.csv'
+    ledger = BillLedger(str(path))
+    bill = ledger.append_bill(make_bill('a', 3.0, 'Unpaid'))
+    ledger.update_status(bill['bill_id'], 'Paid')
+
+    reopened = BillLedger(str(path))
+    assert [b['payment_status'] for b in reopened.list_bills()] == ['Paid']
+    assert reopened.stats()['paid_amount'] == 3.0
+
+    ledger.compact()
+    assert len(path.read_text().splitlines()) == 2
+    assert BillLedger(str(path)).get_bill(bill['bill_id'])['payment_status'] == 'Paid'
+
+
+LEGACY_BILLS = """bill_id,date,customer_name,customer_phone,customer_email,items,total,payment_status,notes
+1,2025-10-02 21:52:33,harish,9898989889,,"[{'name': 'csa', 'quantity': 1, 'price': 200.0, 'total': 200.0}]",200.0,Paid,
+2,2025-10-02 21:57:28,haoi,hooih,,"[{'name': 'sdv', 'quantity': 2, 'price': 2.0, 'total': 4.0}]",4.0,Paid,
+"""
+
+
+def test_search_inventory_follows_changes(backend):
+    """Substring search for 3+ chars, word-prefix type-ahead below that"""
+    added = backend.add_inventory_items([
+        ('Laptop Stand', 30.0), ('Gaming Laptop', 900.0), ('USB Cable', 5.0), ('Flap Cover', 2.0),
+    ])
+    ids = {item['name']: item['id'] for item in added}
+
+    # Names starting with the query rank first
+    assert [item['name'] for item in backend.search_inventory('LAP', 10)] == \
+        ['Laptop Stand', 'Flap Cover', 'Gaming Laptop']
+    assert [item['name'] for item in backend.search_inventory('la', 10)] == ['Laptop Stand', 'Gaming Laptop']
+    assert [item['name'] for item in backend.search_inventory('laptop', 1)] == ['Laptop Stand']
+    assert len(backend.search_inventory('', 3)) == 3
+    assert backend.search_inventory('100%', 10) == []
+
+    backend.update_inventory_item(ids['USB Cable'], 'USB Laptop Dock', 25.0)
+    backend.delete_inventory_item(ids['Flap Cover'])
+    assert [item['name'] for item in backend.search_inventory('lap', 10)] == \
+        ['Laptop Stand', 'Gaming Laptop', 'USB Laptop Dock']
+    assert backend.search_inventory('cable', 10) == []
+
+
+def test_upsert_inventory_matches_names_ignoring_case(backend):
+    """Re-importing a price list reprices items instead of duplicating them"""
+    backend.add_inventory_items([('Laptop', 900.0), ('Mouse', 20.0)])
+    counts = backend.upsert_inventory_items(iter([('laptop', 850.0), ('Mouse', 20.0), ('Pen', 1.0), ('PEN', 2.0)]))
+    assert counts == {'added': 1, 'updated': 2, 'unchanged': 1}
+    assert [(item['name'], item['price']) for item in backend.list_inventory()] == \
+        [('Laptop', 850.0), ('Mouse', 20.0), ('Pen', 2.0)]
+    assert [item['name'] for item in backend.search_inventory('pen', 5)] == ['Pen']
+
+
+def test_slow_inventory_import_does_not_block_checkouts(backend, monkeypatch):
+    """Upserts commit chunk by chunk, so a stalled upload leaves the writer free"""
+    monkeypatch.setattr('storage.UPSERT_CHUNK', 2)
+    monkeypatch.setattr('sqlite_storage._IN_CHUNK', 2)
+    stalled, release = threading.Event(), threading.Event()
+
+    def upload():
+        yield 'Pen', 1.0
+        yield 'Ink', 2.0
+        stalled.set()
+        release.wait(10)
+        yield 'Pad', 3.0
+
+    result = {}
+    importer = threading.Thread(target=lambda: result.update(backend.upsert_inventory_items(upload())))
+    importer.start()
+    assert stalled.wait(10)
+    start = time.perf_counter()
+    backend.create_bill(make_bill('Asha', 1.0))
+    elapsed = time.perf_counter() - start
+    release.set()
+    importer.join(10)
+
+    assert elapsed < 2
+    assert result == {'added': 3, 'updated': 0, 'unchanged': 0}
+    assert [item['name'] for item in backend.list_inventory()] == ['Pen', 'Ink', 'Pad']
+
+
+def test_csv_import_rewrites_inventory_once(tmp_path, monkeypatch):
+    """Chunks append new items; every price change lands in a single rewrite"""
+    rewrites = []
+
+    def counting_write(path, fieldnames, rows):
+        rewrites.append(path)
+        _atomic_write_rows(path, fieldnames, rows)
+
+    monkeypatch.setattr('storage.UPSERT_CHUNK', 2)
+    monkeypatch.setattr('storage._atomic_write_rows', counting_write)
+    write_inventory(tmp_path / 'inventory.csv', [[1, 'Laptop', 900.0], [2, 'Mouse', 20.0], [3, 'Pen', 1.0]])
+    backend = CsvStorage(str(tmp_path / 'inventory.csv'), str(tmp_path / 'bills.csv'))
+    counts = backend.upsert_inventory_items(iter([
+        ('laptop', 850.0), ('Mouse', 25.0), ('Ink', 2.0), ('PEN', 1.5), ('pen', 1.5), ('ink', 3.0),
+    ]))
+    backend.close()
+
+    assert counts == {'added': 1, 'updated': 4, 'unchanged': 1}
+    assert rewrites == [str(tmp_path / 'inventory.csv')]
+    assert [(row['name'], float(row['price'])) for row in read_inventory(tmp_path / 'inventory.csv')] == \
+        [('Laptop', 850.0), ('Mouse', 25.0), ('Pen', 1.5), ('Ink', 3.0)]
+
+
+def test_missing_customer_details_are_stored_empty(backend):
+    """JSON nulls become empty strings on both backends instead of failing the insert"""
+    bill = backend.create_bill({**make_bill('Walk-in', 5.0), 'customer_phone': None, 'customer_email': None})
+    stored = backend.get_bill(bill['bill_id'])
+    assert (stored['customer_phone'], stored['customer_email']) == ('', '')
+
+
+def test_customer_index_follows_bills(backend):
+    """Per-phone history and prefix autocomplete come from the customer index"""
+    first = backend.create_bill({**make_bill('Asha', 1.0), 'customer_phone': '98100'})
+    backend.create_bill({**make_bill('Ravi', 2.0), 'customer_phone': '97000'})
+    second = backend.create_bill({**make_bill('Asha K', 3.0), 'customer_phone': '98100'})
+    third = backend.create_bill({**make_bill('Asha K', 4.0), 'customer_phone': '98100'})
+    backend.create_bill({**make_bill('Walk-in', 5.0), 'customer_phone': ''})
+
+    bills, cursor = backend.customer_bills('98100', 2)
+    assert [bill['bill_id'] for bill in bills] == [third['bill_id'], second['bill_id']]
+    assert backend.customer_bills('98100', 2, cursor) == ([backend.get_bill(first['bill_id'])], None)
+    assert backend.customer_bills('00000', 2) == ([], None)
+
+    backend.delete_bill(third['bill_id'])
+    assert backend.list_customers('98', 10) == [
+        {'phone': '98100', 'name': 'Asha K', 'bills': 2, 'last_bill_date': '2025-10-02 21:52:33'},
+    ]
+    assert [customer['phone'] for customer in backend.list_customers('', 10)] == ['97000', '98100']
+
+    backend.delete_bill(first['bill_id'])
+    backend.delete_bill(second['bill_id'])
+    assert backend.get_customer('98100') is None
+    assert backend.get_customer('') is None
+
+
+def test_find_bills_by_item(backend):
+    """Item-level queries work on the structured line items"""
+    backend.create_bill(make_bill('a', 1.0))
+    mixed = make_bill('b', 3.0)
+    mixed['items'].append({'name': 'Wireless Mouse', 'quantity': 2, 'price': 1.0, 'total': 2.0})
+    backend.create_bill(mixed)
+
+    bills = backend.find_bills_by_item('wireless mouse')
+    assert [bill['customer_name'] for bill in bills] == ['b']
+    assert bills[0]['items'][1] == {'name': 'Wireless Mouse', 'quantity': 2, 'price': 1.0, 'total': 2.0}
+    assert len(backend.find_bills_by_item('Laptop')) == 2
+
+
+def test_items_json_migration_converts_legacy_rows(tmp_path):
+    """str(list) items columns are rewritten as JSON"""
+    path = tmp_path / 'bills.csv'
+    path.write_text(LEGACY_BILLS)
+
+    assert BillLedger(str(path)).list_bills()[1]['items'][0]['quantity'] == 2
+    assert migrate.items_to_json(str(path)) == 2
+    assert migrate.items_to_json(str(path)) == 0
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[1]['items'] == '[{"name":"sdv","quantity":2,"price":2.0,"total":4.0}]'
+
+
+def test_ledger_reads_signature_rows_appended_under_an_older_header(tmp_path):
+    """bills.csv files from before signature_id keep working and gain the column"""
+    path = tmp_path / 'bills.csv'
+    path.write_text('bill_id,date,customer_name,customer_phone,customer_email,items,total,payment_status,notes\r\n'
+                    '1,2025-10-02 21:52:33,harish,98,,[],10.0,Paid,\r\n')
+    ledger = BillLedger(str(path))
+    signed = ledger.append_bill({**make_bill('Asha', 1.0), 'signature_id': 'a' * 64})
+
+    reopened = BillLedger(str(path))
+    assert reopened.get_bill(1)['signature_id'] == ''
+    assert reopened.get_bill(signed['bill_id'])['signature_id'] == 'a' * 64
+    reopened.rewrite()
+    with open(path, newline='') as f:
+        assert next(csv.reader(f))[-1] == 'signature_id'
+    assert BillLedger(str(path)).get_bill(signed['bill_id'])['signature_id'] == 'a' * 64
+
+
+def test_sqlite_moves_legacy_items_column_into_bill_items(tmp_path):
+    """Databases with the old items text column are converted on open"""
+    db_path = str(tmp_path / 'billing.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE bills (bill_id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, "
+                 "customer_name TEXT, customer_phone TEXT, customer_email TEXT, items TEXT, "
+                 "total REAL, payment_status TEXT, notes TEXT)")
+    conn.execute("INSERT INTO bills VALUES (1, '2025-10-02', 'harish', '98', '', "
+                 "\"[{'name': 'csa', 'quantity': 1, 'price': 200.0, 'total': 200.0}]\", 200.0, 'Paid', '')")
+    conn.commit()
+    conn.close()
+
+    storage = SqliteStorage(db_path)
+    assert storage.get_bill(1)['items'] == [{'name': 'csa', 'quantity': 1, 'price': 200.0, 'total': 200.0}]
+    assert [bill['bill_id'] for bill in storage.find_bills_by_item('CSA')] == [1]
+    assert storage.bill_stats()['paid_amount'] == 200.0
+    # Columns added since the database was created are filled in on open
+    assert storage.get_bill(1)['signature_id'] == ''
+
+
+def test_block_allocator_is_unique_across_threads_and_allocators(tmp_path):
+    """Concurrent allocation from one or several allocators never repeats an id"""
+    sequence_path = str(tmp_path / 'bills.csv.seq')
+    allocators = [BlockAllocator(FileSequence(sequence_path), block_size=7) for _ in range(2)]
+    results = []
+
+    def worker(allocator):
+        results.extend(allocator.next_id() for _ in range(500))
+
+    threads = [threading.Thread(target=worker, args=(allocators[i % 2],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == len(set(results)) == 4000
+
+
+def test_block_allocator_returns_unused_ids_and_respects_floor(tmp_path):
+    """Released blocks leave no gap; the floor seeds the sequence"""
+    sequence = FileSequence(str(tmp_path / 'bills.csv.seq'), floor=lambda: 41)
+    allocator = BlockAllocator(sequence, block_size=50)
+    assert [allocator.next_id() for _ in range(3)] == [42, 43, 44]
+    allocator.release()
+    assert BlockAllocator(sequence, block_size=50).next_id() == 45
+
+
+class RecordingTarget:
+    """Minimal CommitQueue target that counts flushes"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.staged = []
+        self.flushed = []
+        self.flushes = 0
+
+    def flush(self):
+        time.sleep(0.01)  # stands in for write + fsync
+        self.flushed.extend(self.staged)
+        self.staged = []
+        self.flushes += 1
+
+    def discard_pending(self):
+        self.staged = []
+
+
+def test_commit_queue_groups_concurrent_mutations():
+    """Concurrent submissions share flushes and each caller gets its result"""
+    commits = CommitQueue()
+    target = RecordingTarget()
+    results = {}
+
+    def stage(n):
+        target.staged.append(n)
+        return n * n
+
+    def worker(n):
+        results[n] = commits.submit(target, lambda: stage(n))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {n: n * n for n in range(50)}
+    assert sorted(target.flushed) == list(range(50))
+    assert target.flushes < 50
+
+    def failing():
+        raise ValueError('bad row')
+
+    with pytest.raises(ValueError):
+        commits.submit(target, failing)
+
+
+def test_csv_storage_concurrent_checkouts_lose_nothing(tmp_path):
+    """Threaded bill creation through CsvStorage keeps every bill"""
+    write_inventory(tmp_path / 'inventory.csv', [])
+    storage = CsvStorage(str(tmp_path / 'inventory.csv'), str(tmp_path / 'bills.csv'))
+
+    def checkout(n):
+        for i in range(20):
+            storage.create_bill(make_bill(f'c{n}-{i}', 1.0))
+
+    threads = [threading.Thread(target=checkout, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reopened = BillLedger(str(tmp_path / 'bills.csv'))
+    assert len(reopened.list_bills()) == 160
+    assert len({bill['bill_id'] for bill in reopened.list_bills()}) == 160